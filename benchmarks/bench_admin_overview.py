@@ -0,0 +1,90 @@
+"""
+Bytes and time to fill the admin dashboard cards: the calls the page used to
+make (/users/, /halls/ and two complaint pages) against the single
+/dashboard/admin/overview request.
+
+Runs in-process against DATABASE_URL as the first admin in the users table;
+--admins simulates that many admins loading the dashboard at once.
+
+    python -m benchmarks.bench_admin_overview --rounds 50 --admins 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlalchemy import select
+
+from main import app
+from src.auth.models import User
+from src.common.db import SessionLocal, async_engine, async_read_engine
+from src.common.security import (
+    _PRINCIPAL_COLUMNS,
+    _principal_from_row,
+    get_current_user,
+    get_current_user_async,
+)
+
+OLD_CALLS = [
+    "/users/",
+    "/halls/",
+    "/complaint/?limit=1&include_total=true",
+    "/complaint/?status=pending&limit=1&include_total=true",
+]
+NEW_CALLS = ["/dashboard/admin/overview"]
+
+
+def _first_admin():
+    with SessionLocal() as db:
+        row = db.execute(select(*_PRINCIPAL_COLUMNS).where(User.is_admin == True).limit(1)).first()
+    if row is None:
+        raise SystemExit("No admin user; run `python -m src.common.seed` first")
+    return _principal_from_row(row)
+
+
+async def load(client: httpx.AsyncClient, paths) -> int:
+    responses = await asyncio.gather(*(client.get(path) for path in paths))
+    for response in responses:
+        response.raise_for_status()
+    return sum(len(response.content) for response in responses)
+
+
+async def measure(client: httpx.AsyncClient, paths, rounds: int, admins: int):
+    timings, size = [], 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        sizes = await asyncio.gather(*(load(client, paths) for _ in range(admins)))
+        timings.append((time.perf_counter() - started) * 1000)
+        size = sizes[0]
+    return size, timings
+
+
+async def compare(rounds: int, admins: int):
+    admin = _first_admin()
+    app.dependency_overrides[get_current_user] = lambda: admin
+    app.dependency_overrides[get_current_user_async] = lambda: admin
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, paths in (("old", OLD_CALLS), ("overview", NEW_CALLS)):
+            await load(client, paths)  # warm pools and caches
+            size, timings = await measure(client, paths, rounds, admins)
+            print(
+                f"{label:<9} {len(paths)} request(s)  {size:>9,} bytes  "
+                f"p50 {statistics.median(timings):7.1f} ms  max {max(timings):7.1f} ms  "
+                f"({admins} admin(s), {rounds} rounds)"
+            )
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--admins", type=int, default=1, help="admins loading the dashboard at once")
+    args = parser.parse_args()
+    asyncio.run(compare(args.rounds, args.admins))
+
+
+if __name__ == "__main__":
+    main()
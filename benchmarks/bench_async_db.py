@@ -0,0 +1,78 @@
+"""
+Requests/sec of the sync (SessionLocal + threadpool) database path against
+the async (AsyncSessionLocal on the event loop) path.
+
+Both endpoints run the same query against DATABASE_URL; --db-wait adds a
+pg_sleep so the comparison reflects time spent waiting on Postgres rather
+than the query itself.
+
+    python -m benchmarks.bench_async_db --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.common.db import async_engine, get_async_db, get_db
+
+app = FastAPI()
+DB_WAIT = 0.0
+
+
+def _statement():
+    if DB_WAIT:
+        return text("SELECT count(*) FROM halls, pg_sleep(:wait)").bindparams(wait=DB_WAIT)
+    return text("SELECT count(*) FROM halls")
+
+
+@app.get("/sync")
+def sync_endpoint(db: Session = Depends(get_db)):
+    return {"halls": db.execute(_statement()).scalar()}
+
+
+@app.get("/async")
+async def async_endpoint(db: AsyncSession = Depends(get_async_db)):
+    return {"halls": (await db.execute(_statement())).scalar()}
+
+
+async def run(path: str, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
+
+
+async def compare(requests: int, concurrency: int):
+    # one event loop for both runs: pooled asyncpg connections are bound to it
+    for path in ("/sync", "/async"):
+        await run(path, min(requests, 50), concurrency)  # warm the pools
+        rps = await run(path, requests, concurrency)
+        print(f"{path:<7} {rps:8.1f} req/s  ({requests} requests, concurrency {concurrency})")
+    await async_engine.dispose()
+
+
+def main():
+    global DB_WAIT
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--db-wait", type=float, default=0.02, help="seconds of pg_sleep per query")
+    args = parser.parse_args()
+    DB_WAIT = args.db_wait
+    asyncio.run(compare(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Bulk allocation of a full intake in one call.
+
+Creates a throwaway hall with enough rooms for --students students spread
+across levels and departments, runs RoomAllocationService.bulk_allocate_rooms
+once, and reports wall time and the number of SQL statements it issued.
+Room and hall counters are then checked against the allocation rows and the
+test data is deleted.
+
+    python -m benchmarks.bench_bulk_allocation --students 10000 --capacity 4
+"""
+import argparse
+import random
+import time
+import uuid
+
+from sqlalchemy import event, select
+
+from src.common.db import SessionLocal, engine
+from src.auth.models import User
+from src.hostels.models import Room
+from src.hostels.service import RoomAllocationService
+from benchmarks.stress_allocation import ACADEMIC_YEAR, cleanup, verify
+
+LEVELS = [100, 200, 300, 400, 500]
+DEPARTMENTS = ["Computer Science", "Law", "Medicine", "Economics", "Mechanical Engineering"]
+
+
+def setup(students: int, capacity: int):
+    rooms = -(-students // capacity)
+    with SessionLocal() as db:
+        service = RoomAllocationService(db)
+        hall = service.create_hall(
+            name=f"bulk-{uuid.uuid4().hex[:8]}",
+            no_of_rooms=rooms,
+            min_level=min(LEVELS),
+            max_level=max(LEVELS),
+            is_open_for_allocation=True,
+            academic_year=ACADEMIC_YEAR,
+        )
+        service.create_rooms_bulk(
+            hall.id, [{"room_number": str(n), "capacity": capacity} for n in range(1, rooms + 1)]
+        )
+        users = [
+            User(email=f"bulk-{uuid.uuid4().hex}@example.com", name="bulk", hashed_password="!",
+                 level=random.choice(LEVELS), department=random.choice(DEPARTMENTS))
+            for _ in range(students)
+        ]
+        db.add_all(users)
+        db.commit()
+        return hall.id, [user.id for user in users]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--capacity", type=int, default=4)
+    args = parser.parse_args()
+
+    hall_id, user_ids = setup(args.students, args.capacity)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    try:
+        event.listen(engine, "before_cursor_execute", count_statement)
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            allocations = RoomAllocationService(db).bulk_allocate_rooms(user_ids, hall_id, ACADEMIC_YEAR)
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+        print(f"allocated:  {len(allocations)} students in {elapsed:.2f}s")
+        print(f"statements: {len(statements)}")
+
+        with SessionLocal() as db:
+            rooms_used = db.execute(
+                select(Room.id).where(Room.hall_id == hall_id, Room.current_occupancy > 0)
+            ).all()
+        print(f"rooms used: {len(rooms_used)} of {-(-args.students // args.capacity)}")
+
+        problems = verify(hall_id)
+        for problem in problems:
+            print("FAIL", problem)
+        assert not problems, f"{len(problems)} consistency problems"
+        print("OK: counters consistent")
+    finally:
+        cleanup(hall_id, user_ids)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
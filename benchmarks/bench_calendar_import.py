@@ -0,0 +1,128 @@
+"""
+Importing a semester timetable: POST /calendar/import with one file against
+creating the same events one POST /calendar/ at a time.
+
+Generates --events events over a 15-week semester in --rooms locations; a
+--recurring share of them are weekly series and --clashes of them are
+deliberately double-booked. Imports them as CSV (and as iCalendar with
+--format ics), checks that the reported conflicts are the planted ones, and
+times --single one-at-a-time creations for comparison. Runs as the first
+admin against DATABASE_URL and deletes its events afterwards.
+
+    python -m benchmarks.bench_calendar_import --events 5000 --rooms 60
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from benchmarks.bench_admin_overview import _first_admin
+from main import app
+from src.calendar.models import Event
+from src.common.db import SessionLocal
+from src.common.security import get_current_user
+
+PREFIX = "bench_calendar_import"
+SEMESTER_WEEKS = 15
+# Teaching slots: weekdays, 08:00 to 18:00 in two-hour blocks
+SLOTS = [(day, hour) for day in range(5) for hour in range(8, 18, 2)]
+
+
+def timetable(events: int, rooms: int, recurring: float, clashes: int):
+    """Rows without overlaps, then `clashes` rows that overlap one of them"""
+    monday = datetime(2026, 9, 7)
+    free = [(room, week, day, hour) for room in range(rooms) for week in range(SEMESTER_WEEKS) for day, hour in SLOTS]
+    random.shuffle(free)
+    rows, taken = [], set()
+    for room, week, day, hour in free:
+        if len(rows) >= events - clashes:
+            break
+        weeks = range(week, SEMESTER_WEEKS) if random.random() < recurring else [week]
+        if any((room, w, day, hour) in taken for w in weeks):
+            continue
+        taken.update((room, w, day, hour) for w in weeks)
+        start = monday + timedelta(weeks=week, days=day, hours=hour)
+        rule = f"FREQ=WEEKLY;COUNT={len(weeks)}" if len(weeks) > 1 else ""
+        rows.append((f"{PREFIX} {len(rows)}", start, start + timedelta(hours=2), f"Room {room}", rule))
+    for i in range(clashes):
+        _, start, _, location, _ = random.choice(rows)
+        start += timedelta(minutes=30)
+        rows.append((f"{PREFIX} clash {i}", start, start + timedelta(hours=1), location, ""))
+    return rows
+
+
+def as_csv(rows) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["title", "start_time", "end_time", "location", "recurrence_rule"])
+    for title, start, end, location, rule in rows:
+        writer.writerow([title, start.isoformat(), end.isoformat(), location, rule])
+    return out.getvalue().encode()
+
+
+def as_ics(rows) -> bytes:
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//bench//EN"]
+    for i, (title, start, end, location, rule) in enumerate(rows):
+        lines += ["BEGIN:VEVENT", f"UID:{i}@bench", f"SUMMARY:{title}", f"DTSTART:{start:%Y%m%dT%H%M%S}",
+                  f"DTEND:{end:%Y%m%dT%H%M%S}", f"LOCATION:{location}"]
+        if rule:
+            lines.append(f"RRULE:{rule}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+
+def cleanup():
+    with SessionLocal() as db:
+        db.execute(delete(Event).where(Event.title.like(f"{PREFIX}%")))
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--recurring", type=float, default=0.2, help="share of events that repeat weekly")
+    parser.add_argument("--clashes", type=int, default=50)
+    parser.add_argument("--single", type=int, default=200, help="events created one at a time for comparison")
+    parser.add_argument("--format", choices=("csv", "ics"), default="csv")
+    args = parser.parse_args()
+
+    admin = _first_admin()
+    app.dependency_overrides[get_current_user] = lambda: admin
+    rows = timetable(args.events, args.rooms, args.recurring, args.clashes)
+    body, media_type = (as_csv(rows), "text/csv") if args.format == "csv" else (as_ics(rows), "text/calendar")
+    cleanup()
+    try:
+        with TestClient(app) as client:
+            started = time.perf_counter()
+            response = client.post("/calendar/import", files={"file": (f"semester.{args.format}", body, media_type)})
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            report = response.json()
+            planted = {row[0] for row in rows if " clash " in row[0]}
+            reported = {conflict["title"] for conflict in report["conflicts"]}
+            print(f"import   {report['received']} events ({len(body):,} bytes {args.format}) in {elapsed:.2f} s: "
+                  f"{report['imported']} imported, {len(report['conflicts'])} conflicts, {len(report['errors'])} errors; "
+                  f"{len(planted & reported)}/{len(planted)} planted clashes found")
+            cleanup()
+
+            started = time.perf_counter()
+            for title, start, end, location, rule in rows[:args.single]:
+                client.post("/calendar/", json={"title": title, "start_time": start.isoformat(),
+                                                "end_time": end.isoformat(), "location": location,
+                                                "recurrence_rule": rule or None}).raise_for_status()
+            per_event = (time.perf_counter() - started) / args.single
+            print(f"single   {per_event * 1000:.1f} ms per event, "
+                  f"{per_event * report['received']:.1f} s for the same {report['received']} events")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
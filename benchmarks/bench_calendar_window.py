@@ -0,0 +1,112 @@
+"""
+Cost of showing one month of the calendar: the old full listing (every event,
+ordered by start, filtered in the browser) against a from/to window that
+reads only the events in range and expands recurring ones within it.
+
+Inserts --events events spread over --years years (--recurring of them
+weekly series) into DATABASE_URL, runs as the first admin and deletes the
+events afterwards. Needs the new columns and index (python -m src.common.migrate).
+
+    python -m benchmarks.bench_calendar_window --events 20000 --rounds 50
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, text
+
+from benchmarks.bench_admin_overview import _first_admin
+from main import app
+from src.calendar.models import Event
+from src.calendar.services import _set_recurrence, calendar_cache, window_filter
+from src.common.db import SessionLocal, engine
+from src.common.security import get_current_user, get_stream_user
+
+TITLE = "bench_calendar_window"
+
+
+def seed(events: int, years: int, recurring: float) -> datetime:
+    origin = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=365 * years // 2)
+    span = 365 * years * 24
+    rows = []
+    for i in range(events):
+        start = origin + timedelta(hours=random.randrange(span))
+        event = Event(title=TITLE, start_time=start, end_time=start + timedelta(hours=random.choice((1, 2, 3))),
+                      location=f"Hall {i % 12}")
+        if random.random() < recurring:
+            event.recurrence_rule = f"FREQ=WEEKLY;COUNT={random.randint(4, 15)}"
+        _set_recurrence(event)
+        rows.append(event)
+    with SessionLocal() as db:
+        db.add_all(rows)
+        db.commit()
+    return origin + timedelta(days=365 * years // 2)
+
+
+def plan(start: datetime, end: datetime):
+    query = (
+        SessionLocal().query(Event.id).filter(window_filter(start, end))
+        .statement.compile(engine, compile_kwargs={"literal_binds": True})
+    )
+    explain = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as connection:
+        for row in connection.execute(text(f"{explain} {query}")):
+            print("   ", row[-1])
+
+
+def measure(client: TestClient, path: str, rounds: int, cold: bool):
+    """Time GETs of `path`; cold ones miss the response cache, as right after a write"""
+    timings, size, count = [], 0, 0
+    for _ in range(rounds):
+        if cold:
+            calendar_cache.clear()
+        started = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        size = len(response.content)
+        if response.headers["content-type"].startswith("text/calendar"):
+            count = response.text.count("BEGIN:VEVENT")
+        else:
+            count = len(response.json())
+    return size, count, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--recurring", type=float, default=0.1, help="share of events that repeat weekly")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    admin = _first_admin()
+    app.dependency_overrides[get_current_user] = lambda: admin
+    app.dependency_overrides[get_stream_user] = lambda: admin
+    month = seed(args.events, args.years, args.recurring)
+    window = f"from={month:%Y-%m-%dT%H:%M:%S}&to={month + timedelta(days=31):%Y-%m-%dT%H:%M:%S}"
+    try:
+        with TestClient(app) as client:
+            for label, path in (
+                ("full", f"/calendar/?limit={args.events * 2}"),
+                ("window", f"/calendar/?{window}"),
+                ("feed.ics", "/calendar/feed.ics"),
+            ):
+                client.get(path)  # warm pools
+                size, count, timings = measure(client, path, args.rounds, cold=True)
+                cached = measure(client, path, args.rounds, cold=False)[2]
+                print(f"{label:<9} {count:>6} events  {size:>11,} bytes  p50 {statistics.median(timings):8.1f} ms  "
+                      f"cached p50 {statistics.median(cached):6.1f} ms")
+        print("window query plan:")
+        plan(month, month + timedelta(days=31))
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(Event).where(Event.title == TITLE))
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
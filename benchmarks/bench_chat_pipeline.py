@@ -0,0 +1,122 @@
+"""
+Replay a corpus of chat questions through process_query and report LLM calls
+and tokens per question and end-to-end latency percentiles, split by how each
+question was answered (local intent, answer cache, or LLM).
+
+Runs in-process on the fake provider, so no network or API key is needed:
+
+    python -m benchmarks.bench_chat_pipeline --passes 3 --concurrency 20 --latency 0.3
+
+The first pass starts with an empty answer cache. --no-intents sends every
+question to the LLM pipeline; --provider env uses LLM_PROVIDER instead.
+Questions are asked as the first student in the database (run against a seeded
+database), so "my room" and "my complaints" can be answered locally.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import select
+
+import src.chat.intents as intents
+import src.chat.routes as chat_routes
+from src.auth.models import User
+from src.chat.cache import qa_cache
+from src.chat.providers import FakeProvider, track_usage
+from src.common.db import SessionLocal, async_engine, async_read_engine
+from src.common.security import _PRINCIPAL_COLUMNS, _principal_from_row
+
+CORPUS = [
+    # Intent router
+    "Which halls have free beds?",
+    "Is there space in Main Hall?",
+    "How many people are in room 101?",
+    "What is my room?",
+    "Do I have any open complaints?",
+    "Any upcoming events?",
+    # Generated SQL
+    "List every hall with its number of rooms",
+    "Which students were allocated this year?",
+    "How many complaints were resolved last month?",
+    # No SQL
+    "How do I register for accommodation?",
+    "What should I do if I lose my key?",
+    "Can I have visitors overnight?",
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_student():
+    with SessionLocal() as db:
+        row = db.execute(select(*_PRINCIPAL_COLUMNS).where(User.is_admin == False).limit(1)).first()
+    return _principal_from_row(row) if row else None
+
+
+async def run(passes: int, concurrency: int):
+    student = load_student()
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []  # (route, seconds, calls, prompt_tokens, completion_tokens)
+
+    async def ask(question):
+        async with semaphore:
+            started = time.perf_counter()
+            with track_usage() as usage:
+                result = await chat_routes.process_query(question, None, "student", student)
+            elapsed = time.perf_counter() - started
+            if result.get("intent"):
+                route = "intent"
+            elif usage.calls == 0:
+                route = "cache"
+            else:
+                route = "llm"
+            samples.append((route, elapsed, usage.calls, usage.prompt_tokens, usage.completion_tokens))
+
+    started = time.perf_counter()
+    for _ in range(passes):
+        await asyncio.gather(*(ask(question) for question in CORPUS))
+    wall = time.perf_counter() - started
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+    print(f"{len(samples)} questions in {wall:.2f} s ({len(samples) / wall:.1f}/s), "
+          f"provider {chat_routes.llm.name}, intents {'on' if intents.CHAT_INTENTS else 'off'}")
+    print(f"{'route':8} {'count':>6} {'calls/q':>8} {'tokens/q':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route in ("all", "intent", "cache", "llm"):
+        rows = [s for s in samples if route == "all" or s[0] == route]
+        if not rows:
+            continue
+        latencies = [s[1] for s in rows]
+        calls = sum(s[2] for s in rows) / len(rows)
+        tokens = sum(s[3] + s[4] for s in rows) / len(rows)
+        print(f"{route:8} {len(rows):6} {calls:8.2f} {tokens:9.1f} "
+              f"{statistics.median(latencies) * 1000:9.1f} {percentile(latencies, 95) * 1000:9.1f} "
+              f"{percentile(latencies, 99) * 1000:9.1f}")
+    print(f"provider: {chat_routes.llm.stats()}")
+    print(f"intents: {intents.intent_router.stats()}")
+    print(f"cache: {qa_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--passes", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--provider", choices=["fake", "env"], default="fake")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake provider seconds per call")
+    parser.add_argument("--sql", default="SELECT name, no_of_rooms FROM halls", help="SQL the fake provider generates")
+    parser.add_argument("--no-intents", action="store_true")
+    args = parser.parse_args()
+    if args.provider == "fake":
+        chat_routes.llm = FakeProvider(latency=args.latency, sql=args.sql)
+    if args.no_intents:
+        intents.CHAT_INTENTS = False
+    asyncio.run(run(args.passes, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
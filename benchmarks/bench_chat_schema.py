@@ -0,0 +1,84 @@
+"""
+Catalog round trips and prompt size of the chat schema description.
+
+"before" re-creates the original per-request description: a fresh
+inspect(engine) with per-table column/PK/FK lookups, pretty-printed as JSON.
+"after" is src.chat.schema.get_db_schema: one batched introspection, cached,
+rendered as compact DDL. Tokens are estimated at 4 characters per token; the
+description is pasted into two prompts per SQL-answered question.
+
+    python -m benchmarks.bench_chat_schema --requests 20
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import event, inspect
+
+from src.common.db import engine
+from src.chat.schema import get_db_schema, invalidate_schema_cache
+
+
+def legacy_schema() -> str:
+    inspector = inspect(engine)
+    schema_info = {}
+    for table_name in inspector.get_table_names():
+        schema_info[table_name] = []
+        for column in inspector.get_columns(table_name):
+            schema_info[table_name].append({
+                "column_name": column["name"],
+                "data_type": str(column["type"]),
+                "is_nullable": "YES" if column.get("nullable", True) else "NO",
+                "default": str(column.get("default", ""))
+            })
+        primary_keys = inspector.get_pk_constraint(table_name)
+        if primary_keys and primary_keys.get("constrained_columns"):
+            schema_info[table_name].append({
+                "constraint_type": "PRIMARY KEY",
+                "columns": primary_keys["constrained_columns"]
+            })
+        for fk in inspector.get_foreign_keys(table_name):
+            schema_info[table_name].append({
+                "constraint_type": "FOREIGN KEY",
+                "columns": fk["constrained_columns"],
+                "referred_table": fk["referred_table"],
+                "referred_columns": fk["referred_columns"]
+            })
+    return json.dumps(schema_info, indent=2)
+
+
+def measure(describe, requests: int):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    started = time.perf_counter()
+    try:
+        for _ in range(requests):
+            text = describe()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    return len(statements), time.perf_counter() - started, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--show", action="store_true", help="print the compact description")
+    args = parser.parse_args()
+
+    invalidate_schema_cache()
+    for label, describe in (("before", legacy_schema), ("after", get_db_schema)):
+        queries, elapsed, text = measure(describe, args.requests)
+        print(f"{label:7} catalog queries: {queries} for {args.requests} requests, "
+              f"{elapsed / args.requests * 1000:.2f} ms/request, "
+              f"{len(text)} chars (~{len(text) // 4} tokens, x2 prompts)")
+    if args.show:
+        print(get_db_schema())
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Time-to-first-token and total latency of POST /chat/query/stream against
+the buffered POST /chat/query.
+
+Point the app at the fake LLM server first:
+
+    python -m benchmarks.fake_llm_server --latency 0.3 --token-delay 0.02 &
+    GROQ_BASE_URL=http://127.0.0.1:8400 python -m benchmarks.bench_chat_stream --requests 200 --concurrency 50
+
+Requests go through the app in-process with authentication stubbed out.
+Time to first token is measured by the server (the `done` event), because
+the in-process transport delivers the body in one piece.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from main import app
+from src.chat.routes import chat_latency
+from src.common.db import async_engine, async_read_engine
+from src.common.security import Principal, get_current_user_async
+
+QUESTIONS = [
+    "How many halls are open for allocation?",
+    "Which rooms in Main Hall are still available?",
+    "How do I register for accommodation?",
+    "How many complaints are still pending?",
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def fake_principal():
+    return Principal(id=None, email="bench@example.com", name="bench", level=100, department=None,
+                     phone_number=None, avatar_url=None, is_admin=False)
+
+
+def report(label, samples):
+    if samples:
+        print(f"{label:28} p50 {statistics.median(samples) * 1000:8.1f} ms   "
+              f"p99 {percentile(samples, 99) * 1000:8.1f} ms")
+
+
+async def run(requests: int, concurrency: int):
+    app.dependency_overrides[get_current_user_async] = fake_principal
+    semaphore = asyncio.Semaphore(concurrency)
+    buffered, streamed, server_ttft, errors = [], [], [], []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def ask_buffered(question):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/chat/query", json={"query": question})
+                if response.status_code != 200:
+                    errors.append(response.text)
+                buffered.append(time.perf_counter() - started)
+
+        async def ask_streamed(question):
+            async with semaphore:
+                started = time.perf_counter()
+                event = None
+                async with client.stream("POST", "/chat/query/stream", json={"query": question}) as response:
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                        elif line.startswith("data: ") and event == "done":
+                            server_ttft.append(json.loads(line[len("data: "):])["ttft_ms"] / 1000)
+                        elif line.startswith("data: ") and event == "error":
+                            errors.append(line)
+                streamed.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(ask_buffered(QUESTIONS[i % len(QUESTIONS)]) for i in range(requests)))
+        await asyncio.gather(*(ask_streamed(QUESTIONS[i % len(QUESTIONS)]) for i in range(requests)))
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+    report("/chat/query total", buffered)
+    report("/chat/query/stream total", streamed)
+    report("/chat/query/stream TTFT", server_ttft)
+    print(f"server recorders: { {name: r.as_dict() for name, r in chat_latency.items()} }")
+    if errors:
+        print(f"{len(errors)} errors, first: {errors[0][:200]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
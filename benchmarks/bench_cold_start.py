@@ -0,0 +1,65 @@
+"""
+Worker cold start: time from launching a uvicorn worker to its first served
+request (GET /health/metrics), and the import time of main.py on its own.
+
+    python -m src.common.migrate && python -m src.common.seed
+    python -m benchmarks.bench_cold_start --runs 5
+
+Each run starts a fresh process, so nothing is warm but the OS file cache.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def time_import() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def time_first_request(port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if worker.poll() is not None:
+                raise RuntimeError(f"worker exited with code {worker.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health/metrics", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"no response within {timeout} s")
+    finally:
+        worker.terminate()
+        worker.wait()
+
+
+def report(label, samples):
+    print(f"{label:24} p50 {statistics.median(samples) * 1000:8.0f} ms   max {max(samples) * 1000:8.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.runs)]
+    first_requests = [time_first_request(args.port, args.timeout) for _ in range(args.runs)]
+    report("import main", imports)
+    report("start to first request", first_requests)
+
+
+if __name__ == "__main__":
+    main()
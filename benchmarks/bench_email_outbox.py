@@ -0,0 +1,100 @@
+"""
+Email delivery cost: one SMTP connection per email, as forgot_password used
+to do inside the request, against the outbox (a row committed with the
+request, drained in batches over one persistent connection).
+
+Runs the aiosmtpd stand-in from benchmarks/fake_smtp_server.py in-process;
+--handshake-delay stands in for the TLS and login round trips of a real
+server. Needs the email_outbox table (python -m src.common.migrate).
+
+    python -m benchmarks.bench_email_outbox --emails 500 --handshake-delay 0.1
+"""
+import argparse
+import asyncio
+import time
+from email.message import EmailMessage
+
+import aiosmtplib
+from sqlalchemy import delete
+
+from benchmarks.fake_smtp_server import start_server
+from src.common.db import AsyncSessionLocal, async_engine
+from src.mail.models import OutboxEmail
+from src.mail.service import queue_email
+from src.mail.worker import OutboxWorker, SMTPSender
+
+SUBJECT = "bench_email_outbox"
+
+
+def _message(i: int) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "hms@example.com"
+    message["To"] = f"student{i}@example.com"
+    message["Subject"] = SUBJECT
+    message.set_content("<p>Hello</p>", subtype="html")
+    return message
+
+
+async def direct(host: str, port: int, emails: int) -> float:
+    """Connect, send and quit per email; returns mean seconds per email"""
+    started = time.perf_counter()
+    for i in range(emails):
+        await aiosmtplib.send(_message(i), hostname=host, port=port, start_tls=False)
+    return (time.perf_counter() - started) / emails
+
+
+async def enqueue(emails: int) -> float:
+    """One committed outbox row per request; returns mean seconds per request"""
+    started = time.perf_counter()
+    for i in range(emails):
+        async with AsyncSessionLocal() as db:
+            queue_email(db, f"student{i}@example.com", SUBJECT, "<p>Hello</p>")
+            await db.commit()
+    return (time.perf_counter() - started) / emails
+
+
+async def drain(host: str, port: int, batch: int) -> tuple:
+    worker = OutboxWorker(SMTPSender(host, port), batch_size=batch)
+    started = time.perf_counter()
+    while await worker.process_next_batch():
+        pass
+    elapsed = time.perf_counter() - started
+    await worker.sender.close()
+    return elapsed, worker.stats()
+
+
+async def run(args):
+    controller, handler = start_server(args.host, args.port, handshake_delay=args.handshake_delay)
+    try:
+        per_email = await direct(args.host, args.port, args.emails)
+        direct_connections = handler.stats()["connections"]
+        print(f"direct   {per_email * 1000:8.1f} ms in the request per email, "
+              f"{args.emails / (per_email * args.emails):7.1f} emails/s, {direct_connections} connections")
+
+        per_request = await enqueue(args.emails)
+        elapsed, stats = await drain(args.host, args.port, args.batch)
+        connections = handler.stats()["connections"] - direct_connections
+        print(f"outbox   {per_request * 1000:8.1f} ms in the request per email, "
+              f"{stats['sent'] / elapsed:7.1f} emails/s, {connections} connection(s), "
+              f"{stats['batches']} batches, send p50 {stats['send']['p50_ms']} ms")
+    finally:
+        controller.stop()
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(OutboxEmail).where(OutboxEmail.subject == SUBJECT))
+            await db.commit()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--handshake-delay", type=float, default=0.05, help="seconds added to each EHLO")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Login throughput with bcrypt running in the hashing process pool.
+
+Fires --requests logins at POST /auth/login with --concurrency in flight and,
+at the same time, polls GET /health to show unrelated calls stay responsive.
+Logins rejected with 503 (hashing queue full) are counted separately.
+
+    python -m benchmarks.bench_login --email admin@example.com --password admin123
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from main import app
+from src.common.db import async_engine, async_read_engine
+from src.common.hashing import password_hasher
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(email: str, password: str, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    login_latencies = []
+    health_latencies = []
+    done = asyncio.Event()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def login():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/auth/login", data={"username": email, "password": password})
+                login_latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def poll_health():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        poller = asyncio.create_task(poll_health())
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await poller
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+    succeeded = statuses.get(200, 0)
+    print(f"logins:          {requests} in {elapsed:.2f}s, {succeeded / elapsed:.1f} successful/s")
+    print(f"status codes:    {dict(sorted(statuses.items()))}")
+    print(f"login latency:   p50 {statistics.median(login_latencies) * 1000:.1f} ms, "
+          f"p99 {percentile(login_latencies, 99) * 1000:.1f} ms")
+    if health_latencies:
+        print(f"/health latency: p50 {statistics.median(health_latencies) * 1000:.1f} ms, "
+              f"p99 {percentile(health_latencies, 99) * 1000:.1f} ms")
+    print(f"hasher:          {password_hasher.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.email, args.password, args.requests, args.concurrency))
+    finally:
+        password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Local stand-in for the Groq chat completions API (OpenAI-compatible), so the
+chat pipeline can be exercised and benchmarked without network access.
+
+Answers are canned from the prompt as in LLM_PROVIDER=fake: the SQL
+assessment gets YES/NO, SQL generation gets --sql, everything else gets a
+fixed answer streamed word by word. --latency delays the first byte,
+--token-delay spaces streamed tokens.
+
+    python -m benchmarks.fake_llm_server --port 8400 --latency 0.3 --token-delay 0.02
+    GROQ_BASE_URL=http://127.0.0.1:8400 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from src.chat.providers import fake_reply
+
+app = FastAPI()
+settings = {"latency": 0.0, "token_delay": 0.0, "sql": "SELECT name, no_of_rooms FROM halls"}
+
+
+def canned_reply(prompt: str) -> str:
+    return fake_reply(prompt, settings["sql"])
+
+
+def _usage(prompt: str, reply: str) -> dict:
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = max(1, len(reply) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+    reply = canned_reply(prompt)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = body.get("model", "fake")
+
+    await asyncio.sleep(settings["latency"])
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": _usage(prompt, reply),
+        }
+
+    async def chunks():
+        words = reply.split(" ")
+        for index, word in enumerate(words):
+            delta = {"content": word if index == 0 else " " + word}
+            if index == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(settings["token_delay"])
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": _usage(prompt, reply)},
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--sql", default=settings["sql"], help="SQL returned for generation prompts")
+    args = parser.parse_args()
+    settings.update(latency=args.latency, token_delay=args.token_delay, sql=args.sql)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Local stand-in SMTP server (aiosmtpd), so the email outbox can be exercised
+and benchmarked without a real mail server. Messages are counted, not
+delivered. --handshake-delay is added to every EHLO to stand in for the
+TLS and login round trips of a real connection, --data-delay to every
+message, and recipients at --reject-domain get a permanent 550.
+
+    pip install aiosmtpd
+    python -m benchmarks.fake_smtp_server --port 8025
+    MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 MAIL_STARTTLS=false MAIL_USE_CREDENTIALS=false uvicorn main:app
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # only needed for this stand-in
+    Controller = None
+
+
+class CountingHandler:
+    def __init__(self, handshake_delay: float = 0.0, data_delay: float = 0.0, reject_domain: str = ""):
+        self.handshake_delay = handshake_delay
+        self.data_delay = data_delay
+        self.reject_domain = reject_domain.lower()
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.rejected = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self._lock:
+            self.connections += 1
+        await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self.reject_domain and address.lower().endswith("@" + self.reject_domain):
+            with self._lock:
+                self.rejected += 1
+            return "550 5.1.1 Mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.data_delay)
+        with self._lock:
+            self.messages += 1
+        return "250 Message accepted for delivery"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"connections": self.connections, "messages": self.messages, "rejected": self.rejected}
+
+
+def start_server(host: str = "127.0.0.1", port: int = 8025, **handler_options):
+    """Run the stand-in in a background thread; returns (controller, handler)"""
+    if Controller is None:
+        raise SystemExit("The SMTP stand-in needs aiosmtpd: pip install aiosmtpd")
+    handler = CountingHandler(**handler_options)
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    return controller, handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--handshake-delay", type=float, default=0.1, help="seconds added to each EHLO")
+    parser.add_argument("--data-delay", type=float, default=0.0, help="seconds added to each message")
+    parser.add_argument("--reject-domain", default="", help="answer 550 for recipients at this domain")
+    args = parser.parse_args()
+    controller, handler = start_server(args.host, args.port, handshake_delay=args.handshake_delay,
+                                       data_delay=args.data_delay, reject_domain=args.reject_domain)
+    print(f"SMTP stand-in on {args.host}:{args.port}; Ctrl+C to stop")
+    try:
+        last = None
+        while True:
+            time.sleep(5)
+            stats = handler.stats()
+            if stats != last:
+                print(stats)
+                last = stats
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Concurrency stress test for room allocation.
+
+Creates a throwaway hall with --rooms rooms of --capacity beds and --students
+students, then fires one allocation per student from --workers threads, each
+on its own session. In "room" mode every request targets a random room in the
+hall (POST /allocate/ path); in "hall" mode requests ask for any free room
+(POST /allocate/hall path, SKIP LOCKED). Afterwards it checks that no room
+exceeds its capacity and that the room and hall counters match the
+allocation rows, then deletes everything it created.
+
+Run against Postgres; SQLite serializes writers and proves nothing here.
+
+    python -m benchmarks.stress_allocation --students 5000 --rooms 200 --capacity 4 --workers 64
+"""
+import argparse
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import delete, func, select
+
+from src.common.db import SessionLocal, engine
+from src.common.enums import AllocationStatus
+from src.auth.models import User
+from src.hostels.models import Hall, Room, RoomAllocation
+from src.hostels.service import RoomAllocationService
+
+ACADEMIC_YEAR = "2024-2025"
+
+
+def setup(students: int, rooms: int, capacity: int):
+    with SessionLocal() as db:
+        service = RoomAllocationService(db)
+        hall = service.create_hall(
+            name=f"stress-{uuid.uuid4().hex[:8]}",
+            no_of_rooms=rooms,
+            min_level=100,
+            max_level=500,
+            is_open_for_allocation=True,
+            academic_year=ACADEMIC_YEAR,
+        )
+        service.create_rooms_bulk(
+            hall.id, [{"room_number": str(n), "capacity": capacity} for n in range(1, rooms + 1)]
+        )
+        room_ids = list(db.execute(select(Room.id).where(Room.hall_id == hall.id)).scalars())
+        users = [
+            User(email=f"stress-{uuid.uuid4().hex}@example.com", name="stress",
+                 hashed_password="!", level=100)
+            for _ in range(students)
+        ]
+        db.add_all(users)
+        db.commit()
+        return hall.id, room_ids, [user.id for user in users]
+
+
+def allocate(mode: str, hall_id, room_ids, user_id):
+    with SessionLocal() as db:
+        service = RoomAllocationService(db)
+        try:
+            if mode == "hall":
+                service.allocate_room_in_hall(user_id, hall_id, ACADEMIC_YEAR)
+            else:
+                service.allocate_room(user_id, random.choice(room_ids), ACADEMIC_YEAR)
+            return True
+        except ValueError:
+            return False
+
+
+def verify(hall_id) -> list:
+    problems = []
+    with SessionLocal() as db:
+        allocated = dict(
+            db.execute(
+                select(RoomAllocation.room_id, func.count())
+                .where(RoomAllocation.hall_id == hall_id,
+                       RoomAllocation.status == AllocationStatus.ALLOCATED)
+                .group_by(RoomAllocation.room_id)
+            ).all()
+        )
+        for room in db.query(Room).filter(Room.hall_id == hall_id):
+            rows = allocated.get(room.id, 0)
+            if rows > room.capacity:
+                problems.append(f"room {room.room_number}: {rows} allocations for {room.capacity} beds")
+            if room.current_occupancy != rows:
+                problems.append(f"room {room.room_number}: occupancy {room.current_occupancy}, {rows} allocations")
+        hall = db.query(Hall).filter(Hall.id == hall_id).first()
+        total_capacity = db.query(func.sum(Room.capacity)).filter(Room.hall_id == hall_id).scalar() or 0
+        expected_free = total_capacity - sum(allocated.values())
+        if hall.total_available_capacity != expected_free:
+            problems.append(f"hall available capacity {hall.total_available_capacity}, expected {expected_free}")
+    return problems
+
+
+def cleanup(hall_id, user_ids):
+    with SessionLocal() as db:
+        db.execute(delete(RoomAllocation).where(RoomAllocation.hall_id == hall_id))
+        db.execute(delete(Room).where(Room.hall_id == hall_id))
+        db.execute(delete(Hall).where(Hall.id == hall_id))
+        db.execute(delete(User).where(User.id.in_(user_ids)))
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--mode", choices=["room", "hall"], default="room")
+    parser.add_argument("--keep", action="store_true", help="leave the test data in place")
+    args = parser.parse_args()
+
+    hall_id, room_ids, user_ids = setup(args.students, args.rooms, args.capacity)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(lambda user_id: allocate(args.mode, hall_id, room_ids, user_id), user_ids))
+        elapsed = time.perf_counter() - started
+
+        succeeded = sum(results)
+        beds = args.rooms * args.capacity
+        print(f"allocations: {succeeded} succeeded, {len(results) - succeeded} rejected "
+              f"in {elapsed:.2f}s ({len(results) / elapsed:.0f}/s), {beds} beds")
+        problems = verify(hall_id)
+        for problem in problems:
+            print("FAIL", problem)
+        if succeeded > beds:
+            problems.append("more allocations than beds")
+        assert not problems, f"{len(problems)} consistency problems"
+        print("OK: no room over capacity, counters consistent")
+    finally:
+        if not args.keep:
+            cleanup(hall_id, user_ids)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 from fastapi import FastAPI, Request
-from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.auth.routes import(
@@ -7,30 +6,49 @@ from src.auth.routes import(
     profile_router,
     user_router
 )
-from src.common.db import (
-    Base,
-    engine,
-)
-from src.common.seed import seed_db
+from src.common.db import get_pool_stats
+from src.common.events import event_broker, event_listener
+from src.common.security import principal_cache
+from src.common.hashing import password_hasher
+from src.common.ratelimit import rate_limiter
+from src.common.templates import page_response
 from src.complaints.routes import complaint_router
+from src.hostels.queue import allocation_queue, allocation_worker
+from src.mail.worker import outbox_worker
 from src.hostels.routes import(
     hall_router,
     room_router,
     allocation_router
 )
-from src.chat.routes import chat_router
+from src.chat.routes import chat_router, chat_latency, llm
+from src.chat.cache import qa_cache
+from src.chat.intents import intent_router
 from src.dashboard.routes import dashboard_router
 from src.calendar.routes import router
-
-templates = Jinja2Templates(directory="templates")
+from src.calendar.services import calendar_cache
 
 app = FastAPI()
 
+# Schema and seed data are set up once, outside the workers:
+#   python -m src.common.migrate && python -m src.common.seed
 @app.on_event("startup") #TODO: fix deprecations
-def on_startup():
-    Base.metadata.create_all(bind=engine)  # create tables
-    seed_db()  # seed data
+async def start_background_tasks():
+    if allocation_worker is not None:
+        allocation_worker.start()
+    if event_listener is not None:
+        event_listener.start()
+    if outbox_worker is not None:
+        outbox_worker.start()
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    if allocation_worker is not None:
+        await allocation_worker.stop()
+    if event_listener is not None:
+        await event_listener.stop()
+    if outbox_worker is not None:
+        await outbox_worker.stop()
+    password_hasher.shutdown()
 
 
 app.add_middleware(
@@ -39,7 +57,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Redirect-URL"]
+    expose_headers=["X-Redirect-URL", "X-Next-Cursor", "X-Total-Count"]
 )
 
 app.include_router(complaint_router)
@@ -55,9 +73,26 @@ app.include_router(router)
 
 @app.get("/")
 def root(request: Request):
-    return templates.TemplateResponse('index.html', {'request': request})
+    return page_response(request, 'index.html')
 
 @app.get("/health")
 def health():
     return {"ping":"pong"}
+
+@app.get("/health/metrics")
+def health_metrics():
+    return {
+        "db_pools": get_pool_stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "allocation_queue": allocation_queue.stats() if allocation_queue else None,
+        "events": event_broker.stats(),
+        "email_outbox": outbox_worker.stats() if outbox_worker else None,
+        "calendar_cache": calendar_cache.stats(),
+        "chat": {name: recorder.as_dict() for name, recorder in chat_latency.items()},
+        "chat_cache": qa_cache.stats(),
+        "chat_intents": intent_router.stats(),
+        "llm": llm.stats(),
+        "rate_limits": rate_limiter.stats(),
+    }
 print(app)
\ No newline at end of file
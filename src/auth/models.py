@@ -9,7 +9,7 @@ from sqlalchemy import (
     func
 )
 from sqlalchemy.dialects.postgresql import UUID
-from src.common.db import Base, engine
+from src.common.db import Base
 
 class User(Base):
     __tablename__ = "users"
@@ -29,5 +29,5 @@ class User(Base):
     updated_at = Column(DateTime(timezone=True),
                         onupdate=func.now(), nullable=True)
     phone_number = Column(String(11), nullable=True)
-
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # Secret behind the user's calendar feed URL; replaced to revoke it
+    calendar_feed_key = Column(String(64), nullable=True)
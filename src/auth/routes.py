@@ -1,6 +1,9 @@
 from typing import List, Annotated
 from uuid import UUID
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from fastapi import (
     APIRouter,
@@ -9,13 +12,11 @@ from fastapi import (
     Depends,
     Request,
     Path,
+    Query,
     Response
 )
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 from fastapi.security import OAuth2PasswordRequestForm
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from .models import User
 from .schemas import (
     UserCreate,
@@ -24,21 +25,24 @@ from .schemas import (
     UserUpdate,
     Token
 )
-templates = Jinja2Templates(directory="templates")
-from src.common.db import get_db
+from src.common.db import get_db, get_read_db, get_async_db
 from src.common.security import (
     create_access_token,
-    hash_password,
-    verify_password,
     is_admin,
+    is_admin_async,
     get_current_user,
-    generate_random_password,
-    send_password_reset_email
+    invalidate_principal,
+    Principal
 )
 from src.common.config import ACCESS_TOKEN_EXPIRES
+from src.common.hashing import password_hasher
+from src.common.export import ExportFormat, export_response
 from src.common.handlers import AccountDeletionHandler  # Import the handler
+from src.common.ratelimit import rate_limiter
+from src.common.templates import page_response
+from src.mail.service import queue_password_reset
+from src.mail.worker import outbox_worker
 
-limiter = Limiter(key_func=get_remote_address)
 auth_router = APIRouter(
     prefix="/auth",
     tags=["AUTH"]
@@ -54,19 +58,37 @@ user_router = APIRouter(
 )
 
 @auth_router.post("/login", response_model=Token)
-# @limiter.limit("3/hour")
-def login_user(
+async def login_user(
     request: Request,
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_user = db.query(User).filter(User.email == form_data.username).first()
-    if not db_user or not verify_password(form_data.password, db_user.hashed_password):
+    # Per client and per account, before any password is checked
+    await rate_limiter.check(request, response, "login", user=form_data.username)
+    db_user = (await db.execute(
+        select(User.id, User.email, User.is_admin, User.hashed_password).where(User.email == form_data.username)
+    )).first()
+    # Give the connection back while bcrypt runs, so queued logins cannot
+    # drain the pool before the hashing backpressure answers 503
+    await db.rollback()
+    verified, new_hash = (False, None)
+    if db_user:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, db_user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail = "Invalid Credentials"
         )
+    if new_hash:
+        # Stored hash predates the configured bcrypt cost; upgrade it transparently,
+        # unless the password changed meanwhile
+        await db.execute(
+            update(User)
+            .where(User.id == db_user.id, User.hashed_password == db_user.hashed_password)
+            .values(hashed_password=new_hash)
+        )
+        await db.commit()
     access_token = create_access_token(
         data={
             "sub": str(db_user.id),
@@ -84,28 +106,39 @@ def login_user(
     
 
 @auth_router.post("/get-started", response_model=UserResponse)
-def get_started(
+async def get_started(
     request: Request,
     user: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    existing_mail = db.query(User).filter(User.email == user.email).first()
+    existing_mail = (await db.execute(select(User.id).where(User.email == user.email))).first()
+    # Give the connection back while bcrypt runs; it is taken again for the insert
+    await db.rollback()
     if existing_mail:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail= "Email already registered"
         )
+    hashed_password = await password_hasher.hash(user.password)
     new_user = User(
         email = user.email,
         name = f"{user.first_name} {user.last_name}",
         level = user.level,
         department = user.department,
         phone_number = user.phone_number,
-        hashed_password = hash_password(user.password),
+        hashed_password = hashed_password,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Registered by a concurrent request while the password was hashed
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail= "Email already registered"
+        )
+    await db.refresh(new_user)
 
     return UserResponse(
         id = str(new_user.id),
@@ -122,8 +155,15 @@ def update_user_profile(
     request: Request,
     user_update: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_user)
 ):
+    current_user = db.query(User).filter(User.id == principal.id).first()
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
     # Update user details
     if user_update.first_name or user_update.last_name:
         # If either first name or last name is provided, update the name
@@ -140,6 +180,7 @@ def update_user_profile(
     # Save changes to database
     db.commit()
     db.refresh(current_user)
+    invalidate_principal(current_user.id)
     
     # Return updated user information
     return UserResponse(
@@ -153,7 +194,7 @@ def update_user_profile(
 @profile_router.delete("/delete-account")
 def delete_account(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_user)
 ) -> dict:
     # First, handle room allocations
     try:
@@ -161,8 +202,11 @@ def delete_account(
         # allocation_result = handler.handle_user_deletion(str(current_user.id))
         
         # Then proceed with account deletion
-        db.delete(current_user)
-        db.commit()
+        current_user = db.query(User).filter(User.id == principal.id).first()
+        if current_user:
+            db.delete(current_user)
+            db.commit()
+        invalidate_principal(principal.id)
         
         return {
             "message": "Account deleted successfully"
@@ -178,34 +222,32 @@ def delete_account(
 @auth_router.post("/forgot-password", response_model=dict)
 async def forgot_password(
     request: Request,
+    response: Response,
     user_data: UserForgotPassword,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    await rate_limiter.check(request, response, "forgot_password", user=user_data.email)
     # Find user by email
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
     if not user:
         # For security reasons, don't reveal if the email exists or not
         # Just return success message regardless
         return {"message": "If your email is registered, you will receive an email with your new password"}
     
     try:
-        # Generate a random password
-        new_password = generate_random_password(12)
-        
-        # Update user's password in the database
-        user.hashed_password = hash_password(new_password)
-        db.commit()
-        
-        # Send email with new password - directly, not in background
-        await send_password_reset_email(
-            email_to=user.email,
-            user_name=user.name,
-            new_password=new_password
-        )
+        # The outbox worker generates the new password, sets it and emails it,
+        # so the password is never stored and the request never waits on the mail server
+        queue_password_reset(db, user)
+        await db.commit()
+        if outbox_worker is not None:
+            outbox_worker.wake()
         
         return {"message": "If your email is registered, you will receive an email with your new password"}
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process password reset request"
@@ -215,7 +257,7 @@ async def forgot_password(
 def get_all_users(
     request: Request,
     admin: User = Depends(is_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     users = db.query(User).all()
     result = []
@@ -231,6 +273,25 @@ def get_all_users(
         ))
     return result  
 
+@user_router.get("/export")
+async def export_users(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    admin: Principal = Depends(is_admin_async)
+):
+    """Stream every user as NDJSON or CSV in constant memory"""
+    query = select(
+        User.id,
+        User.email,
+        User.name,
+        User.level,
+        User.department,
+        User.phone_number,
+        User.avatar_url.label("profile_photo_url"),
+        User.is_admin,
+        User.created_at,
+    )
+    return export_response(query, export_format, "users")
+
 @user_router.delete("/{user_id}", response_model=dict)
 def delete_user_by_id(
     request: Request,
@@ -253,6 +314,7 @@ def delete_user_by_id(
         # Then proceed with account deletion
         db.delete(user)
         db.commit()
+        invalidate_principal(user_id)
         
         return {
             "message": f"User with id: {user_id} deleted successfully",
@@ -297,6 +359,7 @@ def admin_update_user_details(
     # Save changes to database
     db.commit()
     db.refresh(user)
+    invalidate_principal(user.id)
     
     # Return updated user information
     return UserResponse(
@@ -309,16 +372,16 @@ def admin_update_user_details(
 
 @auth_router.get("/login")
 def root(request: Request):
-    return templates.TemplateResponse('login.html', {'request': request})
+    return page_response(request, 'login.html')
 
 @auth_router.get("/get-started")
 def root(request: Request):
-    return templates.TemplateResponse('signup.html', {'request': request})
+    return page_response(request, 'signup.html')
 
 @profile_router.get("/me", response_model=UserResponse)
 def get_current_user_profile(
     request: Request,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     return UserResponse(
         id=str(current_user.id),
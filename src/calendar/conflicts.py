@@ -0,0 +1,83 @@
+"""
+Double bookings of a location. Every occurrence becomes an interval and one
+sweep per location, in start order, finds the overlaps in O(n log n): intervals
+still running when the next one starts sit in a heap ordered by end.
+
+Existing events always win; of two new events the one starting later loses.
+Recurring series are only checked for CALENDAR_CONFLICT_HORIZON_DAYS past
+their first occurrence.
+"""
+import heapq
+import itertools
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+from .recurrence import occurrences, parse_rule
+
+CALENDAR_CONFLICT_HORIZON_DAYS = int(os.environ.get("CALENDAR_CONFLICT_HORIZON_DAYS", "366"))
+
+
+def location_key(location: Optional[str]) -> Optional[str]:
+    """Locations match case-insensitively, like the Postgres exclusion constraint"""
+    if location is None or not location.strip():
+        return None
+    return location.strip().lower()
+
+
+@dataclass(frozen=True)
+class Booking:
+    """One occurrence of an event at a location"""
+    key: str
+    start: datetime
+    end: datetime
+    ref: Hashable  # the event's id, or its row in an import
+    existing: bool
+    event: Any = None
+
+
+def horizon(start: datetime, end: datetime, recurrence_end: Optional[datetime], rule: Optional[str]) -> datetime:
+    """How far the bookings of an event are checked"""
+    if not rule:
+        return end
+    limit = start + timedelta(days=CALENDAR_CONFLICT_HORIZON_DAYS)
+    return min(recurrence_end, limit) if recurrence_end is not None else limit
+
+
+def bookings(key: str, start: datetime, end: datetime, rule: Optional[str], ref: Hashable, existing: bool,
+             window_start: datetime, window_end: datetime, event: Any = None) -> Iterator[Booking]:
+    """The event's occurrences within [window_start, window_end) as bookings"""
+    if rule:
+        spans = occurrences(start, end, parse_rule(rule), window_start, window_end)
+    else:
+        spans = [(start, end)] if start < window_end and end > window_start else []
+    for span_start, span_end in spans:
+        yield Booking(key, span_start, span_end, ref, existing, event)
+
+
+def sweep(items: Iterable[Booking]) -> Dict[Hashable, Tuple[Booking, Booking]]:
+    """Refs of the new events that clash, each with (its booking, the booking it clashes with)"""
+    rejected: Dict[Hashable, Tuple[Booking, Booking]] = {}
+    active: Dict[str, list] = {}
+    order = itertools.count()
+    # Existing bookings first among equal starts, so they are the ones kept
+    for booking in sorted(items, key=lambda b: (b.key, b.start, not b.existing)):
+        running = active.setdefault(booking.key, [])
+        # Touching is not overlapping: an event may start when the previous one ends
+        while running and running[0][0] <= booking.start:
+            heapq.heappop(running)
+        if not booking.existing and booking.ref in rejected:
+            continue
+        for _, _, other in running:
+            if other.ref == booking.ref or other.ref in rejected or (other.existing and booking.existing):
+                continue
+            if booking.existing:
+                # A new event already placed here loses to the existing one
+                rejected[other.ref] = (other, booking)
+                continue
+            rejected[booking.ref] = (booking, other)
+            break
+        if booking.existing or booking.ref not in rejected:
+            heapq.heappush(running, (booking.end, next(order), booking))
+    return rejected
@@ -0,0 +1,192 @@
+"""
+iCalendar (RFC 5545) output for the calendar feed and input for imports.
+Event times are stored as entered, without a zone, so they are written as
+floating local times; on input, UTC times are kept in UTC and times with a
+TZID are taken as wall-clock times.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Tuple
+
+PRODID = "-//HMS//Hostel Calendar//EN"
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Lines longer than 75 octets continue on lines starting with a space"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        # Do not split a UTF-8 sequence
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+    return "\r\n ".join(parts)
+
+
+def _local(moment: datetime) -> str:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def _utc(moment: datetime) -> str:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_calendar(events: Iterable, name: str = "Hostel events", domain: str = "hms") -> bytes:
+    """One VCALENDAR with a VEVENT per event; recurring events keep their RRULE"""
+    stamp = _utc(datetime.now(timezone.utc))
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+    for event in events:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{event.id}@{domain}",
+            f"DTSTAMP:{_utc(event.updated_at) if event.updated_at else stamp}",
+            f"DTSTART:{_local(event.start_time)}",
+            f"DTEND:{_local(event.end_time)}",
+            f"SUMMARY:{_escape(event.title)}",
+        ]
+        if event.description:
+            lines.append(f"DESCRIPTION:{_escape(event.description)}")
+        if event.location:
+            lines.append(f"LOCATION:{_escape(event.location)}")
+        if event.recurrence_rule:
+            lines.append(f"RRULE:{event.recurrence_rule}")
+        if event.updated_at:
+            lines.append(f"LAST-MODIFIED:{_utc(event.updated_at)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode()
+
+
+_DURATION = re.compile(r"^\+?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+_ESCAPED = re.compile(r"\\([\\;,nN])")
+
+
+def _unescape(value: str) -> str:
+    return _ESCAPED.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _unfold(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """(line number, content line) with continuation lines joined back on"""
+    current, number = None, 0
+    for position, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield number, current
+        current, number = line, position
+    if current:
+        yield number, current
+
+
+def _split(line: str) -> Tuple[str, dict, str]:
+    """NAME;PARAM=value:VALUE, with colons allowed inside quoted parameters"""
+    quoted = False
+    for position, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            head, value = line[:position], line[position + 1:]
+            break
+    else:
+        raise ValueError(f"Invalid iCalendar line: {line[:40]}")
+    name, *params = head.split(";")
+    return name.upper(), dict(param.upper().split("=", 1) for param in params if "=" in param), value
+
+
+def _parse_time(value: str, params: dict) -> Tuple[datetime, bool]:
+    """The time and whether it is a whole day"""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d"), True
+    if value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ"), False
+    return datetime.strptime(value, "%Y%m%dT%H%M%S"), False
+
+
+def _parse_duration(value: str) -> timedelta:
+    match = _DURATION.match(value.strip().upper())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unsupported DURATION: {value}")
+    weeks, days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def _event_fields(properties: dict) -> dict:
+    """Event column values from one VEVENT's properties; ValueError if it cannot be imported"""
+    if "RECURRENCE-ID" in properties or "EXDATE" in properties or "RDATE" in properties:
+        raise ValueError("Changed or excluded occurrences (RECURRENCE-ID, EXDATE, RDATE) are not supported")
+    if properties.get("STATUS", ("", {}))[0].upper() == "CANCELLED":
+        raise ValueError("Cancelled event")
+    if "DTSTART" not in properties:
+        raise ValueError("VEVENT has no DTSTART")
+    start, whole_day = _parse_time(*properties["DTSTART"])
+    if "DTEND" in properties:
+        end, _ = _parse_time(*properties["DTEND"])
+    elif "DURATION" in properties:
+        end = start + _parse_duration(properties["DURATION"][0])
+    else:
+        # RFC 5545: a date lasts the day, a date-time has no duration
+        end = start + timedelta(days=1) if whole_day else start
+    text_of = lambda name: _unescape(properties[name][0]) if name in properties else None
+    return {
+        "title": text_of("SUMMARY"),
+        "description": text_of("DESCRIPTION"),
+        "location": text_of("LOCATION"),
+        "start_time": start,
+        "end_time": end,
+        "recurrence_rule": properties["RRULE"][0] if "RRULE" in properties else None,
+    }
+
+
+def parse_events(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """(line of its BEGIN:VEVENT, event fields or the ValueError it failed with)
+    for every VEVENT, reading the lines as they come"""
+    properties, start_line, depth = None, 0, 0
+    for number, line in _unfold(lines):
+        upper = line.upper()
+        if upper == "BEGIN:VEVENT" and properties is None:
+            properties, start_line, depth = {}, number, 0
+        elif properties is None:
+            continue
+        elif upper.startswith("BEGIN:"):
+            # VALARM and other components nested in the event
+            depth += 1
+        elif upper.startswith("END:") and depth:
+            depth -= 1
+        elif upper == "END:VEVENT":
+            try:
+                yield start_line, _event_fields(properties)
+            except ValueError as e:
+                yield start_line, e
+            properties = None
+        elif not depth:
+            try:
+                name, params, value = _split(line)
+            except ValueError:
+                continue
+            properties.setdefault(name, (value, params))
+    if properties is not None:
+        yield start_line, ValueError("VEVENT is not closed with END:VEVENT")
@@ -0,0 +1,186 @@
+"""
+Bulk import of a semester's events from an iCalendar or CSV file.
+
+The file is read line by line as it is parsed. Rows that cannot be imported
+are reported, not fatal. Every occurrence of the new events and of the
+existing events at the same locations goes through one sweep
+(conflicts.py), so clashes with the calendar and within the file are found
+together. Events that clash are left out and reported; the rest are
+inserted in batches, in one transaction.
+"""
+import csv
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .conflicts import bookings, horizon, location_key, sweep
+from .ics import parse_events
+from .models import Event
+from .recurrence import parse_rule, series_end
+from .services import EventConflict, lock_bookings, naive_utc, window_filter
+
+CALENDAR_IMPORT_BATCH = int(os.environ.get("CALENDAR_IMPORT_BATCH", "1000"))
+CALENDAR_IMPORT_MAX_EVENTS = int(os.environ.get("CALENDAR_IMPORT_MAX_EVENTS", "20000"))
+
+CSV_COLUMNS = ("title", "description", "start_time", "end_time", "location", "recurrence_rule")
+_REQUIRED_CSV_COLUMNS = {"title", "start_time", "end_time"}
+
+
+@dataclass
+class ImportedEvent:
+    line: int
+    values: dict
+    key: Optional[str] = None
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """(line, fields) per CSV record; the header names the columns, in any order"""
+    reader = csv.DictReader(lines)
+    missing = _REQUIRED_CSV_COLUMNS - {name.strip().lower() for name in reader.fieldnames or ()}
+    if missing:
+        raise ValueError(f"CSV is missing the columns: {', '.join(sorted(missing))}")
+    try:
+        for row in reader:
+            fields = {name.strip().lower(): (value or "").strip() for name, value in row.items() if name}
+            yield reader.line_num, {column: fields.get(column) or None for column in CSV_COLUMNS}
+    except csv.Error as e:
+        raise ValueError(f"Invalid CSV at line {reader.line_num}: {e}")
+
+
+def _parse_datetime(value, name: str) -> datetime:
+    if isinstance(value, datetime):
+        return naive_utc(value)
+    if not value:
+        raise ValueError(f"{name} is required")
+    try:
+        return naive_utc(datetime.fromisoformat(value))
+    except ValueError:
+        raise ValueError(f"{name} is not an ISO 8601 date and time: {value}")
+
+
+def _event_values(fields: dict) -> dict:
+    """Column values for one imported event, validated like EventCreate"""
+    title = (fields.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    location = (fields.get("location") or "").strip() or None
+    if len(title) > 255 or (location and len(location) > 255):
+        raise ValueError("title and location may be at most 255 characters")
+    start = _parse_datetime(fields.get("start_time"), "start_time")
+    end = _parse_datetime(fields.get("end_time"), "end_time")
+    if end <= start:
+        raise ValueError("End time must be after start time")
+    rule, recurrence_end = None, None
+    if fields.get("recurrence_rule"):
+        parsed = parse_rule(fields["recurrence_rule"])
+        rule, recurrence_end = str(parsed), series_end(start, end, parsed)
+    return {
+        "title": title,
+        "description": fields.get("description") or None,
+        "start_time": start,
+        "end_time": end,
+        "location": location,
+        "recurrence_rule": rule,
+        "recurrence_end": recurrence_end,
+    }
+
+
+def _conflicts(db: Session, events: List[ImportedEvent]) -> dict:
+    """Line of each clashing new event -> (its booking, the booking it clashes with)"""
+    located = [event for event in events if event.key is not None]
+    if not located:
+        return {}
+    span_start = min(event.values["start_time"] for event in located)
+    span_end = max(
+        horizon(event.values["start_time"], event.values["end_time"],
+                event.values["recurrence_end"], event.values["recurrence_rule"])
+        for event in located
+    )
+    items = []
+    for event in located:
+        values = event.values
+        items.extend(bookings(event.key, values["start_time"], values["end_time"], values["recurrence_rule"],
+                              event.line, False, values["start_time"], span_end, event=event))
+    existing = db.query(Event).filter(
+        func.lower(Event.location).in_({event.key for event in located}),
+        window_filter(span_start, span_end),
+    )
+    for other in existing:
+        items.extend(bookings(location_key(other.location), other.start_time, other.end_time,
+                              other.recurrence_rule, other.id, True, span_start, span_end, event=other))
+    return sweep(items)
+
+
+def _conflict_report(line: int, clash) -> dict:
+    booking, booked = clash
+    event = booking.event
+    report = {
+        "line": line,
+        "title": event.values["title"],
+        "location": event.values["location"],
+        "start_time": booking.start,
+        "end_time": booking.end,
+        "conflicting_start_time": booked.start,
+        "conflicting_end_time": booked.end,
+    }
+    if booked.existing:
+        report.update(conflicts_with=booked.event.title, conflicting_event_id=booked.event.id)
+    else:
+        report.update(conflicts_with=booked.event.values["title"], conflicting_line=booked.event.line)
+    return report
+
+
+def import_events(db: Session, lines: Iterable[str], file_format: str, dry_run: bool = False) -> dict:
+    """Import the events in `lines` (an open text file or any iterable of lines).
+
+    Raises ValueError when the file cannot be read at all, and EventConflict
+    when a concurrent write took one of the slots before commit.
+    """
+    started = time.perf_counter()
+    records = parse_events(lines) if file_format == "ics" else read_csv(lines)
+    events, errors = [], []
+    for line, fields in records:
+        if isinstance(fields, ValueError):
+            errors.append({"line": line, "error": str(fields)})
+            continue
+        try:
+            values = _event_values(fields)
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+            continue
+        if len(events) >= CALENDAR_IMPORT_MAX_EVENTS:
+            raise ValueError(f"An import may hold at most {CALENDAR_IMPORT_MAX_EVENTS} events")
+        events.append(ImportedEvent(line, values, location_key(values["location"])))
+
+    # Held until commit, so no other calendar write lands between the check and the insert
+    lock_bookings(db)
+    clashes = _conflicts(db, events)
+    accepted = [event for event in events if event.line not in clashes]
+
+    if not dry_run:
+        rows = [dict(event.values, id=uuid.uuid4()) for event in accepted]
+        try:
+            for start in range(0, len(rows), CALENDAR_IMPORT_BATCH):
+                db.execute(insert(Event), rows[start:start + CALENDAR_IMPORT_BATCH])
+            db.commit()
+        except IntegrityError:
+            # The exclusion constraint caught an overlap the sweep could not see
+            db.rollback()
+            raise EventConflict("Another change booked one of the same slots during the import; nothing was imported")
+
+    return {
+        "received": len(events) + len(errors),
+        # For a dry run, how many would have been imported
+        "imported": len(accepted),
+        "dry_run": dry_run,
+        "conflicts": [_conflict_report(line, clash) for line, clash in sorted(clashes.items())],
+        "errors": errors,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
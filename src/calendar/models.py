@@ -1,8 +1,8 @@
 import uuid
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index, text
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import UUID
-from src.common.db import Base, engine
+from sqlalchemy.dialects.postgresql import UUID, ExcludeConstraint
+from src.common.db import Base
 
 class Event(Base):
     __tablename__ = "events"
@@ -13,7 +13,23 @@ class Event(Base):
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
     location = Column(String(255), nullable=True)
+    # RRULE value (see recurrence.py); start_time/end_time are the first occurrence
+    recurrence_rule = Column(String(255), nullable=True)
+    # End of the last occurrence, NULL for a series without an end
+    recurrence_end = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    __table_args__ = (
+        # Window queries: start_time < :to AND end_time > :from
+        Index("ix_events_start_time_end_time", "start_time", "end_time"),
+        # One booking of a location at a time (Postgres, needs btree_gist). Recurring
+        # series store only their first occurrence, so they are checked in Python.
+        ExcludeConstraint(
+            (func.lower(location), "="),
+            (func.tsrange(start_time, end_time), "&&"),
+            name="ex_events_location_time",
+            using="gist",
+            where=text("location IS NOT NULL AND recurrence_rule IS NULL"),
+        ).ddl_if(dialect="postgresql"),
+    )
@@ -0,0 +1,173 @@
+"""
+The subset of iCalendar RRULE the calendar stores on recurring events:
+FREQ=DAILY|WEEKLY|MONTHLY|YEARLY with INTERVAL, COUNT or UNTIL, and BYDAY
+(plain weekdays) for weekly rules. Occurrences are generated for a window
+only; daily and weekly rules jump straight to the window instead of
+walking the series from its first occurrence.
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+# Longest series accepted with COUNT; its end is found by walking it at write time
+MAX_COUNT = 5000
+
+
+@dataclass(frozen=True)
+class Rule:
+    freq: str
+    interval: int = 1
+    count: Optional[int] = None
+    until: Optional[datetime] = None
+    # Weekday numbers (Monday is 0); weekly rules only
+    byday: Tuple[int, ...] = ()
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%dT%H%M%S}")
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in self.byday))
+        return ";".join(parts)
+
+
+def _parse_until(value: str) -> datetime:
+    value = value.rstrip("Z")
+    for fmt in ("%Y%m%dT%H%M%S", "%Y%m%d"):
+        try:
+            until = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # A date-only UNTIL includes that whole day
+        return until if "T" in value else until.replace(hour=23, minute=59, second=59)
+    raise ValueError(f"Invalid UNTIL in recurrence rule: {value}")
+
+
+def parse_rule(text: str) -> Rule:
+    """Parse an RRULE value such as "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=20".
+    Raises ValueError for anything outside the supported subset."""
+    fields = {}
+    for part in text.strip().upper().removeprefix("RRULE:").split(";"):
+        if not part:
+            continue
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid recurrence rule part: {part}")
+        fields[key.strip()] = value.strip()
+
+    freq = fields.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Recurrence FREQ must be one of {', '.join(FREQUENCIES)}")
+    try:
+        interval = int(fields.pop("INTERVAL", "1"))
+        count = int(fields["COUNT"]) if "COUNT" in fields else None
+    except ValueError:
+        raise ValueError("Recurrence INTERVAL and COUNT must be whole numbers")
+    fields.pop("COUNT", None)
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("Recurrence INTERVAL and COUNT must be positive")
+    if count is not None and count > MAX_COUNT:
+        raise ValueError(f"Recurrence COUNT may be at most {MAX_COUNT}")
+    until = _parse_until(fields.pop("UNTIL")) if "UNTIL" in fields else None
+    if count is not None and until is not None:
+        raise ValueError("A recurrence rule takes COUNT or UNTIL, not both")
+
+    byday = ()
+    if "BYDAY" in fields:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported for weekly recurrence")
+        try:
+            byday = tuple(sorted({WEEKDAYS.index(day) for day in fields.pop("BYDAY").split(",")}))
+        except ValueError:
+            raise ValueError("BYDAY takes weekdays such as MO,WE,FR")
+    fields.pop("WKST", None)
+    if fields:
+        raise ValueError(f"Unsupported recurrence rule parts: {', '.join(sorted(fields))}")
+    return Rule(freq=freq, interval=interval, count=count, until=until, byday=byday)
+
+
+def _add_months(moment: datetime, months: int) -> Optional[datetime]:
+    """The same day `months` later, or None when that month is too short"""
+    year, month = divmod(moment.month - 1 + months, 12)
+    year += moment.year
+    if moment.day > calendar.monthrange(year, month + 1)[1]:
+        return None
+    return moment.replace(year=year, month=month + 1)
+
+
+def _starts(start: datetime, rule: Rule, not_before: datetime) -> Iterator[Tuple[int, datetime]]:
+    """(index in the series, start) of each occurrence, beginning at the
+    first one that can still end after `not_before`"""
+    if rule.freq == "DAILY":
+        period = timedelta(days=rule.interval)
+        index = max(0, (not_before - start) // period)
+        while True:
+            yield index, start + index * period
+            index += 1
+
+    elif rule.freq == "WEEKLY":
+        days = rule.byday or (start.weekday(),)
+        week_zero = start - timedelta(days=start.weekday())
+        first_week = [day for day in days if day >= start.weekday()]
+        period = timedelta(weeks=rule.interval)
+        week = max(0, (not_before - week_zero) // period)
+        while True:
+            if week == 0:
+                index, week_days = 0, first_week
+            else:
+                index, week_days = len(first_week) + (week - 1) * len(days), days
+            monday = week_zero + week * period
+            for day in week_days:
+                yield index, monday + timedelta(days=day)
+                index += 1
+            week += 1
+
+    else:
+        step = 12 if rule.freq == "YEARLY" else 1
+        index, k = 0, 0
+        while True:
+            moment = _add_months(start, k * step * rule.interval)
+            k += 1
+            if moment is None:
+                # Skipped like RFC 5545 does, e.g. the 31st in a 30-day month
+                continue
+            yield index, moment
+            index += 1
+
+
+def occurrences(start: datetime, end: datetime, rule: Rule,
+                window_start: datetime, window_end: datetime) -> Iterator[Tuple[datetime, datetime]]:
+    """(start, end) of every occurrence overlapping [window_start, window_end)"""
+    duration = end - start
+    try:
+        for index, occurrence in _starts(start, rule, window_start - duration):
+            if rule.count is not None and index >= rule.count:
+                return
+            if rule.until is not None and occurrence > rule.until:
+                return
+            if occurrence >= window_end:
+                return
+            if occurrence + duration > window_start:
+                yield occurrence, occurrence + duration
+    except OverflowError:
+        # The series runs past year 9999
+        return
+
+
+def series_end(start: datetime, end: datetime, rule: Rule) -> Optional[datetime]:
+    """When the last occurrence ends; None for a series without an end"""
+    if rule.until is not None:
+        return rule.until + (end - start)
+    if rule.count is None:
+        return None
+    last = None
+    for _, last_end in occurrences(start, end, rule, start, datetime.max - (end - start)):
+        last = last_end
+    return last
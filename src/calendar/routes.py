@@ -1,26 +1,69 @@
+import io
+import os
+from datetime import datetime, timedelta
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from .models import Event
 from .schemas import (
+    CalendarFeedLink,
+    CalendarImportReport,
     EventCreate,
     EventRead,
     EventUpdate
 )
-from src.common.db import get_db
-from src.common.security import get_current_user, is_admin
+from src.common.db import get_db, get_read_db
+from src.common.conditional import Validator, change_stamp
+from src.common.security import create_feed_token, get_current_user, get_feed_user, is_admin
+from .ics import render_calendar
+from .importer import import_events
 router = APIRouter(
     prefix="/calendar",
     tags=["Calendar"],
 )
 from .services import (
+    EventConflict,
+    calendar_cache,
     get_event,
     get_events,
+    get_events_in_window,
+    get_feed_events,
+    get_feed_key,
+    revoke_feed_key,
     create_event,
+    naive_utc,
     update_event,
     delete_event
 )
+
+# A window given only one bound spans this many days
+CALENDAR_DEFAULT_WINDOW_DAYS = 31
+CALENDAR_MAX_WINDOW_DAYS = int(os.environ.get("CALENDAR_MAX_WINDOW_DAYS", "366"))
+# The feed starts this many days back, so recent events stay in subscribed calendars
+CALENDAR_FEED_PAST_DAYS = int(os.environ.get("CALENDAR_FEED_PAST_DAYS", "30"))
+
+_event_list = TypeAdapter(List[EventRead])
+
+
+def _resolve_window(start: Optional[datetime], end: Optional[datetime]):
+    start = naive_utc(start) if start is not None else None
+    end = naive_utc(end) if end is not None else None
+    if start is None:
+        start = end - timedelta(days=CALENDAR_DEFAULT_WINDOW_DAYS)
+    if end is None:
+        end = start + timedelta(days=CALENDAR_DEFAULT_WINDOW_DAYS)
+    if end <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must be after 'from'")
+    if end - start > timedelta(days=CALENDAR_MAX_WINDOW_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The window may span at most {CALENDAR_MAX_WINDOW_DAYS} days"
+        )
+    return start, end
+
 @router.post("/", response_model=EventRead, status_code=status.HTTP_201_CREATED)
 def create_new_event_route(
     event: EventCreate,
@@ -29,24 +72,119 @@ def create_new_event_route(
 ):
     try:
         return create_event(db=db, event=event)
+    except EventConflict as e: # The location is already booked
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except ValueError as e: # Catch validation errors from Pydantic or CRUD
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/import", response_model=CalendarImportReport)
+def import_events_route(
+    file: UploadFile = File(..., description="An iCalendar (.ics) file, or CSV with a header row"),
+    file_format: Optional[str] = Query(None, alias="format", pattern="^(ics|csv)$", description="Defaults to the file's extension"),
+    dry_run: bool = Query(False, description="Only report what would be imported"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(is_admin) # Admin only
+):
+    if file_format is None:
+        name = (file.filename or "").lower()
+        content_type = (file.content_type or "").lower()
+        if name.endswith(".ics") or content_type.startswith("text/calendar"):
+            file_format = "ics"
+        elif name.endswith(".csv") or content_type.startswith("text/csv"):
+            file_format = "csv"
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass ?format=ics or ?format=csv")
+    # Read line by line from the spooled upload rather than loaded whole
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        return import_events(db, lines, file_format, dry_run=dry_run)
+    except EventConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        lines.detach()
+
+
 @router.get("/", response_model=List[EventRead])
 def read_events_route(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    start: Optional[datetime] = Query(None, alias="from", description="Window start; recurring events are expanded within the window"),
+    end: Optional[datetime] = Query(None, alias="to", description="Window end (exclusive)"),
+    db: Session = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user) # Students and Admins
+):
+    window = _resolve_window(start, end) if start is not None or end is not None else None
+    scope = f"calendar|{window[0].isoformat()}|{window[1].isoformat()}" if window else f"calendar|{skip}|{limit}"
+    # Same calendar for every user, but only for signed-in ones
+    validator = Validator(scope, db.execute(change_stamp(Event)).one(), cache_control="private, no-cache")
+    if validator.matches(request):
+        return validator.not_modified()
+    if window is None:
+        response.headers.update(validator.headers)
+        events = get_events(db, skip=skip, limit=limit)
+        return events
+
+    body = calendar_cache.get(validator.etag)
+    if body is None:
+        body = _event_list.dump_json(_event_list.validate_python(get_events_in_window(db, *window)))
+        calendar_cache.set(validator.etag, body)
+    return Response(content=body, media_type="application/json", headers=validator.headers)
+
+
+@router.get("/feed.ics", response_class=Response)
+def read_calendar_feed_route(
+    request: Request,
+    start: Optional[datetime] = Query(None, alias="from", description="Leave out events that ended before this"),
+    db: Session = Depends(get_read_db),
+    current_user: dict = Depends(get_feed_user) # ?token= from GET /calendar/feed-link, never a login token
+):
+    if start is None:
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=CALENDAR_FEED_PAST_DAYS)
+    start = naive_utc(start)
+    validator = Validator(f"calendar.ics|{start.isoformat()}", db.execute(change_stamp(Event)).one(),
+                          cache_control="private, no-cache")
+    if validator.matches(request):
+        return validator.not_modified()
+    body = calendar_cache.get(validator.etag)
+    if body is None:
+        body = render_calendar(get_feed_events(db, start))
+        calendar_cache.set(validator.etag, body)
+    return Response(
+        content=body,
+        media_type="text/calendar; charset=utf-8",
+        headers={**validator.headers, "Content-Disposition": 'inline; filename="hms-calendar.ics"'},
+    )
+
+@router.get("/feed-link", response_model=CalendarFeedLink)
+def read_calendar_feed_link_route(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user) # Students and Admins
+):
+    feed_key = get_feed_key(db, current_user.id)
+    url = request.url_for("read_calendar_feed_route").include_query_params(
+        token=create_feed_token(current_user.id, feed_key)
+    )
+    return {"url": str(url)}
+
+@router.delete("/feed-link", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_calendar_feed_link_route(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user) # Students and Admins
 ):
-    events = get_events(db, skip=skip, limit=limit)
-    return events
+    revoke_feed_key(db, current_user.id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.get("/{event_id}", response_model=EventRead)
 def read_single_event_route(
     event_id: UUID,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: dict = Depends(is_admin) # Students and Admins
 ):
     db_event = get_event(db, event_id=event_id)
@@ -63,6 +201,8 @@ def update_existing_event_route(
 ):
     try:
         db_event = update_event(db=db, event_id=event_id, event_update=event_update)
+    except EventConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         
@@ -1,7 +1,7 @@
 # In your schemas file (e.g., schemas/event.py or schemas.py)
 from pydantic import BaseModel, validator,UUID4
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class EventBase(BaseModel):
     title: str
@@ -9,6 +9,8 @@ class EventBase(BaseModel):
     start_time: datetime
     end_time: datetime
     location: Optional[str] = None
+    # iCalendar RRULE, e.g. "FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20261218"; start/end are the first occurrence
+    recurrence_rule: Optional[str] = None
 
     @validator('end_time')
     def end_time_must_be_after_start_time(cls, v, values, **kwargs):
@@ -25,6 +27,7 @@ class EventUpdate(BaseModel): # For partial updates
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     location: Optional[str] = None
+    recurrence_rule: Optional[str] = None
 
     @validator('end_time', always=True) # always=True to run even if start_time is not provided in update
     def end_time_must_be_after_start_time_update(cls, v, values, **kwargs):
@@ -44,4 +47,37 @@ class EventRead(EventBase):
     # created_by_id: Optional[int] = None # If you add it to model
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportConflict(BaseModel):
+    line: int
+    title: str
+    location: str
+    # The clashing occurrence and the booking it clashes with
+    start_time: datetime
+    end_time: datetime
+    conflicts_with: str
+    conflicting_start_time: datetime
+    conflicting_end_time: datetime
+    conflicting_event_id: Optional[UUID4] = None # An event already in the calendar
+    conflicting_line: Optional[int] = None # Another event in the same file
+
+
+class CalendarImportReport(BaseModel):
+    received: int
+    imported: int
+    dry_run: bool
+    conflicts: List[ImportConflict]
+    errors: List[ImportRowError]
+    elapsed_ms: float
+
+
+class CalendarFeedLink(BaseModel):
+    # Subscribe to this URL; it keeps working until the link is revoked
+    url: str
@@ -1,12 +1,89 @@
+import itertools
+import os
+from datetime import datetime, timezone
+from sqlalchemy import and_, func, or_, select, true, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from .conflicts import bookings, horizon, location_key, sweep
 from .models import Event 
+from .recurrence import occurrences, parse_rule, series_end
 from .schemas import EventCreate, EventUpdate
 from typing import List, Optional
+from src.common.cache import TTLCache
+from src.auth.models import User
+from src.common.db import advisory_xact_lock
+from src.common.security import new_feed_key
+
+# Rendered window and feed bodies, keyed by ETag: any change to the events
+# table gives a new ETag, so an entry is never served stale
+CALENDAR_CACHE_SIZE = int(os.environ.get("CALENDAR_CACHE_SIZE", "256"))
+calendar_cache = TTLCache(maxsize=CALENDAR_CACHE_SIZE, ttl=3600)
+
+def naive_utc(moment: datetime) -> datetime:
+    """Event times are stored without a zone; aware input is taken as UTC"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _set_recurrence(db_event: Event):
+    """Validate the rule and store when the series ends, so window queries
+    can skip finished series without expanding them"""
+    if not db_event.recurrence_rule:
+        db_event.recurrence_rule = None
+        db_event.recurrence_end = None
+        return
+    rule = parse_rule(db_event.recurrence_rule)  # ValueError for unsupported rules
+    db_event.recurrence_rule = str(rule)
+    db_event.recurrence_end = series_end(naive_utc(db_event.start_time), naive_utc(db_event.end_time), rule)
+
+class EventConflict(ValueError):
+    """The event's location is already booked for part of its time"""
+
+def lock_bookings(db: Session):
+    """Serialize calendar writes until commit, so two writers cannot both pass
+    the conflict check (Postgres only, like advisory_xact_lock)"""
+    advisory_xact_lock(db.connection(), "hms:calendar")
+
+def check_conflicts(db: Session, db_event: Event):
+    """Raise EventConflict when another event holds the same location at an
+    overlapping time; recurring events are compared occurrence by occurrence"""
+    key = location_key(db_event.location)
+    if key is None:
+        return
+    start, end = naive_utc(db_event.start_time), naive_utc(db_event.end_time)
+    until = horizon(start, end, db_event.recurrence_end, db_event.recurrence_rule)
+    items = list(bookings(key, start, end, db_event.recurrence_rule, "new", False, start, until))
+    # The event itself may be a pending change; it must not be flushed by the query
+    with db.no_autoflush:
+        query = db.query(Event).filter(func.lower(Event.location) == key, window_filter(start, until))
+        if db_event.id is not None:
+            query = query.filter(Event.id != db_event.id)
+        for other in query:
+            items.extend(bookings(key, other.start_time, other.end_time, other.recurrence_rule, other.id, True,
+                                  start, until, event=other))
+    clash = sweep(items).get("new")
+    if clash:
+        booked = clash[1]
+        raise EventConflict(
+            f"{db_event.location.strip()} is already booked for '{booked.event.title}' "
+            f"from {booked.start:%Y-%m-%d %H:%M} to {booked.end:%Y-%m-%d %H:%M}"
+        )
+
+def _commit_booking(db: Session):
+    try:
+        db.commit()
+    except IntegrityError:
+        # The exclusion constraint caught an overlap written concurrently
+        db.rollback()
+        raise EventConflict("The location is already booked for that time")
 
 def create_event(db: Session, event: EventCreate) -> Event:
     db_event = Event(**event.dict())
+    _set_recurrence(db_event)
+    lock_bookings(db)
+    check_conflicts(db, db_event)
     db.add(db_event)
-    db.commit()
+    _commit_booking(db)
     db.refresh(db_event)
     return db_event
 
@@ -16,6 +93,86 @@ def get_event(db: Session, event_id: int) -> Optional[Event]:
 def get_events(db: Session, skip: int = 0, limit: int = 100) -> List[Event]:
     return db.query(Event).order_by(Event.start_time.asc()).offset(skip).limit(limit).all()
 
+def window_filter(start: datetime, end: Optional[datetime] = None):
+    """Events with an occurrence that may overlap [start, end), or that end
+    after `start` when there is no `end`. The index on (start_time, end_time)
+    bounds the scan; recurring series still running at `start` are kept and
+    expanded in Python."""
+    return and_(
+        Event.start_time < end if end is not None else true(),
+        or_(
+            Event.end_time > start,
+            and_(
+                Event.recurrence_rule.is_not(None),
+                or_(Event.recurrence_end.is_(None), Event.recurrence_end > start),
+            ),
+        ),
+    )
+
+def get_events_in_window(db: Session, start: datetime, end: datetime) -> List[dict]:
+    """Every occurrence overlapping [start, end), ordered by start. A recurring
+    event is expanded within the window only; its occurrences share its id."""
+    items = []
+    for db_event in db.query(Event).filter(window_filter(start, end)).order_by(Event.start_time.asc()):
+        fields = {column.name: getattr(db_event, column.name) for column in Event.__table__.columns}
+        if not db_event.recurrence_rule:
+            items.append(fields)
+            continue
+        rule = parse_rule(db_event.recurrence_rule)
+        for occurrence_start, occurrence_end in occurrences(db_event.start_time, db_event.end_time, rule, start, end):
+            items.append(dict(fields, start_time=occurrence_start, end_time=occurrence_end))
+    items.sort(key=lambda item: item["start_time"])
+    return items
+
+def get_upcoming_events(db: Session, start: datetime, limit: int) -> List[dict]:
+    """The first `limit` occurrences starting at or after `start`, ordered by
+    start. Series that began earlier are expanded through the same window
+    query, not skipped for their first start_time."""
+    columns = Event.__table__.columns
+    items = [
+        {column.name: getattr(db_event, column.name) for column in columns}
+        for db_event in db.query(Event)
+        .filter(Event.recurrence_rule.is_(None), Event.start_time >= start)
+        .order_by(Event.start_time.asc())
+        .limit(limit)
+    ]
+    for db_event in db.query(Event).filter(Event.recurrence_rule.is_not(None), window_filter(start)):
+        fields = {column.name: getattr(db_event, column.name) for column in columns}
+        rule = parse_rule(db_event.recurrence_rule)
+        upcoming = (
+            span for span in occurrences(db_event.start_time, db_event.end_time, rule, start, datetime.max)
+            if span[0] >= start
+        )
+        for occurrence_start, occurrence_end in itertools.islice(upcoming, limit):
+            items.append(dict(fields, start_time=occurrence_start, end_time=occurrence_end))
+    items.sort(key=lambda item: item["start_time"])
+    return items[:limit]
+
+def get_feed_key(db: Session, user_id) -> str:
+    """The user's calendar feed key, created on first use. Concurrent first
+    requests agree on one key, so no link handed out is dead on arrival."""
+    query = select(User.calendar_feed_key).where(User.id == user_id)
+    feed_key = db.execute(query).scalar()
+    if feed_key is None:
+        db.execute(
+            update(User)
+            .where(User.id == user_id, User.calendar_feed_key.is_(None))
+            .values(calendar_feed_key=new_feed_key())
+        )
+        db.commit()
+        feed_key = db.execute(query).scalar()
+    return feed_key
+
+def revoke_feed_key(db: Session, user_id):
+    """Every feed link the user was given stops working; the next one is new"""
+    db.execute(update(User).where(User.id == user_id).values(calendar_feed_key=None))
+    db.commit()
+
+def get_feed_events(db: Session, start: datetime) -> List[Event]:
+    """Events for the iCalendar feed: everything still running at `start`,
+    recurring series unexpanded (calendar apps expand the RRULE themselves)"""
+    return db.query(Event).filter(window_filter(start)).order_by(Event.start_time.asc()).all()
+
 def update_event(db: Session, event_id: int, event_update: EventUpdate) -> Optional[Event]:
     db_event = get_event(db, event_id)
     if db_event:
@@ -33,8 +190,11 @@ def update_event(db: Session, event_id: int, event_update: EventUpdate) -> Optio
 
         for key, value in update_data.items():
             setattr(db_event, key, value)
+        _set_recurrence(db_event)
+        lock_bookings(db)
+        check_conflicts(db, db_event)
         
-        db.commit()
+        _commit_booking(db)
         db.refresh(db_event)
     return db_event
 
@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+from typing import Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.common.cache import TTLCache
+from src.common.db import Base
+
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "1000"))
+# Upper bound on staleness for writes made by other processes
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", "300"))
+
+_DML_TARGET = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)', re.IGNORECASE)
+_NOT_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+class TableVersions:
+    """Per-table write counters, bumped when a transaction that wrote the table commits"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def bump(self, tables: Iterable[str]):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def snapshot(self, tables: Iterable[str]) -> dict:
+        with self._lock:
+            return {table: self._versions.get(table, 0) for table in tables}
+
+
+table_versions = TableVersions()
+
+
+# Engine-level, so every engine (sync, async, read) is covered
+@event.listens_for(Engine, "before_cursor_execute")
+def _track_written_table(conn, cursor, statement, parameters, context, executemany):
+    match = _DML_TARGET.match(statement)
+    if match:
+        conn.info.setdefault("written_tables", set()).add(match.group(1).lower())
+
+
+@event.listens_for(Engine, "commit")
+def _bump_written_tables(conn):
+    written = conn.info.pop("written_tables", None)
+    if written:
+        table_versions.bump(written)
+
+
+@event.listens_for(Engine, "rollback")
+def _forget_written_tables(conn):
+    conn.info.pop("written_tables", None)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return _SPACES.sub(" ", _NOT_WORD.sub(" ", question.lower())).strip()
+
+
+def tables_in_sql(sql: str) -> set:
+    """Known tables mentioned anywhere in `sql`; a superset is safe, it only invalidates more"""
+    lowered = sql.lower()
+    return {
+        table for table in Base.metadata.tables
+        if re.search(rf"\b{re.escape(table)}\b", lowered)
+    }
+
+
+class QACache:
+    """Answers keyed by normalized question, context and role; bounded LRU.
+
+    An entry remembers the versions of the tables its SQL read. Any committed
+    write to one of them since makes the entry stale.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def key(question: str, context: Optional[str], role: str) -> tuple:
+        return (normalize_question(question), normalize_question(context or ""), role)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None and table_versions.snapshot(entry["versions"]) != entry["versions"]:
+            self._entries.invalidate(key)
+            with self._lock:
+                self.stale += 1
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, key: tuple, result: dict, versions: dict):
+        """`versions` must be snapshotted before the SQL ran, so writes that
+        commit while the answer is generated leave the entry stale"""
+        self._entries.set(key, {**result, "versions": versions})
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self._entries.maxsize,
+                "ttl_seconds": self._entries.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self._entries.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+qa_cache = QACache(maxsize=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL)
@@ -0,0 +1,325 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime
+from enum import Enum
+from typing import Callable, List, Optional
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+
+from .cache import normalize_question, table_versions
+from src.common.db import AsyncReadSessionLocal
+from src.common.enums import AllocationStatus, Status
+from src.common.metrics import LatencyRecorder
+from src.common.security import Principal
+from src.hostels.models import Hall, Room, RoomAllocation
+from src.hostels.service import RoomAllocationService
+from src.complaints.models import Complaint, ComplaintUser
+from src.calendar.services import get_upcoming_events
+
+# Set CHAT_INTENTS=0 to send every question to the LLM
+CHAT_INTENTS = os.environ.get("CHAT_INTENTS", "1") == "1"
+# Hall names and room numbers are reloaded after local writes, or after this
+# many seconds for writes made by other processes
+CHAT_INTENT_ENTITY_TTL = float(os.environ.get("CHAT_INTENT_ENTITY_TTL", "60"))
+INTENT_ROWS = 20
+
+# Questions about how to do something are for the LLM, even if they mention a room
+_HOW_TO = re.compile(r"^(how (do|can|should) i|how to|why|can i|should i)\b")
+_MY_ALLOCATION = re.compile(
+    r"\b(my (room|allocation|hall|bed)|where (am i|do i) (allocated|staying|live|stay)"
+    r"|(which|what) (room|hall) am i|am i allocated|have i been allocated)\b"
+)
+_ROOM_NUMBER = re.compile(r"\broom (?:number |no |num )?(\w+)")
+_OCCUPANCY = re.compile(r"\b(occupan\w*|occupied|full|space|spaces|free|available|beds?|capacity|how many|people|students)\b")
+_AVAILABILITY = re.compile(r"\b(availab\w*|free|space|spaces|vacan\w*|beds?|open for allocation|full|occupancy)\b")
+_ACCOMMODATION = re.compile(r"\b(halls?|hostels?|rooms?|accommodation)\b")
+_COMPLAINTS = re.compile(r"\bcomplaints?\b")
+_OPEN = re.compile(r"\b(open|opened|pending|unresolved|outstanding|how many|my|still)\b")
+_EVENTS = re.compile(r"\b(events?|happening|calendar|activities)\b")
+_UPCOMING = re.compile(r"\b(upcoming|next|coming|soon|this week|today|tomorrow|what|any|when|schedule)\b")
+
+# Parameterized statements, built once; SQLAlchemy caches their compiled form
+_ROOMS_BY_NUMBER = (
+    select(Room.room_number, Room.capacity, Room.current_occupancy, Room.is_available,
+           Hall.name.label("hall_name"))
+    .join(Hall, Room.hall_id == Hall.id)
+    .where(Room.room_number == bindparam("room_number"))
+    .order_by(Hall.name)
+)
+_ROOMS_BY_NUMBER_IN_HALL = _ROOMS_BY_NUMBER.where(Room.hall_id == bindparam("hall_id"))
+_MY_ALLOCATION_QUERY = (
+    select(Hall.name.label("hall_name"), Room.room_number, RoomAllocation.academic_year,
+           RoomAllocation.allocated_at)
+    .join(Room, RoomAllocation.room_id == Room.id)
+    .join(Hall, RoomAllocation.hall_id == Hall.id)
+    .where(RoomAllocation.user_id == bindparam("user_id"),
+           RoomAllocation.status == AllocationStatus.ALLOCATED)
+)
+_OPEN_COMPLAINTS = (
+    select(Complaint.title, Complaint.category, Complaint.status, ComplaintUser.created_at,
+           func.count().over().label("total"))
+    .join(ComplaintUser, ComplaintUser.complaint_id == Complaint.id)
+    .where(ComplaintUser.status.in_([Status.PENDING, Status.OPENED]))
+    .order_by(ComplaintUser.created_at.desc())
+    .limit(INTENT_ROWS)
+)
+# Students only ever see their own complaints
+_MY_OPEN_COMPLAINTS = _OPEN_COMPLAINTS.where(ComplaintUser.created_by == bindparam("user_id"))
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if not isinstance(value, (str, int, float, bool, type(None))):
+        return str(value)
+    return value
+
+
+def _row(row) -> dict:
+    return {key: _plain(value) for key, value in row.items()}
+
+
+def _rows(result) -> List[dict]:
+    return [_row(row) for row in result.mappings()]
+
+
+def _when(value: datetime) -> str:
+    return value.strftime("%a %d %b, %H:%M")
+
+
+class EntityIndex:
+    """Hall names and room numbers, for spotting them in questions"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._versions = None
+        self.halls = []          # (normalized name, short name, hall id, display name), longest first
+        self.room_numbers = {}   # normalized number -> number as stored
+
+    def is_stale(self) -> bool:
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > self.ttl
+            or table_versions.snapshot(("halls", "rooms")) != self._versions
+        )
+
+    def load(self, session: Session):
+        versions = table_versions.snapshot(("halls", "rooms"))
+        halls = []
+        for hall_id, name in session.execute(select(Hall.id, Hall.name)):
+            normalized = normalize_question(name)
+            # "Main Hall" is also found as "main"
+            short = re.sub(r"\s*\bhall\b\s*", " ", normalized).strip()
+            halls.append((normalized, short if short != normalized else None, hall_id, name))
+        halls.sort(key=lambda hall: len(hall[0]), reverse=True)
+        room_numbers = {
+            normalize_question(number): number
+            for (number,) in session.execute(select(Room.room_number).distinct())
+        }
+        with self._lock:
+            self.halls = halls
+            self.room_numbers = room_numbers
+            self._versions = versions
+            self._loaded_at = time.monotonic()
+
+    def find_hall(self, question: str) -> Optional[tuple]:
+        for normalized, short, hall_id, name in self.halls:
+            if re.search(rf"\b{re.escape(normalized)}\b", question):
+                return hall_id, name
+        for normalized, short, hall_id, name in self.halls:
+            if short and re.search(rf"\b{re.escape(short)}\b", question):
+                return hall_id, name
+        return None
+
+    def find_room(self, question: str) -> Optional[str]:
+        for match in _ROOM_NUMBER.finditer(question):
+            if match.group(1) in self.room_numbers:
+                return self.room_numbers[match.group(1)]
+        return None
+
+
+class IntentMatch:
+    def __init__(self, name: str, handler: Callable, **params):
+        self.name = name
+        self.handler = handler
+        self.params = params
+
+
+class IntentRouter:
+    """Answers the common chat questions locally, with no LLM call.
+
+    A question is matched with keyword patterns and lookups against known
+    hall names and room numbers; a match runs a parameterized query and
+    fills an answer template. Anything else is a miss and goes to the LLM.
+    """
+
+    def __init__(self):
+        self.entities = EntityIndex(CHAT_INTENT_ENTITY_TTL)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.by_intent = {}
+        self.match_latency = LatencyRecorder()
+        self.answer_latency = LatencyRecorder()
+
+    def match(self, question: str, user: Optional[Principal]) -> Optional[IntentMatch]:
+        if _HOW_TO.search(question):
+            return None
+        if user is not None and _MY_ALLOCATION.search(question):
+            return IntentMatch("my_allocation", self._my_allocation, user_id=user.id)
+        room_number = self.entities.find_room(question)
+        hall = self.entities.find_hall(question)
+        if room_number and _OCCUPANCY.search(question):
+            return IntentMatch("room_occupancy", self._room_occupancy, room_number=room_number, hall=hall)
+        if _AVAILABILITY.search(question) and (hall or _ACCOMMODATION.search(question)):
+            return IntentMatch("hall_availability", self._hall_availability, hall=hall)
+        if user is not None and _COMPLAINTS.search(question) and _OPEN.search(question):
+            return IntentMatch("open_complaints", self._open_complaints, user=user)
+        if _EVENTS.search(question) and _UPCOMING.search(question):
+            return IntentMatch("upcoming_events", self._upcoming_events)
+        return None
+
+    async def answer(self, query: str, user: Optional[Principal] = None) -> Optional[dict]:
+        """A chat result for `query`, or None when no intent matches"""
+        if not CHAT_INTENTS:
+            return None
+        started = time.perf_counter()
+        async with AsyncReadSessionLocal() as session:
+            if self.entities.is_stale():
+                await session.run_sync(self.entities.load)
+            match = self.match(normalize_question(query), user)
+            self.match_latency.record(time.perf_counter() - started)
+            if match is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            answer, data = await session.run_sync(lambda sync_session: match.handler(sync_session, **match.params))
+        self.answer_latency.record(time.perf_counter() - started)
+        with self._lock:
+            self.hits += 1
+            self.by_intent[match.name] = self.by_intent.get(match.name, 0) + 1
+        return {
+            "answer": answer,
+            "data": data,
+            "used_sql": True,
+            "truncated": False,
+            "notice": None,
+            "intent": match.name,
+        }
+
+    # Handlers run on a sync session (via run_sync) and return (answer, rows)
+
+    def _hall_availability(self, session: Session, hall: Optional[tuple]):
+        service = RoomAllocationService(session)
+        if hall is not None:
+            summaries = service.get_hall_allocation_summaries(hall[0])
+            if not summaries:
+                return f"I couldn't find {hall[1]}.", []
+            summary = summaries[0]
+            rooms = sorted(room.room_number for room in service.get_available_rooms(hall[0]))
+            state = "open" if summary["is_open_for_allocation"] else "not open"
+            answer = (
+                f"{summary['hall_name']} has {summary['available_spaces']} free "
+                f"bed{'s' if summary['available_spaces'] != 1 else ''} "
+                f"({summary['current_occupancy']} of {summary['total_capacity']} taken) "
+                f"and is {state} for allocation."
+            )
+            if rooms and summary["is_open_for_allocation"]:
+                shown = ", ".join(rooms[:INTENT_ROWS])
+                more = f" and {len(rooms) - INTENT_ROWS} more" if len(rooms) > INTENT_ROWS else ""
+                answer += f" Rooms with space: {shown}{more}."
+            return answer, [_row(summary)]
+
+        summaries = service.get_hall_allocation_summaries()
+        open_halls = [s for s in summaries if s["is_open_for_allocation"]]
+        if not open_halls:
+            return "No halls are open for allocation at the moment.", [_row(s) for s in summaries]
+        listed = "; ".join(
+            f"{s['hall_name']}: {s['available_spaces']} free of {s['total_capacity']}" for s in open_halls
+        )
+        count = len(open_halls)
+        answer = f"{count} hall{'s are' if count != 1 else ' is'} open for allocation. {listed}."
+        return answer, [_row(s) for s in open_halls]
+
+    def _room_occupancy(self, session: Session, room_number: str, hall: Optional[tuple]):
+        if hall is not None:
+            result = session.execute(_ROOMS_BY_NUMBER_IN_HALL, {"room_number": room_number, "hall_id": hall[0]})
+        else:
+            result = session.execute(_ROOMS_BY_NUMBER, {"room_number": room_number})
+        rooms = _rows(result)
+        if not rooms:
+            # The number is known, just not in that hall
+            where = hall[1] if hall is not None else "Any hall"
+            return f"{where} has no room {room_number}.", []
+        lines = []
+        for room in rooms:
+            free = room["capacity"] - room["current_occupancy"]
+            if free <= 0:
+                state = "and is full"
+            elif room["is_available"]:
+                state = f"{free} free"
+            else:
+                state = "and is closed to allocation"
+            lines.append(
+                f"Room {room['room_number']} in {room['hall_name']} has {room['current_occupancy']} of "
+                f"{room['capacity']} beds taken, {state}."
+            )
+        return " ".join(lines), rooms
+
+    def _my_allocation(self, session: Session, user_id):
+        rows = _rows(session.execute(_MY_ALLOCATION_QUERY, {"user_id": user_id}))
+        if not rows:
+            return "You don't have a room allocation yet. Apply from the allocation page once a hall opens.", []
+        row = rows[0]
+        return f"You are in room {row['room_number']}, {row['hall_name']}, for {row['academic_year']}.", rows
+
+    def _open_complaints(self, session: Session, user: Principal):
+        if user.is_admin:
+            rows = _rows(session.execute(_OPEN_COMPLAINTS))
+            whose = "There are"
+        else:
+            rows = _rows(session.execute(_MY_OPEN_COMPLAINTS, {"user_id": user.id}))
+            whose = "You have"
+        total = rows[0]["total"] if rows else 0
+        for row in rows:
+            del row["total"]
+        if not total:
+            return f"{whose} no open complaints.", []
+        listed = "; ".join(f"{row['title']} ({row['status']})" for row in rows[:5])
+        more = f" and {total - 5} more" if total > 5 else ""
+        return f"{whose} {total} open complaint{'s' if total != 1 else ''}: {listed}{more}.", rows
+
+    def _upcoming_events(self, session: Session):
+        # Recurring series are expanded, so one that started last term still shows
+        events = [
+            {key: event[key] for key in ("title", "start_time", "end_time", "location")}
+            for event in get_upcoming_events(session, datetime.now(), 5)
+        ]
+        if not events:
+            return "There are no upcoming events on the calendar.", []
+        listed = "; ".join(
+            f"{event['title']} on {_when(event['start_time'])}"
+            + (f" at {event['location']}" if event["location"] else "")
+            for event in events
+        )
+        return f"Upcoming events: {listed}.", [_row(event) for event in events]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": CHAT_INTENTS,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "by_intent": dict(self.by_intent),
+                "match": self.match_latency.as_dict(),
+                "answer": self.answer_latency.as_dict(),
+            }
+
+
+intent_router = IntentRouter()
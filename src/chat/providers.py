@@ -0,0 +1,239 @@
+import re
+import time
+import asyncio
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import AsyncIterator, Optional
+
+from src.common.metrics import LatencyRecorder
+from src.common.config import (
+    CHAT_MODEL,
+    LLM_PROVIDER,
+    GROQ_API_KEY,
+    GROQ_BASE_URL,
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_TOKEN_DELAY,
+    FAKE_LLM_SQL,
+)
+
+
+class LLMError(Exception):
+    """The provider failed to answer; the message is safe to show"""
+
+
+class UsageTally:
+    """Calls and tokens spent while handling one question"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+
+_current_tally: contextvars.ContextVar = contextvars.ContextVar("llm_usage_tally", default=None)
+
+
+@contextmanager
+def track_usage():
+    """Collect the LLM usage of everything awaited inside the block (same task)"""
+    tally = UsageTally()
+    token = _current_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _current_tally.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token; used when the provider reports no usage
+    return max(1, len(text) // 4)
+
+
+class LLMProvider(ABC):
+    """One chat model behind `complete` and `stream`, with per-call accounting.
+
+    Subclasses must implement `_complete`, and may override `_stream` when
+    the model can stream; token usage is reported through `_record`.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = LatencyRecorder()
+
+    def _record(self, seconds: float, prompt_tokens: int, completion_tokens: int):
+        self.latency.record(seconds)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        tally = _current_tally.get()
+        if tally is not None:
+            tally.calls += 1
+            tally.prompt_tokens += prompt_tokens
+            tally.completion_tokens += completion_tokens
+            tally.seconds += seconds
+
+    def _record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    async def complete(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        started = time.perf_counter()
+        try:
+            text, usage = await self._complete(prompt, temperature, max_tokens)
+        except Exception:
+            self._record_error()
+            raise
+        prompt_tokens, completion_tokens = usage or (estimate_tokens(prompt), estimate_tokens(text))
+        self._record(time.perf_counter() - started, prompt_tokens, completion_tokens)
+        return text.strip()
+
+    async def stream(self, prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        parts = []
+        usage = []
+        try:
+            async for part in self._stream(prompt, temperature, max_tokens, usage):
+                parts.append(part)
+                yield part
+        except Exception:
+            self._record_error()
+            raise
+        prompt_tokens, completion_tokens = usage[0] if usage else (estimate_tokens(prompt), estimate_tokens("".join(parts)))
+        self._record(time.perf_counter() - started, prompt_tokens, completion_tokens)
+
+    @abstractmethod
+    async def _complete(self, prompt: str, temperature: float, max_tokens: int) -> tuple:
+        """Return (text, (prompt_tokens, completion_tokens) or None)"""
+
+    async def _stream(self, prompt: str, temperature: float, max_tokens: int, usage: list) -> AsyncIterator[str]:
+        """Yield text chunks; append (prompt_tokens, completion_tokens) to `usage` if known.
+        Without streaming support the whole completion is one chunk."""
+        text, known = await self._complete(prompt, temperature, max_tokens)
+        if known:
+            usage.append(known)
+        yield text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "provider": self.name,
+                "model": self.model,
+                "calls": self.calls,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "latency": self.latency.as_dict(),
+            }
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self, model: str, api_key: Optional[str], base_url: Optional[str] = None):
+        import groq
+
+        if not api_key:
+            raise ValueError("GROQ_API_KEY environment variable not set")
+        super().__init__(model)
+        self._errors = groq.APIError
+        # Async client so a multi-second exchange never holds a worker thread.
+        # base_url points it at another endpoint, e.g. benchmarks/fake_llm_server.py
+        self.client = groq.AsyncGroq(api_key=api_key, base_url=base_url)
+
+    async def _complete(self, prompt: str, temperature: float, max_tokens: int) -> tuple:
+        try:
+            response = await self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=self.model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=False
+            )
+        except self._errors as e:
+            raise LLMError(f"LLM error: {e}") from e
+        usage = (response.usage.prompt_tokens, response.usage.completion_tokens) if response.usage else None
+        return response.choices[0].message.content, usage
+
+    async def _stream(self, prompt: str, temperature: float, max_tokens: int, usage: list) -> AsyncIterator[str]:
+        try:
+            stream = await self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=self.model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                # Groq reports usage on the last chunk
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None):
+                    usage.append((x_groq.usage.prompt_tokens, x_groq.usage.completion_tokens))
+        except self._errors as e:
+            raise LLMError(f"LLM error: {e}") from e
+
+
+# Canned behaviour of the fake provider, also served by benchmarks/fake_llm_server.py
+FAKE_DATA_WORDS = re.compile(
+    r"\b(hall|halls|room|rooms|complaint|complaints|event|events|allocation|allocated|student|students|users?)\b",
+    re.I,
+)
+FAKE_ANSWER = (
+    "There are currently three halls open for allocation. Main Hall has the most free beds, "
+    "followed by the Annex, and the remaining rooms are filling up quickly, so students who "
+    "have not yet been allocated should apply soon."
+)
+
+
+def fake_reply(prompt: str, sql: str) -> str:
+    """Deterministic answer for the chat pipeline's prompts"""
+    if 'Respond with ONLY "YES"' in prompt:
+        question = prompt.split("USER QUERY:", 1)[-1]
+        return "YES" if FAKE_DATA_WORDS.search(question) else "NO"
+    if "converts natural language queries to PostgreSQL" in prompt:
+        return sql
+    return FAKE_ANSWER
+
+
+class FakeProvider(LLMProvider):
+    """In-process stand-in: fixed latency before the first token, canned replies"""
+
+    name = "fake"
+
+    def __init__(self, model: str = "fake", latency: float = 0.0, token_delay: float = 0.0,
+                 sql: str = "SELECT name, no_of_rooms FROM halls"):
+        super().__init__(model)
+        self.latency_seconds = latency
+        self.token_delay = token_delay
+        self.sql = sql
+
+    async def _complete(self, prompt: str, temperature: float, max_tokens: int) -> tuple:
+        await asyncio.sleep(self.latency_seconds)
+        return fake_reply(prompt, self.sql), None
+
+    async def _stream(self, prompt: str, temperature: float, max_tokens: int, usage: list) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency_seconds)
+        for index, word in enumerate(fake_reply(prompt, self.sql).split(" ")):
+            yield word if index == 0 else " " + word
+            await asyncio.sleep(self.token_delay)
+
+
+def get_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    """The provider selected by LLM_PROVIDER ("groq" or "fake")"""
+    if name == "groq":
+        return GroqProvider(CHAT_MODEL, GROQ_API_KEY, GROQ_BASE_URL)
+    if name == "fake":
+        return FakeProvider(CHAT_MODEL, FAKE_LLM_LATENCY, FAKE_LLM_TOKEN_DELAY, FAKE_LLM_SQL)
+    raise ValueError(f"Unknown LLM_PROVIDER {name!r}; expected 'groq' or 'fake'")
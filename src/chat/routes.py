@@ -1,17 +1,23 @@
 import os
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends
-import groq
+import time
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 import json
 from .schemas import (
     QueryRequest,
     QueryResponse
 )
-from src.auth.models import User
-from src.common.db import engine, Base
-from src.common.security import get_current_user
-from src.common.config import DATABASE_URL, GROQ_API_KEY
-from sqlalchemy import text, inspect
+from .schema import get_db_schema
+from .cache import qa_cache, table_versions, tables_in_sql
+from .sandbox import SQLRejected, rows_for_prompt, run_readonly_query
+from .intents import intent_router
+from .providers import LLMError, get_provider
+from src.common.metrics import LatencyRecorder
+from src.common.ratelimit import rate_limiter
+from src.common.security import Principal, get_current_user_async
+from src.common.config import DATABASE_URL
 
 # Initialize FastAPI chat_router
 chat_router = APIRouter(
@@ -19,61 +25,27 @@ chat_router = APIRouter(
     tags=["CHAT"]
 )
 
-# Initialize Groq client
-groq_api_key = GROQ_API_KEY
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY environment variable not set")
-
-groq_client = groq.Client(api_key=groq_api_key)
+# Chat model behind LLM_PROVIDER / CHAT_MODEL (see src/chat/providers.py)
+llm = get_provider()
 
 # Database connection parameters
 DB_CONNECTION_STRING = DATABASE_URL
 if not DB_CONNECTION_STRING:
     raise ValueError("DATABASE_URL environment variable not set")
 
-# Get database schema information using SQLAlchemy
-def get_db_schema() -> str:
-    """Fetch database schema information including tables and columns using SQLAlchemy"""
-    inspector = inspect(engine)
-    schema_info = {}
-    
-    # Get all tables
-    for table_name in inspector.get_table_names():
-        schema_info[table_name] = []
-        
-        # Get columns for each table
-        for column in inspector.get_columns(table_name):
-            schema_info[table_name].append({
-                "column_name": column["name"],
-                "data_type": str(column["type"]),
-                "is_nullable": "YES" if column.get("nullable", True) else "NO",
-                "default": str(column.get("default", ""))
-            })
-            
-        # Get primary key constraints
-        primary_keys = inspector.get_pk_constraint(table_name)
-        if primary_keys and primary_keys.get("constrained_columns"):
-            schema_info[table_name].append({
-                "constraint_type": "PRIMARY KEY",
-                "columns": primary_keys["constrained_columns"]
-            })
-            
-        # Get foreign key constraints
-        foreign_keys = inspector.get_foreign_keys(table_name)
-        for fk in foreign_keys:
-            schema_info[table_name].append({
-                "constraint_type": "FOREIGN KEY",
-                "columns": fk["constrained_columns"],
-                "referred_table": fk["referred_table"],
-                "referred_columns": fk["referred_columns"]
-            })
-    
-    return json.dumps(schema_info, indent=2)
+REJECTED_ANSWER = "Sorry, I couldn't look that up safely. Try asking a more specific question."
+
+# Latency of the answer stream, for GET /health/metrics
+chat_latency = {
+    "time_to_first_token": LatencyRecorder(),
+    "total": LatencyRecorder(),
+}
+
 
 # Determine if a query can be answered with SQL
-def can_answer_with_sql(query: str, schema_info: str) -> bool:
+async def can_answer_with_sql(query: str, schema_info: str) -> bool:
     """Determine if a query can be answered with SQL using the available schema"""
-    
+
     # Ask Groq to determine if the query can be answered with SQL
     assessment_prompt = f"""
 You are an expert at understanding database capabilities.
@@ -92,21 +64,14 @@ Respond with ONLY "YES" if the query can be answered with SQL using the given sc
 Respond with ONLY "NO" if the query cannot be answered with SQL using the given schema.
 """
 
-    assessment_response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": assessment_prompt}],
-        model="llama3-70b-8192",
-        temperature=0.1,
-        max_tokens=10
-    )
-
     # Extract assessment
-    assessment = assessment_response.choices[0].message.content.strip().upper()
+    assessment = (await llm.complete(assessment_prompt, temperature=0.1, max_tokens=10)).upper()
     return assessment == "YES"
 
-# Process SQL answerable queries
-def process_sql_query(query: str, schema_info: str) -> dict:
-    """Generate SQL from natural language, execute it, and generate a response"""
-    
+# Generate and run the SQL; returns the SQL, table versions, answer prompt and rows
+async def prepare_sql_answer(query: str, schema_info: str) -> dict:
+    """Generate SQL from natural language, execute it, and build the answer prompt"""
+
     # Step 1: Generate SQL using Groq
     sql_prompt = f"""
 You are an expert SQL assistant that converts natural language queries to PostgreSQL queries.
@@ -124,32 +89,29 @@ Respond with ONLY the SQL query with no explanation or commentary.
 The SQL should be correct PostgreSQL syntax and appropriate for the schema provided.
 """
 
-    sql_response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": sql_prompt}],
-        model="llama3-70b-8192",
-        temperature=0.1,
-        max_tokens=1024
-    )
-
     # Extract SQL query
-    sql_query = sql_response.choices[0].message.content.strip()
-    
-    # Step 2: Execute the SQL query using SQLAlchemy
+    sql_query = await llm.complete(sql_prompt, temperature=0.1, max_tokens=1024)
+    # Taken before the query runs, so a write committed meanwhile makes the cached answer stale
+    versions = table_versions.snapshot(tables_in_sql(sql_query))
+
+    # Step 2: Execute the SQL query read-only, with a timeout and a row cap
     try:
-        with engine.connect() as connection:
-            # Execute the query
-            result = connection.execute(text(sql_query))
-            
-            # Convert results to dictionaries
-            if result.returns_rows:
-                column_names = result.keys()
-                results = [dict(zip(column_names, row)) for row in result.fetchall()]
-            else:
-                results = []
+        outcome = await run_readonly_query(sql_query)
+    except SQLRejected as e:
+        # Nothing to explain; the caller answers without another LLM call
+        return {
+            "sql": sql_query,
+            "versions": versions,
+            "prompt": None,
+            "data": [],
+            "truncated": False,
+            "notice": str(e),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    
-    # Step 3: Generate natural language answer using Groq
+    results = outcome.rows
+
+    # Step 3: Prompt for a natural language answer
     answer_prompt = f"""
 You are an expert data analyst that explains SQL query results in natural language.
 
@@ -160,24 +122,13 @@ SQL QUERY EXECUTED:
 {sql_query}
 
 QUERY RESULTS:
-{json.dumps(results, default=str, indent=2)}
+{rows_for_prompt(results, outcome.truncated)}
 
 Respond with a natural language answer to the user's original question based on these results.
 Be direct and concise. Don't mention the SQL or that you ran a query.
 Just answer the question naturally as if you're having a conversation.
 """
 
-    answer_response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": answer_prompt}],
-        model="llama3-70b-8192",
-        temperature=0.3,
-        max_tokens=1024,
-        stream=False
-    )
-
-    # Extract answer
-    answer = answer_response.choices[0].message.content.strip()
-    
     # Convert any non-serializable objects in results to strings
     serializable_results = []
     for row in results:
@@ -189,21 +140,43 @@ Just answer the question naturally as if you're having a conversation.
             else:
                 serializable_row[key] = value
         serializable_results.append(serializable_row)
-    
+
     return {
-        "answer": answer,
+        "sql": sql_query,
+        "versions": versions,
+        "prompt": answer_prompt,
         "data": serializable_results,
-        "used_sql": True
+        "truncated": outcome.truncated,
+        "notice": f"Only the first {len(results)} rows were returned" if outcome.truncated else None,
     }
 
-# Process non-SQL answerable queries
-def process_non_sql_query(query: str, context: Optional[str] = None) -> dict:
-    """Generate a response for queries that can't be answered with SQL"""
-    
+# Process SQL answerable queries
+async def process_sql_query(query: str, schema_info: str) -> dict:
+    """Generate SQL from natural language, execute it, and generate a response"""
+    prepared = await prepare_sql_answer(query, schema_info)
+    if prepared["prompt"] is None:
+        answer = REJECTED_ANSWER
+    else:
+        answer = await llm.complete(prepared["prompt"], temperature=0.3, max_tokens=1024)
+
+    return {
+        "answer": answer,
+        "data": prepared["data"],
+        "used_sql": True,
+        "truncated": prepared["truncated"],
+        "notice": prepared["notice"],
+        "sql": prepared["sql"],
+        "versions": prepared["versions"],
+        "cacheable": prepared["prompt"] is not None
+    }
+
+def non_sql_prompt(query: str, context: Optional[str] = None) -> str:
+    """Prompt for queries that can't be answered with SQL"""
+
     # Build prompt with context if provided
     context_info = f"\nADDITIONAL CONTEXT:\n{context}" if context else ""
-    
-    non_sql_prompt = f"""
+
+    return f"""
 You are an intelligent assistant that answers questions that cannot be directly answered using SQL database queries.
 
 USER QUERY:
@@ -211,7 +184,7 @@ USER QUERY:
 
 Respond with a natural language answer to the user's question. Be direct, helpful, and informative.
 If you truly cannot answer the question with the information provided, explain what information would be needed.
-Your context is a student management system so keep answers within that scope. 
+Your context is a student management system so keep answers within that scope.
 If a question is vague or out of scope, be polite in telling them off.
 If the questiion asked is about registration say: go to the rthe registration page and fill in the form.
 If the question is about a complaint, say: go to the complaints page and fill in the form.
@@ -219,42 +192,164 @@ Understand that you are not a human and cannot provide personal opinions or expe
 UNDER NO CIRCUMSTANCES SHOULD YOU MENTION WHAT MODEL YOU ARE.
 """
 
-    # Get response from Groq
-    response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": non_sql_prompt}],
-        model="llama3-70b-8192",
-        temperature=0.5,
-        max_tokens=1024,
-        stream=False
-    )
+# Process non-SQL answerable queries
+async def process_non_sql_query(query: str, context: Optional[str] = None) -> dict:
+    """Generate a response for queries that can't be answered with SQL"""
+    answer = await llm.complete(non_sql_prompt(query, context), temperature=0.5, max_tokens=1024)
 
-    # Extract answer
-    answer = response.choices[0].message.content.strip()
-    
     return {
         "answer": answer,
         "data": [],
-        "used_sql": False
+        "used_sql": False,
+        "truncated": False,
+        "notice": None,
+        "sql": None,
+        "versions": {},
+        "cacheable": True
     }
 
 # Main function to process all types of queries
-def process_query(query: str, context: Optional[str] = None) -> dict:
+async def process_query(query: str, context: Optional[str] = None, role: str = "student",
+                        user: Optional[Principal] = None) -> dict:
     """Process a query, determining whether to use SQL or not"""
-    # Get schema info
-    schema_info = get_db_schema()
-    
+    # Common questions are answered locally; only a miss reaches the LLM
+    local = await intent_router.answer(query, user)
+    if local is not None:
+        return _public_result(local)
+
+    cache_key = qa_cache.key(query, context, role)
+    cached = qa_cache.get(cache_key)
+    if cached is not None:
+        return _public_result(cached)
+
+    # Get schema info; introspected off the event loop the first time
+    schema_info = await run_in_threadpool(get_db_schema)
+
     # Determine if query can be answered with SQL
-    use_sql = can_answer_with_sql(query, schema_info)
-    
+    use_sql = await can_answer_with_sql(query, schema_info)
+
     if use_sql:
-        return process_sql_query(query, schema_info)
+        result = await process_sql_query(query, schema_info)
     else:
-        return process_non_sql_query(query, context)
+        result = await process_non_sql_query(query, context)
+
+    if result["cacheable"]:
+        qa_cache.set(cache_key, _public_result(result) | {"sql": result["sql"]}, result["versions"])
+    return _public_result(result)
+
+def _public_result(result: dict) -> dict:
+    return {
+        "answer": result["answer"],
+        "data": result["data"],
+        "used_sql": result["used_sql"],
+        "truncated": result["truncated"],
+        "notice": result["notice"],
+        "intent": result.get("intent"),
+    }
+
+def _meta(entry: dict) -> dict:
+    return {
+        **{key: entry[key] for key in ("used_sql", "data", "truncated", "notice")},
+        "intent": entry.get("intent"),
+    }
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_query(query: str, context: Optional[str] = None, role: str = "student",
+                       user: Optional[Principal] = None) -> AsyncIterator[str]:
+    """Same pipeline as process_query, with the answer streamed as Server-Sent Events:
+    `meta` (used_sql, data, truncated, notice, intent), one `token` per chunk, then `done` with timings.
+    """
+    started = time.perf_counter()
+    try:
+        local = await intent_router.answer(query, user)
+    except Exception as e:
+        yield _sse("error", {"detail": f"Database error: {str(e)}"})
+        return
+    cache_key = qa_cache.key(query, context, role)
+    cached = local if local is not None else qa_cache.get(cache_key)
+    if cached is not None:
+        yield _sse("meta", _meta(cached))
+        yield _sse("token", {"text": cached["answer"]})
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        yield _sse("done", {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms, "cached": local is None})
+        return
+
+    try:
+        schema_info = await run_in_threadpool(get_db_schema)
+        if await can_answer_with_sql(query, schema_info):
+            prepared = await prepare_sql_answer(query, schema_info)
+            entry = {
+                "used_sql": True,
+                "data": prepared["data"],
+                "truncated": prepared["truncated"],
+                "notice": prepared["notice"],
+                "sql": prepared["sql"],
+            }
+            versions = prepared["versions"]
+            if prepared["prompt"] is None:
+                # Rejected or timed out: report it, don't cache it
+                yield _sse("meta", _meta(entry))
+                yield _sse("token", {"text": REJECTED_ANSWER})
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield _sse("done", {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms, "cached": False})
+                return
+            tokens = llm.stream(prepared["prompt"], temperature=0.3, max_tokens=1024)
+        else:
+            entry = {"used_sql": False, "data": [], "truncated": False, "notice": None, "sql": None}
+            versions = {}
+            tokens = llm.stream(non_sql_prompt(query, context), temperature=0.5, max_tokens=1024)
+        yield _sse("meta", _meta(entry))
+
+        first_token_at = None
+        answer = []
+        async for token in tokens:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            answer.append(token)
+            yield _sse("token", {"text": token})
+    except HTTPException as e:
+        yield _sse("error", {"detail": e.detail})
+        return
+    except LLMError as e:
+        yield _sse("error", {"detail": str(e)})
+        return
+
+    finished = time.perf_counter()
+    ttft = (first_token_at or finished) - started
+    chat_latency["time_to_first_token"].record(ttft)
+    chat_latency["total"].record(finished - started)
+    qa_cache.set(cache_key, {**entry, "answer": "".join(answer).strip()}, versions)
+    yield _sse("done", {"ttft_ms": round(ttft * 1000, 1), "total_ms": round((finished - started) * 1000, 1), "cached": False})
+
+def _role(principal: Principal) -> str:
+    # Answers are shared between callers with the same role
+    return "admin" if principal.is_admin else "student"
 
 # Single API route for all queries
 @chat_router.post("/query", response_model=QueryResponse)
-def query_handler(request: QueryRequest,
-                  current_user: User = Depends(get_current_user)):
+async def query_handler(request: QueryRequest,
+                        http_request: Request,
+                        response: Response,
+                        current_user: Principal = Depends(get_current_user_async)):
     """Process any type of query and return appropriate response"""
-    result = process_query(request.query, request.context)
+    await rate_limiter.check(http_request, response, "chat", user=str(current_user.id))
+    try:
+        result = await process_query(request.query, request.context, _role(current_user), current_user)
+    except LLMError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     return QueryResponse(**result)
+
+@chat_router.post("/query/stream")
+async def stream_query_handler(request: QueryRequest,
+                               http_request: Request,
+                               current_user: Principal = Depends(get_current_user_async)):
+    """Process a query and stream the answer as Server-Sent Events"""
+    # Same budget as /chat/query
+    limit_headers = await rate_limiter.check(http_request, None, "chat", user=str(current_user.id))
+    return StreamingResponse(
+        stream_query(request.query, request.context, _role(current_user), current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **limit_headers}
+    )
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import asyncio
+from typing import List
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from src.common.db import async_read_engine
+from .schema import CHAT_TABLES, HIDDEN_COLUMNS, get_known_tables
+
+CHAT_SQL_TIMEOUT_MS = int(os.environ.get("CHAT_SQL_TIMEOUT_MS", "2000"))
+CHAT_SQL_MAX_ROWS = int(os.environ.get("CHAT_SQL_MAX_ROWS", "500"))
+# How much of the result the answer prompt gets to see
+CHAT_PROMPT_ROWS = int(os.environ.get("CHAT_PROMPT_ROWS", "50"))
+CHAT_PROMPT_CHARS = int(os.environ.get("CHAT_PROMPT_CHARS", "6000"))
+CHAT_PROMPT_VALUE_CHARS = 200
+
+_FENCE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_FIRST_WORD = re.compile(r"\s*(\w+)")
+# A lone colon would be read as a bind parameter by text(); "::" casts are left alone
+_LONE_COLON = re.compile(r"(?<!:):(?!:)")
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+# System catalogs, and functions that run SQL or read data given as text
+_FORBIDDEN_NAME = re.compile(
+    r"^(pg_\w*|information_schema|sqlite_\w*|\w*_to_xml\w*|dblink\w*|lo_\w*|current_setting|set_config)$"
+)
+
+
+class SQLRejected(ValueError):
+    """Generated SQL that was refused or cancelled; the message is shown to the user"""
+
+
+class QueryOutcome:
+    def __init__(self, rows: List[dict], truncated: bool):
+        self.rows = rows
+        self.truncated = truncated
+
+
+def check_tables(sql: str):
+    """Refuse SQL naming any table outside CHAT_TABLES, a hidden column or a
+    system catalog. Every word counts, quoted or inside a string, so neither
+    quoting nor schema prefixes get around it; a legitimate query that merely
+    mentions such a name is refused too."""
+    if re.search(r"u&['\"]", sql, re.IGNORECASE):
+        raise SQLRejected("Unicode-escaped names are not allowed")
+    names = {name.lower() for name in _IDENTIFIER.findall(sql)}
+    denied = names & (get_known_tables() - CHAT_TABLES)
+    if denied:
+        raise SQLRejected(f"The table {sorted(denied)[0]} cannot be queried")
+    if names & {column for _, column in HIDDEN_COLUMNS}:
+        raise SQLRejected("That column cannot be queried")
+    if any(_FORBIDDEN_NAME.match(name) for name in names):
+        raise SQLRejected("System catalogs and functions cannot be queried")
+
+
+def clean_sql(sql: str) -> str:
+    """Validate model output and return a single SELECT/WITH statement"""
+    sql = _FENCE.sub("", sql.strip()).strip()
+    sql = _BLOCK_COMMENT.sub(" ", _LINE_COMMENT.sub(" ", sql)).strip().rstrip(";").strip()
+    if not sql:
+        raise SQLRejected("The generated query was empty")
+    # Look for statement separators outside string literals
+    if ";" in _STRING_LITERAL.sub("''", sql):
+        raise SQLRejected("Only a single statement can be run")
+    first_word = _FIRST_WORD.match(sql)
+    if not first_word or first_word.group(1).upper() not in ("SELECT", "WITH"):
+        raise SQLRejected("Only SELECT queries can be run")
+    check_tables(sql)
+    return sql
+
+
+def _is_timeout(error: DBAPIError) -> bool:
+    code = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+    return code == "57014" or "statement timeout" in str(error.orig)
+
+
+async def run_readonly_query(sql: str) -> QueryOutcome:
+    """Run generated SQL in a read-only transaction with a statement timeout.
+
+    The statement is wrapped in LIMIT max_rows + 1 and read with fetchmany, so
+    at most that many rows ever leave the database; `truncated` says whether
+    there were more. The transaction is always rolled back.
+    """
+    # clean_sql checks table names against the introspected list; load it
+    # off the event loop (it is cached, so this is free after the first call)
+    await run_in_threadpool(get_known_tables)
+    sql = _LONE_COLON.sub(r"\\:", clean_sql(sql))
+    wrapped = text(f"SELECT * FROM ({sql}) AS generated_query LIMIT {CHAT_SQL_MAX_ROWS + 1}")
+
+    async def execute() -> QueryOutcome:
+        async with async_read_engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                await connection.execute(text("SET TRANSACTION READ ONLY"))
+                await connection.execute(text(f"SET LOCAL statement_timeout = {int(CHAT_SQL_TIMEOUT_MS)}"))
+            result = await connection.execute(wrapped)
+            column_names = list(result.keys())
+            rows = result.fetchmany(CHAT_SQL_MAX_ROWS + 1)
+            await connection.rollback()
+        truncated = len(rows) > CHAT_SQL_MAX_ROWS
+        return QueryOutcome([dict(zip(column_names, row)) for row in rows[:CHAT_SQL_MAX_ROWS]], truncated)
+
+    try:
+        # Backstop for databases without statement_timeout
+        return await asyncio.wait_for(execute(), timeout=CHAT_SQL_TIMEOUT_MS / 1000 + 1)
+    except asyncio.TimeoutError:
+        raise SQLRejected(f"The query took longer than {CHAT_SQL_TIMEOUT_MS} ms and was cancelled")
+    except DBAPIError as e:
+        if _is_timeout(e):
+            raise SQLRejected(f"The query took longer than {CHAT_SQL_TIMEOUT_MS} ms and was cancelled")
+        if "read-only transaction" in str(e.orig):
+            raise SQLRejected("Only read-only queries can be run")
+        raise
+
+
+def _shorten(value):
+    if isinstance(value, str) and len(value) > CHAT_PROMPT_VALUE_CHARS:
+        return value[:CHAT_PROMPT_VALUE_CHARS] + "..."
+    return value
+
+
+def rows_for_prompt(rows: List[dict], truncated: bool) -> str:
+    """Compact JSON lines for the answer prompt, capped in rows and characters"""
+    lines = []
+    size = 0
+    for row in rows[:CHAT_PROMPT_ROWS]:
+        line = json.dumps({key: _shorten(value) for key, value in row.items()}, default=str)
+        if size + len(line) > CHAT_PROMPT_CHARS:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    if len(lines) < len(rows) or truncated:
+        total = f"more than {len(rows)}" if truncated else str(len(rows))
+        lines.append(f"(showing {len(lines)} of {total} rows)")
+    return "\n".join(lines) if lines else "(no rows)"
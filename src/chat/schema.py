@@ -0,0 +1,118 @@
+import threading
+from typing import Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+
+from src.common.db import Base, engine
+
+# The only tables the model is told about and generated SQL may read.
+# Outbox, rate-limit and queue tables are internal bookkeeping.
+CHAT_TABLES = {
+    "users",
+    "halls",
+    "rooms",
+    "room_allocations",
+    "complaints",
+    "complains_logs",
+    "events",
+}
+
+# Never shown to the model, and refused in generated SQL
+HIDDEN_COLUMNS = {
+    ("users", "hashed_password"),
+    ("users", "calendar_feed_key"),
+}
+
+_TYPE_ALIASES = {
+    "timestamp with time zone": "timestamptz",
+    "timestamp without time zone": "timestamp",
+    "character varying": "varchar",
+    "double precision": "float8",
+}
+
+_schema_text: Optional[str] = None
+_known_tables: Optional[frozenset] = None
+_schema_lock = threading.Lock()
+
+
+def _render_type(column_type) -> str:
+    # Spell out enum labels so generated SQL compares against real values
+    labels = getattr(column_type, "enums", None)
+    if labels:
+        return "enum(" + ",".join(f"'{label}'" for label in labels) + ")"
+    rendered = str(column_type).lower()
+    for long_name, alias in _TYPE_ALIASES.items():
+        rendered = rendered.replace(long_name, alias)
+    return rendered
+
+
+def describe_schema(bind: Engine) -> str:
+    """Introspect `bind` and render one compact DDL-like line per table, e.g.
+
+        rooms(id integer PK, hall_id uuid NOT NULL -> halls.id, capacity integer NOT NULL)
+    """
+    inspector = inspect(bind)
+    # get_multi_* fetch every table's details in one catalog query each
+    columns = inspector.get_multi_columns()
+    primary_keys = inspector.get_multi_pk_constraint()
+    foreign_keys = inspector.get_multi_foreign_keys()
+
+    lines = []
+    for key in sorted(columns, key=lambda key: key[1]):
+        table_name = key[1]
+        if table_name not in CHAT_TABLES:
+            continue
+        pk_columns = set((primary_keys.get(key) or {}).get("constrained_columns") or [])
+        references = {}
+        for fk in foreign_keys.get(key, []):
+            for local, remote in zip(fk["constrained_columns"], fk["referred_columns"]):
+                references[local] = f"{fk['referred_table']}.{remote}"
+
+        parts = []
+        for column in columns[key]:
+            name = column["name"]
+            if (table_name, name) in HIDDEN_COLUMNS:
+                continue
+            part = f"{name} {_render_type(column['type'])}"
+            if name in pk_columns:
+                part += " PK"
+            elif not column.get("nullable", True):
+                part += " NOT NULL"
+            if name in references:
+                part += f" -> {references[name]}"
+            parts.append(part)
+        lines.append(f"{table_name}({', '.join(parts)})")
+    return "\n".join(lines)
+
+
+def get_db_schema() -> str:
+    """Schema description for prompts; introspected once per process"""
+    global _schema_text
+    if _schema_text is None:
+        with _schema_lock:
+            if _schema_text is None:
+                _schema_text = describe_schema(engine)
+    return _schema_text
+
+
+def get_known_tables() -> frozenset:
+    """Every table in the database and the models; introspected once per process"""
+    global _known_tables
+    if _known_tables is None:
+        with _schema_lock:
+            if _known_tables is None:
+                _known_tables = frozenset(inspect(engine).get_table_names()) | frozenset(Base.metadata.tables)
+    return _known_tables
+
+
+def invalidate_schema_cache():
+    """Drop the cached description; call after any migration or schema change"""
+    global _schema_text, _known_tables
+    with _schema_lock:
+        _schema_text = None
+        _known_tables = None
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _invalidate_after_create(target, connection, **kw):
+    invalidate_schema_cache()
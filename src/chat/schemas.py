@@ -8,4 +8,7 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     answer: str = Field(..., description="Natural language answer to the query")
     data: List[Dict[str, Any]] = Field(default=[], description="Query results if SQL was used")
-    used_sql: bool = Field(..., description="Whether SQL was used to answer the query")
\ No newline at end of file
+    used_sql: bool = Field(..., description="Whether SQL was used to answer the query")
+    truncated: bool = Field(False, description="Whether the query matched more rows than were returned")
+    notice: Optional[str] = Field(None, description="Why the generated query was rejected, cancelled or truncated")
+    intent: Optional[str] = Field(None, description="Local intent that answered the query without the LLM, if any")
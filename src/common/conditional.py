@@ -0,0 +1,66 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import extract, func, select
+
+
+def change_stamp(model, *criteria):
+    """One aggregate over the rows a response is built from: how many there are,
+    when the newest changed, and the sum of every row's change time.
+
+    now() is fixed when a transaction starts, so an update committed late can
+    carry an older time than the newest row and leave the first two alone; it
+    still changes that row's term in the sum. Inserts, updates and deletes all
+    move the stamp."""
+    changed_at = func.coalesce(model.updated_at, model.created_at)
+    return (
+        select(func.count(), func.max(changed_at), func.sum(extract("epoch", changed_at)))
+        .select_from(model)
+        .where(*criteria)
+    )
+
+
+class Validator:
+    """ETag and Last-Modified for a response, computed before any rows are loaded"""
+
+    def __init__(self, scope: str, stamp, cache_control: str = "no-cache"):
+        count, last_modified, checksum = stamp
+        if last_modified is not None and last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        self.last_modified: Optional[datetime] = last_modified
+        marker = f"{scope}|{count}|{last_modified.isoformat() if last_modified else ''}|{checksum}"
+        # Weak: the body is the same data, not necessarily the same bytes
+        self.etag = f'W/"{hashlib.sha256(marker.encode()).hexdigest()[:32]}"'
+        # Clients must revalidate, or they would reuse a body heuristically
+        self.cache_control = cache_control
+
+    @property
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified.astimezone(timezone.utc), usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """True when the client's copy is current. If-None-Match wins over
+        If-Modified-Since; the date alone cannot see deletions, so clients
+        that send only If-Modified-Since may keep a deleted row until the next change."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
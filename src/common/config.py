@@ -4,9 +4,47 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.environ["DATABASE_URL"]
+
+def _async_url(url: str) -> str:
+    """Point a sync database URL at its async driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+def _pool_settings(prefix: str) -> dict:
+    """Connection pool settings for one engine, e.g. DB_READ_POOL_SIZE"""
+    return {
+        "pool_size": int(os.environ.get(f"{prefix}_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get(f"{prefix}_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.environ.get(f"{prefix}_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.environ.get(f"{prefix}_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.environ.get(f"{prefix}_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+# Read replica; falls back to the primary when no replica is configured
+READ_DATABASE_URL = os.environ.get("READ_DATABASE_URL") or DATABASE_URL
+ASYNC_READ_DATABASE_URL = os.environ.get("ASYNC_READ_DATABASE_URL") or _async_url(READ_DATABASE_URL)
+WRITE_POOL_SETTINGS = _pool_settings("DB_WRITE")
+READ_POOL_SETTINGS = _pool_settings("DB_READ")
+# How long a client's reads stay on the primary after it commits a write
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
 JWT_KEY = os.environ["JWT_KEY"]
 ACCESS_TOKEN_EXPIRES = int(os.environ["ACCESS_TOKEN_EXPIRES"])
-GROQ_API_KEY = os.environ["GROQ_API_KEY"]
+# Chat model provider: "groq", or "fake" for an in-process stand-in (no network)
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "groq")
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "llama3-70b-8192")
+# Only required by the groq provider
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+# Optional override, e.g. http://127.0.0.1:8400 for benchmarks/fake_llm_server.py
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+# Fake provider: seconds before a reply, seconds between streamed words, SQL it generates
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_TOKEN_DELAY = float(os.environ.get("FAKE_LLM_TOKEN_DELAY", "0"))
+FAKE_LLM_SQL = os.environ.get("FAKE_LLM_SQL", "SELECT name, no_of_rooms FROM halls")
 
 from fastapi_mail import ConnectionConfig
 
@@ -14,11 +52,12 @@ EMAIL_CONFIG = ConnectionConfig(
     MAIL_USERNAME=os.environ["MAIL_USERNAME"],
     MAIL_PASSWORD=os.environ["MAIL_PASSWORD"],
     MAIL_FROM=os.environ["MAIL_FROM"],
-    MAIL_PORT=587,
+    MAIL_PORT=int(os.environ.get("MAIL_PORT", "587")),
     MAIL_SERVER=os.environ["MAIL_SERVER"],
     MAIL_FROM_NAME="Your App Name",
-    MAIL_STARTTLS=True,
+    # false for a local stand-in such as benchmarks/fake_smtp_server.py
+    MAIL_STARTTLS=os.environ.get("MAIL_STARTTLS", "true").lower() == "true",
     MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
+    USE_CREDENTIALS=os.environ.get("MAIL_USE_CREDENTIALS", "true").lower() == "true",
     VALIDATE_CERTS=True
 )
\ No newline at end of file
@@ -1,19 +1,201 @@
-from sqlalchemy import create_engine
+import time
+import hashlib
+import threading
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import (
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import (
+    Session,
     declarative_base,
     sessionmaker,
 )
-from .config import DATABASE_URL
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from .config import (
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    READ_DATABASE_URL,
+    ASYNC_READ_DATABASE_URL,
+    WRITE_POOL_SETTINGS,
+    READ_POOL_SETTINGS,
+    READ_YOUR_WRITES_SECONDS,
+)
+
+
+class PoolStats:
+    """Checkout counters and time spent waiting for a pooled connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            if waited > 0.001:
+                self.waits += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+# Keyed by pool logging name, which survives pool.recreate()
+_pool_stats = {name: PoolStats() for name in ("write", "read", "async_write", "async_read")}
+
+
+class _TimedCheckoutMixin:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _pool_stats[self._orig_logging_name].record_checkout(time.perf_counter() - started)
 
-engine = create_engine(DATABASE_URL)
+
+class MonitoredQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class MonitoredAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+engine = create_engine(DATABASE_URL, poolclass=MonitoredQueuePool,
+                       pool_logging_name="write", **WRITE_POOL_SETTINGS)
+read_engine = create_engine(READ_DATABASE_URL, poolclass=MonitoredQueuePool,
+                            pool_logging_name="read", **READ_POOL_SETTINGS)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=MonitoredAsyncQueuePool,
+                                   pool_logging_name="async_write", **WRITE_POOL_SETTINGS)
+async_read_engine = create_async_engine(ASYNC_READ_DATABASE_URL, poolclass=MonitoredAsyncQueuePool,
+                                        pool_logging_name="async_read", **READ_POOL_SETTINGS)
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+# expire_on_commit=False so ORM objects can still be serialized after commit
+# without triggering lazy loads outside the event loop's greenlet
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=True, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+
+def get_pool_stats() -> dict:
+    """Pool occupancy and checkout/wait counters for every engine"""
+    engines = {
+        "write": engine,
+        "read": read_engine,
+        "async_write": async_engine.sync_engine,
+        "async_read": async_read_engine.sync_engine,
+    }
+    stats = {}
+    for name, eng in engines.items():
+        pool = eng.pool
+        stats[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **_pool_stats[name].as_dict(),
+        }
+    return stats
+
+
+# Read-your-writes guard: a client that just committed a write reads from the
+# primary for READ_YOUR_WRITES_SECONDS, so replica lag never hides its own write.
+# Tracked per process; the window covers a client's immediate follow-up reads.
+_recent_writers: dict = {}
+_recent_writers_lock = threading.Lock()
+
+
+def _client_key(request: Request) -> str:
+    credential = request.headers.get("authorization") or (request.client.host if request.client else "")
+    return hashlib.sha256(credential.encode()).hexdigest()
+
+
+def _mark_recent_writer(request: Request):
+    now = time.monotonic()
+    with _recent_writers_lock:
+        if len(_recent_writers) > 10000:
+            for key in [k for k, until in _recent_writers.items() if until < now]:
+                del _recent_writers[key]
+        _recent_writers[_client_key(request)] = now + READ_YOUR_WRITES_SECONDS
+
+
+def _is_recent_writer(request: Request) -> bool:
+    until = _recent_writers.get(_client_key(request))
+    return until is not None and until > time.monotonic()
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_flushed_write(session, flush_context):
+    session.info["pending_write"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["pending_write"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _flag_committed_write(session):
+    if session.info.pop("pending_write", False):
+        session.info["committed_write"] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending_write(session):
+    session.info.pop("pending_write", None)
+
+def advisory_xact_lock(connection, name: str):
+    """Serialize one-off jobs (migrations, seeding) across processes until the
+    current transaction ends. Postgres only; a no-op on other databases."""
+    if connection.dialect.name != "postgresql":
+        return
+    key = int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
 
 #Database Injection
 
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        if db.info.get("committed_write"):
+            _mark_recent_writer(request)
+        db.close()
+
+def get_read_db(request: Request):
+    db = SessionLocal() if _is_recent_writer(request) else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        finally:
+            if db.sync_session.info.get("committed_write"):
+                _mark_recent_writer(request)
+
+async def get_async_read_db(request: Request):
+    session_factory = AsyncSessionLocal if _is_recent_writer(request) else AsyncReadSessionLocal
+    async with session_factory() as db:
+        yield db
+
+# Explicit names for routing by intent
+get_write_db = get_db
+get_async_write_db = get_async_db
@@ -17,4 +17,15 @@ class AllocationStatus(Enum):
     VACATED = "vacated"
     PENDING = "pending"
     REJECTED = "rejected"
-    ACTIVE = "active"
\ No newline at end of file
+    ACTIVE = "active"
+
+class TicketStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    ALLOCATED = "allocated"
+    REJECTED = "rejected"
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
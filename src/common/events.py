@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Iterable, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from .config import ASYNC_DATABASE_URL, DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Change events pushed to the dashboards over /dashboard/events.
+# On Postgres they travel through NOTIFY, so every worker process sees every
+# event; on other databases they only reach clients of the same process.
+EVENTS_CHANNEL = os.environ.get("EVENTS_CHANNEL", "hms_events")
+# Events buffered per connection; a client that falls this far behind is disconnected
+EVENTS_BUFFER = int(os.environ.get("EVENTS_BUFFER", "100"))
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "1000"))
+# Seconds between keep-alive comments on an idle stream
+EVENTS_KEEPALIVE = float(os.environ.get("EVENTS_KEEPALIVE", "15"))
+# NOTIFY payloads are capped at 8000 bytes; long audiences are split across messages
+_USERS_PER_MESSAGE = 100
+
+USE_NOTIFY = make_url(DATABASE_URL).get_backend_name() == "postgresql"
+
+
+def publish(session: Session, kind: str, data: dict, users: Iterable = ()):
+    """Queue a change event on the session's transaction.
+
+    Admins receive every event, students only those listing them in `users`.
+    Nothing is delivered unless the transaction commits. Call it with the
+    sync Session, or `await db.run_sync(publish, ...)` from an AsyncSession.
+    """
+    users = [str(user) for user in users]
+    chunks = [users[i:i + _USERS_PER_MESSAGE] for i in range(0, len(users), _USERS_PER_MESSAGE)] or [[]]
+    for part, chunk in enumerate(chunks):
+        message = json.dumps({"type": kind, "data": data, "users": chunk, "part": part}, default=str)
+        if USE_NOTIFY:
+            # Sent by Postgres at commit, dropped on rollback
+            session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                            {"channel": EVENTS_CHANNEL, "payload": message})
+        else:
+            session.info.setdefault("pending_events", []).append(message)
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_committed_events(session):
+    for message in session.info.pop("pending_events", ()):
+        event_broker.dispatch_threadsafe(message)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back_events(session):
+    session.info.pop("pending_events", None)
+
+
+class Subscription:
+    """One stream's bounded buffer. None in the buffer ends the stream."""
+
+    def __init__(self, user_id: str, is_admin: bool):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.queue = asyncio.Queue(maxsize=EVENTS_BUFFER + 1)
+        self.dropped = False
+
+    def wants(self, message: dict) -> bool:
+        if self.is_admin:
+            return message["part"] == 0
+        return self.user_id in message["users"]
+
+    def close(self):
+        """Free the buffer and end the stream; the client reconnects and reloads"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventBroker:
+    """Fans events out to the streams connected to this process"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def subscribe(self, user_id, is_admin: bool) -> Optional[Subscription]:
+        if len(self._subscriptions) >= EVENTS_MAX_SUBSCRIBERS:
+            self.rejected += 1
+            return None
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(str(user_id), is_admin)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def dispatch(self, payload: str):
+        """Deliver one message; runs on the event loop"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed event payload")
+            return
+        self.published += 1
+        outgoing = {"type": message["type"], "data": message["data"]}
+        for subscription in list(self._subscriptions):
+            if not subscription.wants(message):
+                continue
+            # One slot is kept for the closing marker
+            if subscription.queue.qsize() >= EVENTS_BUFFER:
+                self.dropped += 1
+                self._drop(subscription)
+                continue
+            subscription.queue.put_nowait(outgoing)
+            self.delivered += 1
+
+    def dispatch_threadsafe(self, payload: str):
+        """Deliver from any thread, e.g. a sync route or the allocation worker"""
+        loop = self._loop
+        if loop is None or not self._subscriptions:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.dispatch(payload)
+        else:
+            loop.call_soon_threadsafe(self.dispatch, payload)
+
+    def _drop(self, subscription: Subscription):
+        subscription.dropped = True
+        subscription.close()
+        self._subscriptions.discard(subscription)
+
+    def reset_all(self):
+        """Events may have been missed; every client reconnects and reloads"""
+        for subscription in list(self._subscriptions):
+            self._drop(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "transport": "notify" if USE_NOTIFY else "local",
+            "subscribers": len(self._subscriptions),
+            "buffer": EVENTS_BUFFER,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped,
+            "rejected_subscribers": self.rejected,
+        }
+
+
+event_broker = EventBroker()
+
+
+class EventListener:
+    """LISTENs on EVENTS_CHANNEL over a dedicated asyncpg connection and feeds the broker"""
+
+    def __init__(self, broker: EventBroker, dsn: str, channel: str):
+        self.broker = broker
+        self.dsn = dsn
+        self.channel = channel
+        self._task = None
+        self.reconnects = 0
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.broker.dispatch(payload)
+
+    async def _listen_once(self):
+        import asyncpg
+
+        connection = await asyncpg.connect(self.dsn)
+        closed = asyncio.get_running_loop().create_future()
+        connection.add_termination_listener(lambda _: closed.done() or closed.set_result(None))
+        try:
+            await connection.add_listener(self.channel, self._on_notify)
+            while not closed.done():
+                try:
+                    await asyncio.wait_for(asyncio.shield(closed), timeout=30)
+                except asyncio.TimeoutError:
+                    await connection.execute("SELECT 1")
+        finally:
+            if not connection.is_closed():
+                await connection.close()
+
+    async def _run(self):
+        delay = 1
+        while True:
+            started = time.monotonic()
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event listener lost its connection")
+            self.reconnects += 1
+            # Notifications sent while disconnected are gone
+            self.broker.reset_all()
+            # Back off only while connections keep failing
+            delay = 1 if time.monotonic() - started > 60 else min(delay * 2, 30)
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _build_listener() -> Optional[EventListener]:
+    if not USE_NOTIFY:
+        return None
+    dsn = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    return EventListener(event_broker, dsn, EVENTS_CHANNEL)
+
+
+event_listener = _build_listener()
+
+
+def format_event(message: Optional[dict]) -> str:
+    """One Server-Sent Events frame"""
+    if message is None:
+        return "event: reset\ndata: {}\n\n"
+    return f"event: {message['type']}\ndata: {json.dumps(message['data'], default=str)}\n\n"
+
+
+async def event_stream(request, subscription: Subscription):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout=EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(message)
+            if message is None:
+                break
+    finally:
+        event_broker.unsubscribe(subscription)
@@ -0,0 +1,89 @@
+import io
+import csv
+import json
+from enum import Enum
+from uuid import UUID
+from datetime import date, datetime
+from typing import AsyncIterator, Literal, Sequence
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from .db import AsyncReadSessionLocal
+
+ExportFormat = Literal["ndjson", "csv"]
+EXPORT_BATCH_SIZE = 1000
+
+_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _plain(value):
+    """Render a column value the same way in NDJSON and CSV"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+async def _stream_rows(query: Select) -> AsyncIterator[dict]:
+    # A session of its own: the request's dependencies are torn down before
+    # the body is streamed. stream() + yield_per runs a server-side cursor,
+    # so only one batch of rows is ever held in memory.
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for row in result.mappings():
+            yield {key: _plain(value) for key, value in row.items()}
+
+
+async def _ndjson_lines(query: Select) -> AsyncIterator[str]:
+    buffer = []
+    first = True
+    async for row in _stream_rows(query):
+        buffer.append(json.dumps(row))
+        # The first row goes out on its own so the client sees bytes immediately
+        if first or len(buffer) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(buffer) + "\n"
+            buffer.clear()
+            first = False
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+async def _csv_lines(query: Select, fieldnames: Sequence[str]) -> AsyncIterator[str]:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer.writeheader()
+    # Header goes out before the query runs
+    yield output.getvalue()
+    output.seek(0)
+    output.truncate(0)
+    rows_in_buffer = 0
+    async for row in _stream_rows(query):
+        writer.writerow(row)
+        rows_in_buffer += 1
+        if rows_in_buffer >= EXPORT_BATCH_SIZE:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            rows_in_buffer = 0
+    if rows_in_buffer:
+        yield output.getvalue()
+
+
+def export_response(query: Select, export_format: ExportFormat, filename: str) -> StreamingResponse:
+    """Stream the rows of `query` as NDJSON or CSV without materializing them"""
+    if export_format == "csv":
+        fieldnames = [column.key for column in query.selected_columns]
+        body = _csv_lines(query, fieldnames)
+    else:
+        body = _ndjson_lines(query)
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
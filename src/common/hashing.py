@@ -0,0 +1,112 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_PENDING = int(os.environ.get("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+HASH_RETRY_AFTER = int(os.environ.get("HASH_RETRY_AFTER", "2"))
+
+
+@lru_cache(maxsize=None)
+def build_crypt_context(rounds: int) -> CryptContext:
+    """bcrypt context pinned to `rounds`, so hashes made at any other cost need an update"""
+    return CryptContext(
+        schemes=["bcrypt"],
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+# Module-level so they can be pickled into the worker processes
+def _hash(password: str, rounds: int) -> str:
+    return build_crypt_context(rounds).hash(password)
+
+
+def _verify_and_update(plain: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return build_crypt_context(rounds).verify_and_update(plain, hashed)
+
+
+class PasswordHashingService:
+    """Runs bcrypt in a dedicated process pool, off the request threads.
+
+    At most `max_pending` hashes may be queued or running per worker process;
+    beyond that callers get a 503 with Retry-After instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int, retry_after: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            self.completed += 1
+            return result
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify_and_update(self, plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify `plain`; when valid but hashed at a different cost, also return a fresh hash"""
+        verified, new_hash = await self._submit(_verify_and_update, plain, hashed, self.rounds)
+        if new_hash:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+
+password_hasher = PasswordHashingService(
+    workers=HASH_WORKERS,
+    max_pending=HASH_MAX_PENDING,
+    rounds=BCRYPT_ROUNDS,
+    retry_after=HASH_RETRY_AFTER,
+)
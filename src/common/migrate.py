@@ -0,0 +1,113 @@
+"""
+One-time schema setup, run before starting (or after upgrading) the app:
+
+    python -m src.common.migrate
+
+Creates missing tables, then any nullable column, index and (on Postgres)
+exclusion constraint missing from an existing table, so those added to the
+models later reach databases created earlier. Columns copied from another
+table are filled in where still empty. A constraint the existing rows
+violate is skipped and reported. Safe to run repeatedly and from several
+deploy jobs at once.
+"""
+from sqlalchemy import inspect, or_, select, text, update
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import AddConstraint
+
+from src.common.db import Base, advisory_xact_lock, engine
+
+
+def load_models():
+    """Import every models module so Base.metadata knows all tables"""
+    import src.auth.models  # noqa: F401
+    import src.hostels.models  # noqa: F401
+    import src.complaints.models  # noqa: F401
+    import src.calendar.models  # noqa: F401
+    import src.mail.models  # noqa: F401
+    import src.common.ratelimit  # noqa: F401
+
+
+def _backfills() -> list:
+    """Statements filling copied columns on rows written before the copy existed"""
+    from src.complaints.models import Complaint, ComplaintUser
+    source = lambda column: select(column).where(Complaint.id == ComplaintUser.complaint_id).scalar_subquery()
+    return [
+        update(ComplaintUser)
+        .where(or_(ComplaintUser.status.is_(None), ComplaintUser.category.is_(None)))
+        .values(status=source(Complaint.status), category=source(Complaint.category)),
+    ]
+
+
+def migrate(bind=engine) -> dict:
+    load_models()
+    created = {"tables": [], "columns": [], "indexes": [], "constraints": [], "skipped": []}
+    with bind.begin() as connection:
+        advisory_xact_lock(connection, "hms:migrate")
+        postgres = connection.dialect.name == "postgresql"
+        if postgres:
+            # Equality on plain columns inside GiST exclusion constraints
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        existing = set(inspect(connection).get_table_names())
+        Base.metadata.create_all(bind=connection)
+        created["tables"] = [name for name in Base.metadata.tables if name not in existing]
+
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                # Only nullable columns can be added to a table that already has rows
+                if column.name in columns or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+                created["columns"].append(f"{table.name}.{column.name}")
+
+            present = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in present:
+                    index.create(bind=connection, checkfirst=True)
+                    created["indexes"].append(index.name)
+
+            if not postgres:
+                continue
+            for constraint in table.constraints:
+                if not isinstance(constraint, ExcludeConstraint):
+                    continue
+                exists = connection.execute(
+                    text("SELECT 1 FROM pg_constraint WHERE conname = :name AND conrelid = CAST(:table AS regclass)"),
+                    {"name": constraint.name, "table": table.name},
+                ).first()
+                if exists:
+                    continue
+                try:
+                    with connection.begin_nested():
+                        connection.execute(AddConstraint(constraint))
+                    created["constraints"].append(constraint.name)
+                except DBAPIError as e:
+                    # Existing rows already overlap; they have to be fixed by hand first
+                    created["skipped"].append(f"{constraint.name}: {str(e.orig).splitlines()[0]}")
+
+        for statement in _backfills():
+            connection.execute(statement)
+
+    # The chat prompt describes the schema; make it re-read the catalog
+    from src.chat.schema import invalidate_schema_cache
+    invalidate_schema_cache()
+    return created
+
+
+if __name__ == "__main__":
+    result = migrate()
+    print(f"Created tables: {', '.join(result['tables']) or 'none'}")
+    print(f"Added columns: {', '.join(result['columns']) or 'none'}")
+    print(f"Created indexes: {', '.join(result['indexes']) or 'none'}")
+    print(f"Created constraints: {', '.join(result['constraints']) or 'none'}")
+    for skipped in result["skipped"]:
+        print(f"Skipped constraint {skipped}")
@@ -0,0 +1,313 @@
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import Boolean, Column, Float, String, case, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.common.db import Base, async_engine
+
+logger = logging.getLogger(__name__)
+
+# "database" (the rate_limit_buckets table, shared by all workers),
+# "redis" (any Redis-compatible server at REDIS_URL) or "memory" (per process)
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "database")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# How often the database and memory backends drop buckets that have refilled
+RATE_LIMIT_PRUNE_SECONDS = float(os.environ.get("RATE_LIMIT_PRUNE_SECONDS", "60"))
+# Only behind a reverse proxy that sets X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Token bucket: `capacity` requests at once, refilled evenly over `period` seconds"""
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """"5/minute" -> Limit(5, 60)"""
+        count, _, unit = value.partition("/")
+        return cls(int(count), _PERIODS[unit.strip().lower()])
+
+
+def _limit(name: str, default: str) -> Limit:
+    return Limit.parse(os.environ.get(name, default))
+
+
+# Per client IP and per user (the account named in the request, or the caller)
+RATE_LIMITS = {
+    "login": (_limit("RATE_LIMIT_LOGIN_IP", "30/minute"), _limit("RATE_LIMIT_LOGIN_USER", "5/minute")),
+    "forgot_password": (_limit("RATE_LIMIT_FORGOT_IP", "10/hour"), _limit("RATE_LIMIT_FORGOT_USER", "3/hour")),
+    "chat": (_limit("RATE_LIMIT_CHAT_IP", "120/minute"), _limit("RATE_LIMIT_CHAT_USER", "20/minute")),
+}
+# A bucket untouched this long is full whatever its rule, and a full bucket
+# behaves exactly like a missing one, so it can be dropped
+FULL_AFTER = max(limit.period for limits in RATE_LIMITS.values() for limit in limits)
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: Limit
+    tokens: float
+
+    @property
+    def remaining(self) -> int:
+        return max(0, math.floor(self.tokens))
+
+    @property
+    def reset_after(self) -> int:
+        """Seconds until the bucket is full again"""
+        return math.ceil((self.limit.capacity - self.tokens) / self.limit.rate)
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds until the next request would be allowed"""
+        return max(1, math.ceil((1 - self.tokens) / self.limit.rate))
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String(80), primary_key=True)
+    tokens = Column(Float(), nullable=False)
+    # Outcome of the last take, so the upsert can report it in RETURNING
+    allowed = Column(Boolean(), nullable=False)
+    # Epoch seconds of the last take
+    updated_at = Column(Float(), nullable=False)
+
+
+class MemoryBackend:
+    """Per-process buckets; for a single worker or local development"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._next_prune = 0.0
+        self.pruned = 0
+
+    def _prune(self, now: float):
+        stale = [key for key, (_, updated_at) in self._buckets.items() if updated_at < now - FULL_AFTER]
+        for key in stale:
+            del self._buckets[key]
+        self.pruned += len(stale)
+
+    async def take(self, key: str, limit: Limit, now: float) -> RateLimitResult:
+        with self._lock:
+            if now >= self._next_prune:
+                self._next_prune = now + RATE_LIMIT_PRUNE_SECONDS
+                self._prune(now)
+            tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + max(0.0, now - updated_at) * limit.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return RateLimitResult(allowed, limit, tokens)
+
+
+class DatabaseBackend:
+    """One upsert per check: refill, take a token if there is one, report the outcome"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._next_prune = 0.0
+        self.pruned = 0
+
+    def _statement(self, dialect: str, key: str, limit: Limit, now: float):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        least = func.least if dialect == "postgresql" else func.min
+        greatest = func.greatest if dialect == "postgresql" else func.max
+        insert = dialect_insert(RateLimitBucket).values(
+            key=key, tokens=limit.capacity - 1, allowed=True, updated_at=now,
+        )
+        existing = RateLimitBucket.__table__.c
+        # Clocks of different hosts may disagree slightly; never refill backwards
+        elapsed = greatest(0, now - existing.updated_at)
+        refilled = least(limit.capacity, existing.tokens + elapsed * limit.rate)
+        return insert.on_conflict_do_update(
+            index_elements=[existing.key],
+            set_={
+                "tokens": refilled - case((refilled >= 1, 1.0), else_=0.0),
+                "allowed": refilled >= 1,
+                "updated_at": now,
+            },
+        ).returning(existing.tokens, existing.allowed)
+
+    async def take(self, key: str, limit: Limit, now: float) -> RateLimitResult:
+        async with self.engine.begin() as connection:
+            statement = self._statement(connection.dialect.name, key, limit, now)
+            tokens, allowed = (await connection.execute(statement)).one()
+        if now >= self._next_prune:
+            # Keys come from request data, so without this the table only grows
+            self._next_prune = now + RATE_LIMIT_PRUNE_SECONDS
+            await self.prune(now)
+        return RateLimitResult(bool(allowed), limit, tokens)
+
+    async def prune(self, now: float):
+        """Delete the buckets that have refilled completely. A take racing with
+        this sets updated_at first, so its row no longer matches."""
+        try:
+            async with self.engine.begin() as connection:
+                result = await connection.execute(
+                    delete(RateLimitBucket).where(RateLimitBucket.updated_at < now - FULL_AFTER)
+                )
+        except Exception:
+            # The take itself succeeded; try again at the next interval
+            logger.warning("Pruning rate limit buckets failed", exc_info=True)
+            return
+        self.pruned += result.rowcount
+
+
+# KEYS[1] bucket; ARGV capacity, rate, now. Tokens are returned as a string
+# because Redis truncates Lua numbers to integers.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    """One script call per check; keys expire once their bucket would be full"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis)")
+        self.client = redis.from_url(url)
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: Limit, now: float) -> RateLimitResult:
+        allowed, tokens = await self._take(keys=[f"ratelimit:{key}"], args=[limit.capacity, limit.rate, now])
+        return RateLimitResult(bool(int(allowed)), limit, float(tokens))
+
+
+def _build_backend(name: str):
+    if name == "database":
+        return DatabaseBackend(async_engine)
+    if name == "redis":
+        return RedisBackend(REDIS_URL)
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {name!r}; expected 'database', 'redis' or 'memory'")
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _bucket_key(rule: str, kind: str, value: str) -> str:
+    # Hashed so keys have a fixed length and no emails are stored
+    return f"{rule}:{kind}:{hashlib.sha256(value.encode()).hexdigest()[:32]}"
+
+
+class RateLimiter:
+    """Per-IP and per-user token buckets for the rules in RATE_LIMITS.
+
+    Each check costs one O(1) backend operation per bucket. If the backend is
+    unreachable requests are let through and counted as errors.
+    """
+
+    def __init__(self, backend_name: str):
+        self.backend_name = backend_name
+        self._backend = None
+        self._lock = threading.Lock()
+        self.allowed = {}
+        self.denied = {}
+        self.errors = 0
+
+    @property
+    def backend(self):
+        # Built on first use, so importing this module needs no Redis client
+        if self._backend is None:
+            self._backend = _build_backend(self.backend_name)
+        return self._backend
+
+    async def check(self, request: Request, response: Optional[Response], rule: str,
+                    user: Optional[str] = None) -> dict:
+        """Take a token from the rule's buckets and return the RateLimit-* headers.
+
+        The headers are also set on `response` when given. Raises a 429 with
+        Retry-After when a bucket is empty.
+        """
+        ip_limit, user_limit = RATE_LIMITS[rule]
+        buckets = [(_bucket_key(rule, "ip", client_ip(request)), ip_limit)]
+        if user:
+            buckets.append((_bucket_key(rule, "user", user.strip().lower()), user_limit))
+
+        now = time.time()
+        results = []
+        try:
+            for key, limit in buckets:
+                result = await self.backend.take(key, limit, now)
+                results.append(result)
+                if not result.allowed:
+                    break
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return {}
+
+        # Report the bucket closest to running out
+        tightest = min(results, key=lambda r: (r.allowed, r.remaining))
+        headers = {
+            "RateLimit-Limit": str(tightest.limit.capacity),
+            "RateLimit-Remaining": str(tightest.remaining),
+            "RateLimit-Reset": str(tightest.reset_after),
+        }
+        with self._lock:
+            counter = self.allowed if tightest.allowed else self.denied
+            counter[rule] = counter.get(rule, 0) + 1
+        if not tightest.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, try again later",
+                headers={**headers, "Retry-After": str(tightest.retry_after)},
+            )
+        if response is not None:
+            response.headers.update(headers)
+        return headers
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend_name,
+                "allowed": dict(self.allowed),
+                "denied": dict(self.denied),
+                "errors": self.errors,
+                # Idle buckets dropped by the database or memory backend
+                "pruned": getattr(self._backend, "pruned", None),
+            }
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_BACKEND)
@@ -1,30 +1,39 @@
+import os
+import hmac
+import hashlib
+import secrets
+from dataclasses import dataclass
+from typing import Optional
 from uuid import UUID
 import string, random
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import (
     HTTPException,
     Depends,
+    Query,
     status
 )
-from fastapi_mail import (
-    MessageSchema,
-    FastMail
-)
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.auth.models import User
 from datetime import (
     datetime,
     UTC,
     timedelta
 )
-from passlib.context import CryptContext
 from jwt import encode, decode
 
-from .config import JWT_KEY, EMAIL_CONFIG
-from .db import get_db
+from .config import JWT_KEY
+from .db import get_db, get_async_db
+from .cache import TTLCache
+from .hashing import BCRYPT_ROUNDS, build_crypt_context
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+# Synchronous hashing for scripts such as seeding; request handlers use
+# src.common.hashing.password_hasher so bcrypt never runs on a request thread
+pwd_context = build_crypt_context(BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 def hash_password(password):
     return pwd_context.hash(password)
@@ -48,12 +57,15 @@ def create_access_token(data: dict, expires_delta: timedelta=None):
     encoded_jwt = jwt_encode(to_encode)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _user_id_from_token(token: str) -> UUID:
+    credentials_exception = _credentials_exception()
     try:
         payload = jwt_decode(token)
         user_id: UUID = payload.get("sub")
@@ -63,14 +75,123 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         
         if user_id is None:
             raise credentials_exception
+        user_id = UUID(str(user_id))
     except Exception:
         raise credentials_exception
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    return user_id
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by auth checks; never carries the password hash"""
+    id: UUID
+    email: str
+    name: str
+    level: Optional[int]
+    department: Optional[str]
+    phone_number: Optional[str]
+    avatar_url: Optional[str]
+    is_admin: bool
+
+# Only the columns auth needs are ever loaded
+_PRINCIPAL_COLUMNS = (
+    User.id,
+    User.email,
+    User.name,
+    User.level,
+    User.department,
+    User.phone_number,
+    User.avatar_url,
+    User.is_admin,
+)
+
+# Per-process; invalidate_principal() is called wherever a user row changes,
+# and the TTL bounds how long other workers can serve a stale entry
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("PRINCIPAL_CACHE_TTL", "60")),
+)
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(str(user_id))
+
+def _principal_from_row(row) -> Principal:
+    return Principal(**row._asdict())
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    user_id = _user_id_from_token(token)
+    principal = principal_cache.get(str(user_id))
+    if principal is None:
+        row = db.execute(select(*_PRINCIPAL_COLUMNS).where(User.id == user_id)).first()
+        if row is None:
+            raise _credentials_exception()
+        principal = _principal_from_row(row)
+        principal_cache.set(str(user_id), principal)
+    return principal
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """Async counterpart of get_current_user for routes running on AsyncSession"""
+    user_id = _user_id_from_token(token)
+    principal = principal_cache.get(str(user_id))
+    if principal is None:
+        row = (await db.execute(select(*_PRINCIPAL_COLUMNS).where(User.id == user_id))).first()
+        if row is None:
+            raise _credentials_exception()
+        principal = _principal_from_row(row)
+        principal_cache.set(str(user_id), principal)
+    return principal
+
+async def get_stream_user(
+    access_token: Optional[str] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """For event streams: EventSource cannot set headers, so the token may come as ?access_token="""
+    token = token or access_token
+    if not token:
+        raise _credentials_exception()
+    return await get_current_user_async(token, db)
+
+# Feed tokens are signed with their own key, never JWT_KEY itself, so they
+# cannot pass as login tokens and login tokens cannot pass as feed tokens
+_FEED_SIGNING_KEY = hmac.new(JWT_KEY.encode(), b"hms:calendar-feed", hashlib.sha256).digest()
+
+def new_feed_key() -> str:
+    return secrets.token_urlsafe(32)
+
+def create_feed_token(user_id, feed_key: str) -> str:
+    """A read-only token for the user's calendar feed. It does not expire;
+    giving the user a new feed key revokes it."""
+    signature = hmac.new(_FEED_SIGNING_KEY, f"{user_id}:{feed_key}".encode(), hashlib.sha256).hexdigest()
+    return f"{user_id}.{signature}"
+
+def get_feed_user(
+    token: str = Query(..., description="From GET /calendar/feed-link"),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """For calendar subscriptions: accepts only feed tokens, and only feed routes use it"""
+    user_id, _, _ = token.partition(".")
+    try:
+        user_id = UUID(user_id)
+    except ValueError:
+        raise _credentials_exception()
+    row = db.execute(select(*_PRINCIPAL_COLUMNS, User.calendar_feed_key).where(User.id == user_id)).first()
+    if row is None or row.calendar_feed_key is None:
+        raise _credentials_exception()
+    if not hmac.compare_digest(create_feed_token(user_id, row.calendar_feed_key), token):
+        raise _credentials_exception()
+    fields = row._asdict()
+    fields.pop("calendar_feed_key")
+    return Principal(**fields)
 
-def is_admin(current_user: User = Depends(get_current_user)):
+def is_admin(current_user: Principal = Depends(get_current_user)):
+    if current_user.is_admin == False:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail= "Not an administrator"
+        )
+    return current_user
+
+async def is_admin_async(current_user: Principal = Depends(get_current_user_async)):
     if current_user.is_admin == False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -105,36 +226,3 @@ def generate_random_password(length=12):
     random.shuffle(password)
     
     return ''.join(password)
-
-async def send_password_reset_email(email_to: str, user_name: str, new_password: str):
-    """
-    Send an email with the new generated password
-    """
-    # Create HTML and plain text content
-    html_content = f"""
-    <html>
-      <body>
-        <h2>Password Reset</h2>
-        <p>Hi {user_name},</p>
-        <p>We received a request to reset your password. Your new password is:</p>
-        <p><strong>{new_password}</strong></p>
-        <p>Please log in with this password and then change it immediately for security reasons.</p>
-        <p>If you didn't request this password reset, please contact our support team immediately.</p>
-      </body>
-    </html>
-    """
-    
-    message = MessageSchema(
-        subject="Your New Password",
-        recipients=[email_to],
-        body=html_content,
-        subtype="html"
-    )
-    
-    # Create FastMail instance
-    fm = FastMail(EMAIL_CONFIG)
-    
-    # Send email
-    await fm.send_message(message)
-    
-    return {"message": "Email has been sent"}
\ No newline at end of file
@@ -1,17 +1,27 @@
 import uuid
 from datetime import datetime, UTC
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from src.common.db import engine
+from src.common.db import advisory_xact_lock, engine
 from src.auth.models import User 
 from src.hostels.models import Hall, Room, RoomAllocation
 from src.complaints.models import Complaint, ComplaintUser
 from src.common.enums import Status, ComplainCategory, AllocationStatus
 from src.common.security import hash_password
 
+SEED_ADMIN_EMAIL = "admin@example.com"
+
 def seed_db():
+    """Insert demo data once: python -m src.common.seed (after src.common.migrate)"""
     try:
         with Session(bind=engine) as session:
+            # Concurrent runs wait here; the loser then sees the seeded admin
+            advisory_xact_lock(session.connection(), "hms:seed")
+            if session.execute(select(User.id).where(User.email == SEED_ADMIN_EMAIL)).first():
+                print("Seed data already present; nothing to do.")
+                return
+
             # Users
             user1 = User(
                 id=uuid.uuid4(),
@@ -33,7 +43,7 @@ def seed_db():
             )
             user3 = User(
                 id=uuid.uuid4(),
-                email="admin@example.com",
+                email=SEED_ADMIN_EMAIL,
                 name="Admin User",
                 department="Admin",
                 hashed_password=hash_password("admin123"),
@@ -59,7 +69,9 @@ def seed_db():
             complaint_user = ComplaintUser(
                 complaint_id=complaint.id,
                 created_by=user1.id,
-                created_at=datetime.now(UTC)
+                created_at=datetime.now(UTC),
+                status=complaint.status,
+                category=complaint.category
             )
 
             session.add(complaint_user)
@@ -110,3 +122,6 @@ def seed_db():
         print("Integrity error occurred while seeding the database:")
         print(e.orig)  # This shows the database-level error message
 
+
+if __name__ == "__main__":
+    seed_db()
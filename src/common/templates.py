@@ -0,0 +1,97 @@
+import os
+import gzip
+import hashlib
+import threading
+from typing import Optional
+from fastapi import Request, Response
+from fastapi.templating import Jinja2Templates
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# The one template environment of the app
+templates = Jinja2Templates(directory="templates")
+
+# Pages are rendered once per process; set PAGE_CACHE=false while editing templates
+PAGE_CACHE = os.environ.get("PAGE_CACHE", "true").lower() == "true"
+# Browsers revalidate on every load (a 304 when nothing changed), so a deploy shows up at once
+PAGE_CACHE_CONTROL = os.environ.get("PAGE_CACHE_CONTROL", "public, no-cache")
+
+
+class StaticPage:
+    """A rendered page with its compressed variants and a strong ETag for each"""
+
+    def __init__(self, body: bytes):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {"identity": (body, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+
+def _accepted_encodings(header: str) -> dict:
+    """Accept-Encoding as {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(page: StaticPage, accept_encoding: Optional[str]) -> str:
+    accepted = _accepted_encodings(accept_encoding or "")
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding in page.variants and accepted.get(coding, wildcard) > 0:
+            return coding
+    return "identity"
+
+
+def _matches(if_none_match: Optional[str], etags: set) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") in etags for tag in if_none_match.split(","))
+
+
+_pages = {}
+_pages_lock = threading.Lock()
+
+
+def get_page(name: str) -> StaticPage:
+    """Render `name` once; the templates must not depend on the request"""
+    page = _pages.get(name) if PAGE_CACHE else None
+    if page is None:
+        body = templates.get_template(name).render().encode()
+        page = StaticPage(body)
+        if PAGE_CACHE:
+            with _pages_lock:
+                page = _pages.setdefault(name, page)
+    return page
+
+
+def page_response(request: Request, name: str) -> Response:
+    """Serve a pre-rendered page from memory, honouring If-None-Match and Accept-Encoding"""
+    page = get_page(name)
+    encoding = choose_encoding(page, request.headers.get("accept-encoding"))
+    body, etag = page.variants[encoding]
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if _matches(request.headers.get("if-none-match"), page.etags):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
@@ -6,13 +6,14 @@ from sqlalchemy import (
     String,
     Boolean,
     DateTime,
+    Index,
     func
 )
 from sqlalchemy.dialects.postgresql import(
     UUID,
     ENUM
 )
-from src.common.db import Base, engine
+from src.common.db import Base
 from src.common.enums import (
     Status,
     ComplainCategory
@@ -28,6 +29,10 @@ class Complaint(Base):
     status = Column(ENUM(Status), default=Status.PENDING)
     # no_of_complaints = Column(Integer())
 
+    __table_args__ = (
+        Index("ix_complaints_status_category", "status", "category"),
+    )
+
 class ComplaintUser(Base):
     __tablename__ = "complains_logs"
     complaint_id = Column(ForeignKey("complaints.id"), primary_key=True)
@@ -36,5 +41,16 @@ class ComplaintUser(Base):
     resolved_by = Column(ForeignKey("users.id", ondelete="CASCADE"),
                          nullable=True)
     resolved_at = Column(DateTime(timezone=False), nullable=True)
+    # Copies of the complaint's status and category, written with it, so a
+    # filtered page walks one index in page order instead of sorting matches
+    status = Column(ENUM(Status), nullable=True)
+    category = Column(ENUM(ComplainCategory), nullable=True)
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    __table_args__ = (
+        # Keyset pagination of the complaint list walks this index newest-first
+        Index("ix_complains_logs_created_at_complaint_id", "created_at", "complaint_id"),
+        Index("ix_complains_logs_created_by_created_at", "created_by", "created_at"),
+        # The same, for pages filtered by status or by category
+        Index("ix_complains_logs_status_created_at_complaint_id", "status", "created_at", "complaint_id"),
+        Index("ix_complains_logs_category_created_at_complaint_id", "category", "created_at", "complaint_id"),
+    )
@@ -1,6 +1,9 @@
+import json
+import base64
 from typing import List, Optional
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import (
     APIRouter,
     Path,
@@ -8,6 +11,8 @@ from fastapi import (
     status,
     HTTPException,
     Request,
+    Response,
+    Query,
     Body
 )
 from datetime import datetime
@@ -25,10 +30,13 @@ from .schemas import(
     ResolveResponse
 )
 from src.auth.models import User # Import User model
-from src.common.db import get_db
+from src.common.db import get_async_db, get_async_read_db
+from src.common.events import publish
+from src.common.export import ExportFormat, export_response
 from src.common.security import(
-    get_current_user,
-    is_admin
+    get_current_user_async,
+    is_admin_async,
+    Principal
 )
 # from src.common.enums import Status # Already imported
 
@@ -59,49 +67,156 @@ class FullComplaintResponse(BaseModel):
         use_enum_values = True # Ensures enum values (e.g., "PENDING") are used
 
 
+# Columns needed to build a FullComplaintResponse; never loads whole User rows
+_COMPLAINT_LIST_COLUMNS = (
+    Complaint.id,
+    Complaint.title,
+    Complaint.content,
+    Complaint.category,
+    Complaint.status,
+    ComplaintUser.created_by,
+    ComplaintUser.created_at,
+    ComplaintUser.resolved_by,
+    ComplaintUser.resolved_at,
+    User.name.label("created_by_name"),
+    User.level.label("user_level"),
+)
+
+def _encode_cursor(created_at: datetime, complaint_id) -> str:
+    raw = json.dumps({"created_at": created_at.isoformat(), "id": str(complaint_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(raw["created_at"]), UUID(raw["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor."
+        )
+
+def _complaint_filters(
+    status_filter: Optional[Status],
+    category: Optional[ComplainCategory],
+    created_by: Optional[UUID],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime],
+) -> list:
+    filters = []
+    # On the copies in complains_logs, which the ordering indexes cover
+    if status_filter:
+        filters.append(ComplaintUser.status == status_filter)
+    if category:
+        filters.append(ComplaintUser.category == category)
+    if created_by:
+        filters.append(ComplaintUser.created_by == created_by)
+    if created_from:
+        filters.append(ComplaintUser.created_at >= created_from)
+    if created_to:
+        filters.append(ComplaintUser.created_at < created_to)
+    return filters
+
+def _full_complaint_response(row) -> FullComplaintResponse:
+    return FullComplaintResponse(
+        complaint_id=str(row.id),
+        title=row.title,
+        details=row.content, # Use content for details
+        category=row.category,
+        created_by=str(row.created_by),
+        created_by_name=row.created_by_name, # Get creator's name
+        user_level=str(row.user_level) if row.user_level else None, # Get creator's level
+        created_at=row.created_at,
+        status=row.status, # This is the crucial field
+        resolved_by=str(row.resolved_by) if row.resolved_by else None,
+        resolved_at=row.resolved_at
+    )
+
 @complaint_router.get("/", response_model=List[FullComplaintResponse])
-def get_all_complaints(
+async def get_all_complaints(
     request: Request,
-    current_admin: User = Depends(is_admin),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    status_filter: Optional[Status] = Query(None, alias="status"),
+    category: Optional[ComplainCategory] = None,
+    created_by: Optional[UUID] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_total: bool = False,
+    current_admin: Principal = Depends(is_admin_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
+    """
+    Newest complaints first, one page at a time.
+
+    Pages are keyset-paginated on (created_at, complaint_id), so each page
+    costs O(limit) regardless of history size. The cursor for the next page
+    is returned in the X-Next-Cursor header (absent on the last page) and,
+    with include_total=true, the matching row count in X-Total-Count.
+    """
+    filters = _complaint_filters(status_filter, category, created_by, created_from, created_to)
+
     # Join Complaint, ComplaintUser, and User (for creator details)
-    complaint_data = db.query(
-        Complaint,
-        ComplaintUser,
-        User  # User model for the creator
-    ).join(
+    query = select(*_COMPLAINT_LIST_COLUMNS).join(
         ComplaintUser, Complaint.id == ComplaintUser.complaint_id
     ).join(
         User, ComplaintUser.created_by == User.id  # Join on creator's ID
-    ).all()
+    ).where(*filters)
 
-    result = []
-    for complaint, complaint_log, creator_user in complaint_data:
-        result.append(FullComplaintResponse(
-            complaint_id=str(complaint.id),
-            title=complaint.title,
-            details=complaint.content, # Use content for details
-            category=complaint.category,
-            created_by=str(complaint_log.created_by),
-            created_by_name=creator_user.name, # Get creator's name
-            user_level=str(creator_user.level) if creator_user.level else None, # Get creator's level
-            created_at=complaint_log.created_at,
-            status=complaint.status, # This is the crucial field
-            resolved_by=str(complaint_log.resolved_by) if complaint_log.resolved_by else None,
-            resolved_at=complaint_log.resolved_at
-        ))
-        
-    return result
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.where(
+            tuple_(ComplaintUser.created_at, ComplaintUser.complaint_id) < tuple_(cursor_created_at, cursor_id)
+        )
+
+    rows = (await db.execute(query.order_by(
+        ComplaintUser.created_at.desc(),
+        ComplaintUser.complaint_id.desc()
+    ).limit(limit + 1))).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    if include_total:
+        total = (await db.execute(select(func.count()).select_from(ComplaintUser).join(
+            Complaint, Complaint.id == ComplaintUser.complaint_id
+        ).where(*filters))).scalar()
+        response.headers["X-Total-Count"] = str(total)
+
+    return [_full_complaint_response(row) for row in rows]
+
+@complaint_router.get("/export")
+async def export_complaints(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    status_filter: Optional[Status] = Query(None, alias="status"),
+    category: Optional[ComplainCategory] = None,
+    created_by: Optional[UUID] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    current_admin: Principal = Depends(is_admin_async)
+):
+    """Stream all matching complaints, newest first, as NDJSON or CSV in constant memory"""
+    filters = _complaint_filters(status_filter, category, created_by, created_from, created_to)
+    query = select(*_COMPLAINT_LIST_COLUMNS).join(
+        ComplaintUser, Complaint.id == ComplaintUser.complaint_id
+    ).join(
+        User, ComplaintUser.created_by == User.id
+    ).where(*filters).order_by(
+        ComplaintUser.created_at.desc(),
+        ComplaintUser.complaint_id.desc()
+    )
+    return export_response(query, export_format, "complaints")
 
 @complaint_router.get("/{complaint_id}", response_model=FullComplaintResponse)
-def get_complaint_by_id(
+async def get_complaint_by_id(
     complaint_id: UUID =  Path(...),
-    current_admin: User = Depends(is_admin), 
-    db: Session = Depends(get_db)
+    current_admin: Principal = Depends(is_admin_async), 
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     # Join Complaint, ComplaintUser, and User (for creator details)
-    data = db.query(
+    data = (await db.execute(select(
         Complaint,
         ComplaintUser,
         User # User model for the creator
@@ -109,9 +224,9 @@ def get_complaint_by_id(
         ComplaintUser, Complaint.id == ComplaintUser.complaint_id
     ).join(
         User, ComplaintUser.created_by == User.id # Join on creator's ID
-    ).filter(
+    ).where(
         Complaint.id == complaint_id
-    ).first()
+    ))).first()
     
     if not data:
         raise HTTPException(
@@ -136,11 +251,11 @@ def get_complaint_by_id(
     )
 
 @complaint_router.post("/create-complaint", response_model=FullComplaintResponse)
-def create_complaint(
+async def create_complaint(
     request: Request,
     complaint: ComplaintCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user) # This is the creator
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async) # This is the creator
 ):
     try:
         if not current_user: # Safeguard, though get_current_user should raise 401
@@ -154,15 +269,23 @@ def create_complaint(
             content = complaint.content,
             category = complaint.category,            )
         db.add(new_complaint)
-        db.flush() 
+        await db.flush() 
         log = ComplaintUser(
                 complaint_id=new_complaint.id, 
                 created_by=current_user.id,
+                status=new_complaint.status,
+                category=new_complaint.category,
             )
         db.add(log)
-        db.commit()
-        db.refresh(new_complaint)
-        db.refresh(log)
+        await db.run_sync(publish, "complaint.created", {
+            "id": new_complaint.id,
+            "title": new_complaint.title,
+            "category": new_complaint.category,
+            "status": new_complaint.status,
+        }, [current_user.id])
+        await db.commit()
+        await db.refresh(new_complaint)
+        await db.refresh(log)
 
         return FullComplaintResponse(
             complaint_id=str(new_complaint.id), 
@@ -178,7 +301,7 @@ def create_complaint(
             resolved_at=None  # New complaints are not resolved
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # It's good practice to log the actual error e
         print(f"Error in create_complaint: {e}")
         raise HTTPException(
@@ -187,10 +310,10 @@ def create_complaint(
         )
 
 @complaint_router.put("/{complaint_id}/resolve", response_model=ResolveResponse)
-def resolve_complaint(
+async def resolve_complaint(
     complaint_id: UUID = Path(...),
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Principal = Depends(is_admin_async)
 ):
     """
     Resolve a single complaint by ID.
@@ -203,7 +326,7 @@ def resolve_complaint(
     #     )
         
     try:
-        complaint = db.query(Complaint).filter(Complaint.id == complaint_id).first()
+        complaint = (await db.execute(select(Complaint).where(Complaint.id == complaint_id))).scalars().first()
         if not complaint:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -211,7 +334,7 @@ def resolve_complaint(
             )
         
         if complaint.status == Status.RESOLVED:
-            complaint_log_existing = db.query(ComplaintUser).filter(ComplaintUser.complaint_id == complaint_id).first()
+            complaint_log_existing = (await db.execute(select(ComplaintUser).where(ComplaintUser.complaint_id == complaint_id))).scalars().first()
             return ResolveResponse(
                 complaint_id=str(complaint.id), # Ensure complaint_id is string
                 status=complaint.status,
@@ -222,22 +345,25 @@ def resolve_complaint(
         
         complaint.status = Status.RESOLVED
         
-        complaint_log = db.query(ComplaintUser).filter(
+        complaint_log = (await db.execute(select(ComplaintUser).where(
             ComplaintUser.complaint_id == complaint_id
-        ).first()
+        ))).scalars().first()
         
         if not complaint_log: 
             # This situation implies data inconsistency, as a complaint should always have a log.
             # Rollback status change on complaint if log is missing for atomicity.
-            db.rollback() # Rollback the complaint.status change
+            await db.rollback() # Rollback the complaint.status change
             raise HTTPException(status_code=500, detail="Complaint log missing for existing complaint. Resolution aborted.")
 
         complaint_log.resolved_by = current_admin.id # This line caused the error if current_admin was None
         complaint_log.resolved_at = datetime.now()
+        complaint_log.status = complaint.status
         
-        db.commit()
-        db.refresh(complaint)
-        db.refresh(complaint_log)
+        await db.run_sync(publish, "complaint.resolved", {"id": complaint.id, "status": complaint.status},
+                          [complaint_log.created_by])
+        await db.commit()
+        await db.refresh(complaint)
+        await db.refresh(complaint_log)
         
         return ResolveResponse(
             complaint_id=str(complaint.id), # Ensure complaint_id is string
@@ -246,10 +372,10 @@ def resolve_complaint(
             resolved_at=complaint_log.resolved_at
         )
     except HTTPException: # Re-raise HTTPExceptions directly
-        db.rollback() 
+        await db.rollback() 
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error in resolve_complaint: {e}") # Log the original error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -257,10 +383,10 @@ def resolve_complaint(
         )
 
 @complaint_router.post("/bulk-resolve", response_model=List[ResolveResponse])
-def bulk_resolve_complaints(
+async def bulk_resolve_complaints(
     request: BulkResolveRequest = Body(...),
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: Principal = Depends(is_admin_async)
 ):
     # if not current_admin: # Safeguard for current_admin being None
     #     # This case should ideally be caught by the is_admin dependency
@@ -305,28 +431,28 @@ def bulk_resolve_complaints(
         return results # Return results if all were invalid UUIDs or list was empty
 
     # Fetch complaints that are not yet resolved
-    complaints_to_update = db.query(Complaint).filter(
+    complaints_to_update = (await db.execute(select(Complaint).where(
         Complaint.id.in_(valid_complaint_uuids_to_process),
         Complaint.status != Status.RESOLVED
-    ).all()
+    ))).scalars().all()
     
     complaint_ids_to_update = {c.id for c in complaints_to_update}
 
     # Fetch corresponding complaint logs for those to be updated
     complaint_logs_dict = {
         log.complaint_id: log 
-        for log in db.query(ComplaintUser).filter(ComplaintUser.complaint_id.in_(complaint_ids_to_update)).all()
+        for log in (await db.execute(select(ComplaintUser).where(ComplaintUser.complaint_id.in_(complaint_ids_to_update)))).scalars().all()
     }
     
     # Handle complaints that were not found or already resolved among the valid UUIDs
     for uid in valid_complaint_uuids_to_process:
         if uid not in complaint_ids_to_update: # Not in the list of "to be updated"
             # Check if it exists at all or is already resolved
-            existing_complaint = db.query(Complaint).filter(Complaint.id == uid).first()
+            existing_complaint = (await db.execute(select(Complaint).where(Complaint.id == uid))).scalars().first()
             if existing_complaint:
                 if existing_complaint.status == Status.RESOLVED:
                     # Fetch its log to provide resolved_by/at details
-                    existing_log = db.query(ComplaintUser).filter(ComplaintUser.complaint_id == uid).first()
+                    existing_log = (await db.execute(select(ComplaintUser).where(ComplaintUser.complaint_id == uid))).scalars().first()
                     results.append(ResolveResponse(
                         complaint_id=str(uid),
                         status=existing_complaint.status,
@@ -357,6 +483,7 @@ def bulk_resolve_complaints(
             if complaint_log:
                 complaint_log.resolved_by = current_admin.id # This line caused the error
                 complaint_log.resolved_at = current_time
+                complaint_log.status = complaint.status
                 
                 results.append(ResolveResponse(
                     complaint_id=str(complaint.id),
@@ -376,11 +503,13 @@ def bulk_resolve_complaints(
                     message=f"Complaint log not found for {complaint.id}. Status updated in transaction, but log details incomplete."
                 ))
         
-        db.commit()
+        await db.run_sync(publish, "complaint.bulk_resolved", {"count": len(complaints_to_update)},
+                          [log.created_by for log in complaint_logs_dict.values()])
+        await db.commit()
         
         return results  
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error in bulk_resolve_complaints: {e}") # Log the original error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,33 +1,75 @@
 from fastapi import (
     APIRouter,
     Request,
-    Depends
+    Depends,
+    HTTPException,
+    Response,
+    status
 )
-from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.common.db import get_async_read_db
+from src.common.events import event_broker, event_stream
 from src.common.security import(
     get_current_user,
-    is_admin
+    is_admin,
+    is_admin_async,
+    get_stream_user,
+    Principal
 )
 from src.auth.models import User
-from fastapi.responses import RedirectResponse
+from src.common.templates import page_response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from .schemas import AdminOverview
+from .service import ADMIN_OVERVIEW_TTL, get_admin_overview
 dashboard_router = APIRouter(
     prefix="/dashboard",
     tags=["DASHBOARD"]
 )
 
-templates = Jinja2Templates(directory="templates")
-
 @dashboard_router.get("/admin-dashboard")
 def admin_dashboard(request: Request):
-    return templates.TemplateResponse("admin-dashboard.html", {"request": request})
+    return page_response(request, "admin-dashboard.html")
 
 @dashboard_router.get("/student-dashboard")
 def student_dashboard(request: Request):
-    return templates.TemplateResponse("student-dashboard.html", {"request": request})
+    return page_response(request, "student-dashboard.html")
 
 @dashboard_router.post("/redirect")
 def dashboard_redirect(current_user: User = Depends(get_current_user)):
     if current_user.is_admin:
         return RedirectResponse(url="/dashboard/admin-dashboard")
     else:
-        return RedirectResponse(url="/dashboard/student-dashboard")
\ No newline at end of file
+        return RedirectResponse(url="/dashboard/student-dashboard")
+
+@dashboard_router.get("/admin/overview", response_model=AdminOverview)
+async def admin_overview(
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: bool = Depends(is_admin_async)
+):
+    """Counts, hall occupancy and recent activity for the admin dashboard, in one call"""
+    return Response(
+        content=await get_admin_overview(db),
+        media_type="application/json",
+        headers={"Cache-Control": f"private, max-age={int(ADMIN_OVERVIEW_TTL)}"}
+    )
+
+@dashboard_router.get("/events")
+async def dashboard_events(request: Request, current_user: Principal = Depends(get_stream_user)):
+    """Server-Sent Events for complaint and allocation changes.
+
+    Admins get every event, students only their own. A `reset` event means
+    events may have been missed (the client fell behind or the server lost
+    its database listener): reload, then carry on with the reconnected stream.
+    """
+    subscription = event_broker.subscribe(current_user.id, current_user.is_admin)
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many event streams, please poll instead",
+            headers={"Retry-After": "30"}
+        )
+    return StreamingResponse(
+        event_stream(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
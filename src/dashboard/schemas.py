@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, UUID4
+
+
+class ComplaintCounts(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_category: Dict[str, int]
+
+
+class UserCounts(BaseModel):
+    total: int
+    admins: int
+    # Students per level; users without a level are not counted here
+    by_level: Dict[str, int]
+
+
+class HallOccupancy(BaseModel):
+    hall_id: UUID4
+    hall_name: str
+    is_open_for_allocation: bool
+    total_rooms: int
+    full_rooms: int
+    total_capacity: int
+    current_occupancy: int
+    available_spaces: int
+    active_allocations: int
+    pending_allocations: int
+
+
+class HallCounts(BaseModel):
+    total: int
+    open_for_allocation: int
+    total_capacity: int
+    current_occupancy: int
+    halls: List[HallOccupancy]
+
+
+class Activity(BaseModel):
+    kind: str  # "complaint", "allocation" or "signup"
+    at: datetime
+    summary: str
+
+
+class AdminOverview(BaseModel):
+    complaints: ComplaintCounts
+    users: UserCounts
+    halls: HallCounts
+    recent_activity: List[Activity]
+    generated_at: datetime
+    # Seconds the overview may be served from cache
+    max_age: Optional[float] = None
@@ -0,0 +1,129 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .schemas import AdminOverview
+from src.auth.models import User
+from src.chat.cache import table_versions
+from src.common.cache import TTLCache
+from src.complaints.models import Complaint, ComplaintUser
+from src.hostels.models import Hall, Room, RoomAllocation
+from src.hostels.service import AsyncRoomAllocationService
+
+# Every admin gets the same overview, recomputed once per TTL per worker,
+# or sooner when this worker commits a write to a table it counts
+ADMIN_OVERVIEW_TTL = float(os.environ.get("ADMIN_OVERVIEW_TTL", "5"))
+RECENT_ACTIVITY = 10
+# A write through this worker to any of these makes the next request recompute
+_OVERVIEW_TABLES = ("complaints", "complains_logs", "users", "halls", "rooms", "room_allocations")
+
+overview_cache = TTLCache(maxsize=1, ttl=ADMIN_OVERVIEW_TTL)
+_refresh_lock = asyncio.Lock()
+
+
+def _value(enum_or_str) -> str:
+    return getattr(enum_or_str, "value", enum_or_str) or "unknown"
+
+
+async def _complaint_counts(db: AsyncSession) -> dict:
+    rows = (await db.execute(
+        select(Complaint.status, Complaint.category, func.count())
+        .group_by(Complaint.status, Complaint.category)
+    )).all()
+    by_status, by_category = {}, {}
+    for status, category, count in rows:
+        by_status[_value(status)] = by_status.get(_value(status), 0) + count
+        by_category[_value(category)] = by_category.get(_value(category), 0) + count
+    return {"total": sum(by_status.values()), "by_status": by_status, "by_category": by_category}
+
+
+async def _user_counts(db: AsyncSession) -> dict:
+    rows = (await db.execute(
+        select(User.level, User.is_admin, func.count()).group_by(User.level, User.is_admin)
+    )).all()
+    by_level = {}
+    admins = 0
+    for level, admin, count in rows:
+        if admin:
+            admins += count
+        elif level is not None:
+            by_level[str(level)] = by_level.get(str(level), 0) + count
+    return {
+        "total": sum(count for _, _, count in rows),
+        "admins": admins,
+        "by_level": dict(sorted(by_level.items(), key=lambda item: int(item[0]))),
+    }
+
+
+async def _hall_counts(db: AsyncSession) -> dict:
+    summaries = await AsyncRoomAllocationService(db).get_hall_allocation_summaries()
+    return {
+        "total": len(summaries),
+        "open_for_allocation": sum(1 for s in summaries if s["is_open_for_allocation"]),
+        "total_capacity": sum(s["total_capacity"] for s in summaries),
+        "current_occupancy": sum(s["current_occupancy"] for s in summaries),
+        "halls": summaries,
+    }
+
+
+async def _recent_activity(db: AsyncSession) -> list:
+    """The newest complaints, allocations and signups, merged newest first"""
+    complaints = (await db.execute(
+        select(ComplaintUser.created_at, Complaint.title, User.name)
+        .join(Complaint, ComplaintUser.complaint_id == Complaint.id)
+        .join(User, ComplaintUser.created_by == User.id)
+        .order_by(ComplaintUser.created_at.desc())
+        .limit(RECENT_ACTIVITY)
+    )).all()
+    allocations = (await db.execute(
+        select(RoomAllocation.allocated_at, User.name, Room.room_number, Hall.name)
+        .join(User, RoomAllocation.user_id == User.id)
+        .join(Room, RoomAllocation.room_id == Room.id)
+        .join(Hall, RoomAllocation.hall_id == Hall.id)
+        .order_by(RoomAllocation.allocated_at.desc())
+        .limit(RECENT_ACTIVITY)
+    )).all()
+    signups = (await db.execute(
+        select(User.created_at, User.name)
+        .where(User.is_admin == False)
+        .order_by(User.created_at.desc())
+        .limit(RECENT_ACTIVITY)
+    )).all()
+
+    activity = (
+        [{"kind": "complaint", "at": at, "summary": f"{name} reported \"{title}\""} for at, title, name in complaints]
+        + [{"kind": "allocation", "at": at, "summary": f"{name} was allocated room {room} in {hall}"}
+           for at, name, room, hall in allocations]
+        + [{"kind": "signup", "at": at, "summary": f"{name} signed up"} for at, name in signups]
+    )
+    activity = [item for item in activity if item["at"] is not None]
+    activity.sort(key=lambda item: item["at"], reverse=True)
+    return activity[:RECENT_ACTIVITY]
+
+
+async def build_admin_overview(db: AsyncSession) -> bytes:
+    overview = AdminOverview(
+        complaints=await _complaint_counts(db),
+        users=await _user_counts(db),
+        halls=await _hall_counts(db),
+        recent_activity=await _recent_activity(db),
+        generated_at=datetime.now(timezone.utc),
+        max_age=ADMIN_OVERVIEW_TTL,
+    )
+    # Encoded once and shared by every admin until it expires
+    return overview.model_dump_json().encode()
+
+
+async def get_admin_overview(db: AsyncSession) -> bytes:
+    cached = overview_cache.get("overview")
+    if cached is None or cached[0] != table_versions.snapshot(_OVERVIEW_TABLES):
+        # One recompute per expiry, however many admins load the dashboard at once
+        async with _refresh_lock:
+            cached = overview_cache.get("overview")
+            versions = table_versions.snapshot(_OVERVIEW_TABLES)
+            if cached is None or cached[0] != versions:
+                cached = (versions, await build_admin_overview(db))
+                overview_cache.set("overview", cached)
+    return cached[1]
@@ -8,19 +8,22 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     Enum,
+    Float,
+    Index,
+    Text,
     func,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
-from src.common.enums import AllocationStatus
-from src.common.db import Base, engine
+from src.common.enums import AllocationStatus, TicketStatus
+from src.common.db import Base
 
 # Using the existing User model instead of creating a separate Student model
 class RoomAllocation(Base):
     __tablename__ = "room_allocations"
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     user_id = Column(ForeignKey("users.id", ondelete="CASCADE"), nullable=True, unique=True)
-    room_id = Column(ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
+    room_id = Column(ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False, index=True)
     hall_id = Column(ForeignKey("halls.id", ondelete="CASCADE"), nullable=False)
     status = Column(Enum(AllocationStatus), nullable=False, default=AllocationStatus.PENDING)
     allocated_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
@@ -63,5 +66,30 @@ class Hall(Base):
     
     rooms = relationship("Room", back_populates="hall", cascade="all, delete")
 
-# Create or update tables
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+# Queued allocation requests (ALLOCATION_QUEUE_MODE=postgres)
+class AllocationTicket(Base):
+    __tablename__ = "allocation_tickets"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    room_id = Column(ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
+    hall_id = Column(ForeignKey("halls.id", ondelete="CASCADE"), nullable=False)
+    academic_year = Column(String(20), nullable=False)
+    status = Column(Enum(TicketStatus), nullable=False, default=TicketStatus.QUEUED)
+    # Arrival time for FIFO, a random draw for lottery ordering
+    sort_key = Column(Float(), nullable=False)
+    allocation_id = Column(ForeignKey("room_allocations.id", ondelete="SET NULL"), nullable=True)
+    detail = Column(Text(), nullable=True)
+    # Placements that raised; NULL (as on rows from before it existed) means none
+    attempts = Column(Integer(), nullable=True, default=0)
+    created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_allocation_tickets_hall_id_status_sort_key", "hall_id", "status", "sort_key"),
+        # One open ticket per student
+        Index(
+            "uq_allocation_tickets_open_user_id", "user_id", unique=True,
+            postgresql_where=status.in_([TicketStatus.QUEUED, TicketStatus.PROCESSING]),
+            sqlite_where=status.in_([TicketStatus.QUEUED, TicketStatus.PROCESSING]),
+        ),
+    )
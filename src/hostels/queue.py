@@ -0,0 +1,411 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from src.common.cache import TTLCache
+from src.common.db import SessionLocal
+from src.common.enums import TicketStatus
+from .models import AllocationTicket
+from .service import RoomAllocationService
+
+logger = logging.getLogger(__name__)
+
+# "" (allocate synchronously), "memory" or "postgres"
+ALLOCATION_QUEUE_MODE = os.environ.get("ALLOCATION_QUEUE_MODE", "").lower()
+# "fifo" or "lottery"
+ALLOCATION_QUEUE_ORDER = os.environ.get("ALLOCATION_QUEUE_ORDER", "fifo").lower()
+ALLOCATION_QUEUE_BATCH = int(os.environ.get("ALLOCATION_QUEUE_BATCH", "200"))
+ALLOCATION_QUEUE_INTERVAL = float(os.environ.get("ALLOCATION_QUEUE_INTERVAL", "0.2"))
+# A ticket whose placement raises this many times is rejected instead of retried
+ALLOCATION_QUEUE_MAX_ATTEMPTS = int(os.environ.get("ALLOCATION_QUEUE_MAX_ATTEMPTS", "3"))
+FAILED_DETAIL = "Allocation failed, please try again"
+
+OPEN_STATUSES = (TicketStatus.QUEUED, TicketStatus.PROCESSING)
+
+
+class QueueMetrics:
+    """Enqueue/dedupe counters and allocator throughput"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.allocated = 0
+        self.rejected = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def record_enqueue(self, created: bool):
+        with self._lock:
+            if created:
+                self.enqueued += 1
+            else:
+                self.deduplicated += 1
+
+    def record_batch(self, allocated: int, rejected: int, seconds: float):
+        with self._lock:
+            self.batches += 1
+            self.allocated += allocated
+            self.rejected += rejected
+            self.busy_seconds += seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            processed = self.allocated + self.rejected
+            return {
+                "enqueued": self.enqueued,
+                "deduplicated": self.deduplicated,
+                "allocated": self.allocated,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "avg_batch_size": round(processed / self.batches, 2) if self.batches else 0.0,
+                "tickets_per_second": round(processed / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            }
+
+
+class AllocationQueue(ABC):
+    """Accepts allocation requests as tickets; the worker places them in per-hall batches.
+
+    Tickets are plain dicts shaped like AllocationTicketResponse. A student has
+    at most one open ticket: enqueueing again returns the open one.
+    """
+
+    def __init__(self, order: str = "fifo", batch_size: int = 200):
+        self.order = order
+        self.batch_size = batch_size
+        self.metrics = QueueMetrics()
+
+    def _sort_key(self) -> float:
+        return random.random() if self.order == "lottery" else time.time()
+
+    @abstractmethod
+    def enqueue(self, user_id: UUID, room_id: int, hall_id: UUID, academic_year: str) -> Tuple[dict, bool]:
+        """(new ticket, True), or (the student's open ticket, False)"""
+
+    @abstractmethod
+    def get(self, ticket_id: UUID) -> Optional[dict]:
+        """The ticket, or None if it is unknown"""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Tickets waiting to be placed"""
+
+    @abstractmethod
+    def process_next_batch(self) -> int:
+        """Place the next batch for one hall; returns the number of tickets processed"""
+
+    def _place(self, db, hall_id, tickets) -> list:
+        """(allocation, error) per ticket; does not commit"""
+        return RoomAllocationService(db).place_allocation_requests(
+            hall_id, [(t["user_id"], t["room_id"], t["academic_year"]) for t in tickets]
+        )
+
+    def _failure(self, ticket: dict, error: Exception) -> Optional[tuple]:
+        """Count a placement that raised: (None, detail) once the ticket has used
+        its attempts, None while it should be queued again"""
+        ticket["attempts"] = (ticket.get("attempts") or 0) + 1
+        logger.warning("Allocation ticket %s failed (attempt %s of %s): %s",
+                       ticket["id"], ticket["attempts"], ALLOCATION_QUEUE_MAX_ATTEMPTS, error)
+        if ticket["attempts"] >= ALLOCATION_QUEUE_MAX_ATTEMPTS:
+            return None, FAILED_DETAIL
+        return None
+
+    @staticmethod
+    def _counts(outcomes) -> Tuple[int, int]:
+        """(allocated, rejected) among the settled outcomes"""
+        settled = [outcome for outcome in outcomes if outcome is not None]
+        allocated = sum(1 for allocation, _ in settled if allocation)
+        return allocated, len(settled) - allocated
+
+    def stats(self) -> dict:
+        return {
+            "mode": ALLOCATION_QUEUE_MODE,
+            "order": self.order,
+            "batch_size": self.batch_size,
+            "depth": self.depth(),
+            **self.metrics.as_dict(),
+        }
+
+
+class MemoryAllocationQueue(AllocationQueue):
+    """Per-process queue; tickets are lost on restart"""
+
+    def __init__(self, order: str = "fifo", batch_size: int = 200):
+        super().__init__(order, batch_size)
+        self._lock = threading.Lock()
+        self._open = {}
+        self._open_by_user = {}
+        # hall id -> heap of (sort key, arrival, ticket id)
+        self._pending = {}
+        self._arrivals = itertools.count()
+        self._finished = TTLCache(maxsize=100000, ttl=3600)
+
+    def enqueue(self, user_id, room_id, hall_id, academic_year):
+        with self._lock:
+            open_id = self._open_by_user.get(user_id)
+            if open_id is not None:
+                self.metrics.record_enqueue(False)
+                return dict(self._open[open_id]), False
+            ticket = {
+                "id": uuid4(),
+                "user_id": user_id,
+                "room_id": room_id,
+                "hall_id": hall_id,
+                "academic_year": academic_year,
+                "status": TicketStatus.QUEUED,
+                "allocation_id": None,
+                "detail": None,
+                "attempts": 0,
+                "sort_key": self._sort_key(),
+                "created_at": datetime.now(),
+                "processed_at": None,
+            }
+            self._open[ticket["id"]] = ticket
+            self._open_by_user[user_id] = ticket["id"]
+            heapq.heappush(
+                self._pending.setdefault(hall_id, []),
+                (ticket["sort_key"], next(self._arrivals), ticket["id"])
+            )
+            self.metrics.record_enqueue(True)
+            return dict(ticket), True
+
+    def get(self, ticket_id):
+        with self._lock:
+            ticket = self._open.get(ticket_id)
+            if ticket is not None:
+                return dict(ticket)
+        return self._finished.get(ticket_id)
+
+    def depth(self) -> int:
+        with self._lock:
+            return sum(len(heap) for heap in self._pending.values())
+
+    def _claim(self):
+        with self._lock:
+            heads = [(heap[0], hall_id) for hall_id, heap in self._pending.items() if heap]
+            if not heads:
+                return None, []
+            # The hall holding the oldest (or luckiest) ticket goes next
+            _, hall_id = min(heads)
+            heap = self._pending[hall_id]
+            tickets = []
+            while heap and len(tickets) < self.batch_size:
+                _, _, ticket_id = heapq.heappop(heap)
+                ticket = self._open[ticket_id]
+                ticket["status"] = TicketStatus.PROCESSING
+                tickets.append(ticket)
+            return hall_id, tickets
+
+    def _finish(self, tickets, outcomes):
+        with self._lock:
+            for ticket, outcome in zip(tickets, outcomes):
+                if outcome is None:
+                    # Placement raised; back to the head of its hall's queue
+                    ticket["status"] = TicketStatus.QUEUED
+                    heapq.heappush(
+                        self._pending.setdefault(ticket["hall_id"], []),
+                        (ticket["sort_key"], next(self._arrivals), ticket["id"])
+                    )
+                    continue
+                allocation, error = outcome
+                ticket["status"] = TicketStatus.ALLOCATED if allocation else TicketStatus.REJECTED
+                ticket["allocation_id"] = allocation["id"] if allocation else None
+                ticket["detail"] = error
+                ticket["processed_at"] = datetime.now()
+                del self._open[ticket["id"]]
+                del self._open_by_user[ticket["user_id"]]
+                self._finished.set(ticket["id"], dict(ticket))
+
+    def process_next_batch(self) -> int:
+        hall_id, tickets = self._claim()
+        if not tickets:
+            return 0
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            try:
+                outcomes = self._place(db, hall_id, tickets)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # One bad ticket must not hold up the rest: place them one at a time
+                logger.exception("Allocation batch for hall %s failed; placing its tickets one by one", hall_id)
+                outcomes = []
+                for ticket in tickets:
+                    try:
+                        outcomes.extend(self._place(db, hall_id, [ticket]))
+                        db.commit()
+                    except Exception as e:
+                        db.rollback()
+                        outcomes.append(self._failure(ticket, e))
+        self._finish(tickets, outcomes)
+        self.metrics.record_batch(*self._counts(outcomes), time.perf_counter() - started)
+        return len(tickets)
+
+
+def _ticket_dict(ticket: AllocationTicket) -> dict:
+    return {
+        "id": ticket.id,
+        "user_id": ticket.user_id,
+        "room_id": ticket.room_id,
+        "hall_id": ticket.hall_id,
+        "academic_year": ticket.academic_year,
+        "status": ticket.status,
+        "allocation_id": ticket.allocation_id,
+        "detail": ticket.detail,
+        "attempts": ticket.attempts,
+        "created_at": ticket.created_at,
+        "processed_at": ticket.processed_at,
+    }
+
+
+class PostgresAllocationQueue(AllocationQueue):
+    """Queue kept in the allocation_tickets table; survives restarts and is shared
+    by every app process. Batches are claimed with FOR UPDATE SKIP LOCKED, so
+    workers in several processes never take the same tickets.
+    """
+
+    def enqueue(self, user_id, room_id, hall_id, academic_year):
+        with SessionLocal() as db:
+            ticket = AllocationTicket(
+                user_id=user_id,
+                room_id=room_id,
+                hall_id=hall_id,
+                academic_year=academic_year,
+                status=TicketStatus.QUEUED,
+                sort_key=self._sort_key(),
+            )
+            db.add(ticket)
+            try:
+                db.commit()
+            except IntegrityError:
+                # uq_allocation_tickets_open_user_id: the student already has an open ticket
+                db.rollback()
+                existing = db.query(AllocationTicket).filter(
+                    AllocationTicket.user_id == user_id,
+                    AllocationTicket.status.in_(OPEN_STATUSES)
+                ).first()
+                if existing is None:
+                    raise ValueError("Could not queue the allocation request")
+                self.metrics.record_enqueue(False)
+                return _ticket_dict(existing), False
+            self.metrics.record_enqueue(True)
+            return _ticket_dict(ticket), True
+
+    def get(self, ticket_id):
+        with SessionLocal() as db:
+            ticket = db.get(AllocationTicket, ticket_id)
+            return _ticket_dict(ticket) if ticket else None
+
+    def depth(self) -> int:
+        with SessionLocal() as db:
+            return db.query(AllocationTicket).filter(AllocationTicket.status == TicketStatus.QUEUED).count()
+
+    def process_next_batch(self) -> int:
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            hall_id = db.execute(
+                select(AllocationTicket.hall_id)
+                .where(AllocationTicket.status == TicketStatus.QUEUED)
+                .order_by(AllocationTicket.sort_key)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).scalar()
+            if hall_id is None:
+                return 0
+            tickets = db.execute(
+                select(AllocationTicket)
+                .where(
+                    AllocationTicket.hall_id == hall_id,
+                    AllocationTicket.status == TicketStatus.QUEUED
+                )
+                .order_by(AllocationTicket.sort_key)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            pending = [_ticket_dict(t) for t in tickets]
+            try:
+                with db.begin_nested():
+                    outcomes = self._place(db, hall_id, pending)
+            except Exception:
+                # One bad ticket must not hold up its hall: place them one at a
+                # time, each in its own savepoint, with the tickets still locked
+                logger.exception("Allocation batch for hall %s failed; placing its tickets one by one", hall_id)
+                outcomes = []
+                for ticket in pending:
+                    try:
+                        with db.begin_nested():
+                            outcomes.extend(self._place(db, hall_id, [ticket]))
+                    except Exception as e:
+                        outcomes.append(self._failure(ticket, e))
+            processed_at = datetime.now()
+            for ticket, values, outcome in zip(tickets, pending, outcomes):
+                if outcome is None:
+                    # Stays queued for the next batch
+                    ticket.attempts = values["attempts"]
+                    continue
+                allocation, error = outcome
+                ticket.status = TicketStatus.ALLOCATED if allocation else TicketStatus.REJECTED
+                ticket.allocation_id = allocation["id"] if allocation else None
+                ticket.detail = error
+                ticket.attempts = values["attempts"]
+                ticket.processed_at = processed_at
+            db.commit()
+        self.metrics.record_batch(*self._counts(outcomes), time.perf_counter() - started)
+        return len(tickets)
+
+
+class AllocationWorker:
+    """The single allocator loop; runs on the app's event loop, places batches in a thread"""
+
+    def __init__(self, queue: AllocationQueue, interval: float):
+        self.queue = queue
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await asyncio.to_thread(self.queue.process_next_batch)
+            except Exception:
+                logger.exception("Allocation worker failed to process a batch")
+                processed = 0
+            if not processed:
+                await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _build_queue() -> Optional[AllocationQueue]:
+    if ALLOCATION_QUEUE_MODE == "memory":
+        return MemoryAllocationQueue(ALLOCATION_QUEUE_ORDER, ALLOCATION_QUEUE_BATCH)
+    if ALLOCATION_QUEUE_MODE == "postgres":
+        return PostgresAllocationQueue(ALLOCATION_QUEUE_ORDER, ALLOCATION_QUEUE_BATCH)
+    return None
+
+
+# None when allocation runs synchronously (ALLOCATION_QUEUE_MODE unset)
+allocation_queue = _build_queue()
+allocation_worker = AllocationWorker(allocation_queue, ALLOCATION_QUEUE_INTERVAL) if allocation_queue else None
@@ -1,16 +1,27 @@
-from sqlalchemy.orm import Session
+import time
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Query,
+    Request,
+    Response,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
 from uuid import UUID
-from .models import Hall, Room
+from .models import Hall, Room, RoomAllocation
 from .schemas import (
+    AllocationTicketResponse,
     HallOccupancyStats,
     BulkAllocationCreate,
+    HallRoomAllocationCreate,
     BulkRoomCreate,
     RoomAllocationCreate,
     RoomAllocationResponse,
@@ -22,10 +33,13 @@ from .schemas import (
     RoomResponse,
     HallAllocationSummary
 )
-from .service import RoomAllocationService
+from .service import AsyncRoomAllocationService
+from .queue import ALLOCATION_QUEUE_INTERVAL, OPEN_STATUSES, allocation_queue
 from src.common.enums import AllocationStatus
-from src.common.db import get_db
-from src.common.security import is_admin
+from src.common.db import get_async_db, get_async_read_db
+from src.common.security import is_admin_async
+from src.common.export import ExportFormat, export_response
+from src.common.conditional import Validator, change_stamp
 
 hall_router = APIRouter(
     prefix="/halls",
@@ -42,22 +56,28 @@ allocation_router = APIRouter(
 
 # Hall CRUD routes
 @hall_router.get("/", response_model=List[HallResponse])
-def get_all_halls(db: Session = Depends(get_db)):
+async def get_all_halls(request: Request, response: Response,
+                        db: AsyncSession = Depends(get_async_read_db)):
     """Get all halls"""
-    service = RoomAllocationService(db)
-    return service.get_all_halls()
+    # Revalidations are answered from one aggregate, without loading any hall
+    validator = Validator("halls", (await db.execute(change_stamp(Hall))).one())
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
+    service = AsyncRoomAllocationService(db)
+    return await service.get_all_halls()
 
 @hall_router.post("/", response_model=HallResponse, status_code=status.HTTP_201_CREATED)
-def create_hall(
+async def create_hall(
     hall: HallCreate,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Create a new hall"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        return service.create_hall(
+        return await service.create_hall(
             name=hall.name,
             no_of_rooms=hall.no_of_rooms,
             min_level=hall.min_level,
@@ -68,73 +88,85 @@ def create_hall(
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+@hall_router.get("/summary", response_model=List[HallAllocationSummary])
+async def get_all_hall_summaries(db: AsyncSession = Depends(get_async_read_db)):
+    """Get allocation summary statistics for every hall"""
+    service = AsyncRoomAllocationService(db)
+    return await service.get_hall_allocation_summaries()
+
 @hall_router.get("/{hall_id}", response_model=HallResponse)
-def get_hall_by_id(
+async def get_hall_by_id(
     hall_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get hall details by ID"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        return service.get_hall(hall_id)
+        return await service.get_hall(hall_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 @hall_router.put("/{hall_id}", response_model=HallResponse)
-def update_hall_details(
+async def update_hall_details(
     hall_id: str,
     hall: HallUpdate,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Update hall details"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
         update_data = hall.dict(exclude_unset=True)
-        return service.update_hall(hall_id=hall_id, **update_data)
+        return await service.update_hall(hall_id=hall_id, **update_data)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @hall_router.delete("/{hall_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_hall(
+async def delete_hall(
     hall_id: str,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Delete a hall"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        service.delete_hall(hall_id)
+        await service.delete_hall(hall_id)
         return {"message": "Hall deleted successfully"}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @hall_router.get("/{hall_id}/rooms", response_model=List[RoomResponse])
-def get_rooms_by_hall(
+async def get_rooms_by_hall(
     hall_id: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all rooms in a hall"""
-    service = RoomAllocationService(db)
+    validator = Validator(f"halls/{hall_id}/rooms", (await db.execute(change_stamp(Room, Room.hall_id == hall_id))).one())
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
+    service = AsyncRoomAllocationService(db)
     try:
-        return service.get_rooms_by_hall(hall_id)
+        return await service.get_rooms_by_hall(hall_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 # Room CRUD routes
 @room_router.post("/", response_model=RoomResponse, status_code=status.HTTP_201_CREATED)
-def create_room(
+async def create_room(
     room: RoomCreate,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Create a new room in a hall"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        return service.create_room(
+        return await service.create_room(
             hall_id=str(room.hall_id),
             room_number=room.room_number,
             capacity=room.capacity
@@ -143,58 +175,89 @@ def create_room(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @room_router.get("/{room_id}", response_model=RoomResponse)
-def get_room_by_id(
+async def get_room_by_id(
     room_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get room details by ID"""
-    service = RoomAllocationService(db)
+    validator = Validator(f"rooms/{room_id}", (await db.execute(change_stamp(Room, Room.id == room_id))).one())
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
+    service = AsyncRoomAllocationService(db)
     try:
-        return service.get_room(room_id)
+        return await service.get_room(room_id)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 @room_router.put("/{room_id}", response_model=RoomResponse)
-def update_room_details(
+async def update_room_details(
     room_id: int,
     room: RoomUpdate,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Update room details"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
         update_data = room.dict(exclude_unset=True)
-        return service.update_room(room_id=room_id, **update_data)
+        return await service.update_room(room_id=room_id, **update_data)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @room_router.delete("/{room_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_room(
+async def delete_room(
     room_id: int,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Delete a room"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        service.delete_room(room_id)
+        await service.delete_room(room_id)
         return {"message": "Room deleted successfully"}
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 # Room allocation routes (updating/fixing the existing ones)
-@allocation_router.post("/", response_model=RoomAllocationResponse, status_code=status.HTTP_201_CREATED)
-def create_allocation(
+@allocation_router.post(
+    "/",
+    response_model=RoomAllocationResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": AllocationTicketResponse}}
+)
+async def create_allocation(
     allocation: RoomAllocationCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Allocate a user to a room"""
-    service = RoomAllocationService(db)
+    """Allocate a user to a room.
+    
+    In queue mode (ALLOCATION_QUEUE_MODE) the request is accepted with 202 and a
+    ticket; poll GET /allocate/tickets/{ticket_id} for the result.
+    """
+    if allocation_queue is not None:
+        hall_id = (await db.execute(select(Room.hall_id).where(Room.id == allocation.room_id))).scalar()
+        if hall_id is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Room with ID {allocation.room_id} not found")
+        try:
+            ticket, _ = await run_in_threadpool(
+                allocation_queue.enqueue, allocation.user_id, allocation.room_id, hall_id, allocation.academic_year
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(AllocationTicketResponse(**ticket)),
+            headers={"Location": f"/allocate/tickets/{ticket['id']}"}
+        )
+    
+    service = AsyncRoomAllocationService(db)
     try:
-        result = service.allocate_room(
+        result = await service.allocate_room(
             user_id=(allocation.user_id),
             room_id=allocation.room_id,
             academic_year=allocation.academic_year
@@ -203,19 +266,53 @@ def create_allocation(
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+@allocation_router.get("/tickets/{ticket_id}", response_model=AllocationTicketResponse)
+async def get_allocation_ticket(
+    ticket_id: UUID,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the ticket to be processed")
+):
+    """Get the state of a queued allocation request"""
+    if allocation_queue is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Allocation queue is not enabled")
+    
+    deadline = time.monotonic() + wait
+    while True:
+        ticket = await run_in_threadpool(allocation_queue.get, ticket_id)
+        if not ticket:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+        if ticket["status"] not in OPEN_STATUSES or time.monotonic() >= deadline:
+            return ticket
+        await asyncio.sleep(ALLOCATION_QUEUE_INTERVAL)
+
+@allocation_router.post("/hall", response_model=RoomAllocationResponse, status_code=status.HTTP_201_CREATED)
+async def create_allocation_in_hall(
+    allocation: HallRoomAllocationCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Allocate a user to the next free room in a hall"""
+    service = AsyncRoomAllocationService(db)
+    try:
+        return await service.allocate_room_in_hall(
+            user_id=allocation.user_id,
+            hall_id=allocation.hall_id,
+            academic_year=allocation.academic_year
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @allocation_router.post("/bulk", response_model=List[RoomAllocationResponse], status_code=status.HTTP_201_CREATED)
-def bulk_allocate(
+async def bulk_allocate(
     bulk_allocation: BulkAllocationCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Bulk allocate users to rooms in a hall"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
         # Convert UUID4 objects to strings
         user_ids = [str(id) for id in bulk_allocation.user_ids]
         hall_id = str(bulk_allocation.hall_id)
         
-        allocations = service.bulk_allocate_rooms(
+        allocations = await service.bulk_allocate_rooms(
             user_ids=user_ids,
             hall_id=hall_id,
             academic_year=bulk_allocation.academic_year
@@ -225,26 +322,26 @@ def bulk_allocate(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @allocation_router.put("/{allocation_id}/vacate", response_model=RoomAllocationResponse)
-def vacate_room(
+async def vacate_room(
     allocation_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark a room as vacated"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        result = service.vacate_room(allocation_id)
+        result = await service.vacate_room(allocation_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @allocation_router.get("/user/{user_id}", response_model=RoomAllocationResponse)
-def get_user_allocation(
+async def get_user_allocation(
     user_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get a user's current allocation"""
-    service = RoomAllocationService(db)
-    allocation = service.get_user_allocation(user_id)
+    service = AsyncRoomAllocationService(db)
+    allocation = await service.get_user_allocation(user_id)
     if not allocation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -253,42 +350,42 @@ def get_user_allocation(
     return allocation
 
 @allocation_router.get("/halls/{hall_id}/stats", response_model=HallOccupancyStats)
-def get_hall_occupancy_stats(
+async def get_hall_occupancy_stats(
     hall_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get occupancy statistics for a hall"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        stats = service.get_hall_occupancy_stats(hall_id)
+        stats = await service.get_hall_occupancy_stats(hall_id)
         return stats
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @allocation_router.get("/available-rooms/{hall_id}", response_model=List[RoomResponse])
-def get_available_rooms(
+async def get_available_rooms(
     hall_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get rooms in a hall that have space available"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        rooms = service.get_available_rooms(hall_id)
+        rooms = await service.get_available_rooms(hall_id)
         return rooms
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @allocation_router.get("/allocations", response_model=List[RoomAllocationResponse])
-def get_all_allocations(
+async def get_all_allocations(
     status: Optional[AllocationStatus] = None,
     hall_id: Optional[str] = None,
     academic_year: Optional[str] = None,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Get all room allocations with optional filters"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
         filters = {}
         if status:
@@ -298,63 +395,81 @@ def get_all_allocations(
         if academic_year:
             filters["academic_year"] = academic_year
             
-        allocations = service.get_all_allocations(**filters)
+        allocations = await service.get_all_allocations(**filters)
         return allocations
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+@allocation_router.get("/allocations/export")
+async def export_allocations(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    status: Optional[AllocationStatus] = None,
+    hall_id: Optional[UUID] = None,
+    academic_year: Optional[str] = None,
+    admin: bool = Depends(is_admin_async)
+):
+    """Stream room allocations as NDJSON or CSV in constant memory"""
+    query = select(*RoomAllocation.__table__.columns)
+    if status:
+        query = query.where(RoomAllocation.status == status)
+    if hall_id:
+        query = query.where(RoomAllocation.hall_id == hall_id)
+    if academic_year:
+        query = query.where(RoomAllocation.academic_year == academic_year)
+    return export_response(query, export_format, "allocations")
+
 @allocation_router.get("/{allocation_id}", response_model=RoomAllocationResponse)
-def get_allocation_by_id(
+async def get_allocation_by_id(
     allocation_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get allocation details by ID"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        allocation = service.get_allocation_by_id(allocation_id)
+        allocation = await service.get_allocation_by_id(allocation_id)
         return allocation
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 @hall_router.put("/{hall_id}/allocation-status", response_model=HallResponse)
-def set_hall_allocation_status(
+async def set_hall_allocation_status(
     hall_id: str,
     is_open: bool,
     academic_year: Optional[str] = None,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Open or close a hall for allocation"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        hall = service.set_hall_allocation_status(hall_id, is_open, academic_year)
+        hall = await service.set_hall_allocation_status(hall_id, is_open, academic_year)
         return hall
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @hall_router.get("/{hall_id}/summary", response_model=HallAllocationSummary)
-def get_hall_allocation_summary(
+async def get_hall_allocation_summary(
     hall_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get allocation summary statistics for a hall"""
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
-        summary = service.get_hall_allocation_summary(hall_id)
+        summary = await service.get_hall_allocation_summary(hall_id)
         return summary
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     
 @room_router.post("/bulk", response_model=List[RoomResponse], status_code=status.HTTP_201_CREATED)
-def create_rooms_bulk(
+async def create_rooms_bulk(
     bulk_rooms: BulkRoomCreate,
-    db: Session = Depends(get_db),
-    admin: bool = Depends(is_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: bool = Depends(is_admin_async)
 ):
     """Create multiple rooms in a hall at once"""
     
-    service = RoomAllocationService(db)
+    service = AsyncRoomAllocationService(db)
     try:
         # Extract hall_id as string
         hall_id = str(bulk_rooms.hall_id)
@@ -374,6 +489,6 @@ def create_rooms_bulk(
                 "capacity": room.capacity
             })
         
-        return service.create_rooms_bulk(hall_id=hall_id, rooms_data=rooms_data)
+        return await service.create_rooms_bulk(hall_id=hall_id, rooms_data=rooms_data)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -6,7 +6,7 @@ from pydantic import (
     validator,
     Field
 )
-from src.common.enums import AllocationStatus
+from src.common.enums import AllocationStatus, TicketStatus
 
 class RoomAllocationCreate(BaseModel):
     user_id: UUID4
@@ -20,6 +20,17 @@ class RoomAllocationCreate(BaseModel):
             raise ValueError('Academic year must be in format YYYY-YYYY')
         return v
     
+class HallRoomAllocationCreate(BaseModel):
+    user_id: UUID4
+    hall_id: UUID4
+    academic_year: str
+    
+    @validator('academic_year')
+    def validate_academic_year(cls, v):
+        if not v or not '-' in v:
+            raise ValueError('Academic year must be in format YYYY-YYYY')
+        return v
+
 class BulkAllocationCreate(BaseModel):
     user_ids: List[UUID4]
     hall_id: UUID4
@@ -45,6 +56,18 @@ class RoomAllocationResponse(BaseModel):
     class Config:
         orm_mode = True
         
+class AllocationTicketResponse(BaseModel):
+    id: UUID4
+    user_id: UUID4
+    room_id: int
+    hall_id: UUID4
+    academic_year: str
+    status: TicketStatus
+    allocation_id: Optional[UUID4] = None
+    detail: Optional[str] = None
+    created_at: datetime
+    processed_at: Optional[datetime] = None
+
 class HallOccupancyStats(BaseModel):
     hall_name: str
     total_capacity: int
@@ -53,6 +76,7 @@ class HallOccupancyStats(BaseModel):
     available_spaces: int
     
 class HallAllocationSummary(BaseModel):
+    hall_id: Optional[UUID4] = None
     hall_name: str
     academic_year: Optional[str]
     is_open_for_allocation: bool
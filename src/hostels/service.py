@@ -1,12 +1,17 @@
+import bisect
 from datetime import datetime
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
 
 from .models import Hall, Room, RoomAllocation
+from src.auth.models import User
 from .schemas import HallOccupancyStats, RoomAllocationResponse
 from src.common.enums import AllocationStatus
+from src.common.events import publish
 
 
 class RoomAllocationService:
@@ -24,46 +29,128 @@ class RoomAllocationService:
         if existing_allocation:
             raise ValueError(f"User already has an active room allocation")
         
-        # Get the room to check availability
-        room = self.db.query(Room).filter(Room.id == room_id).first()
-        if not room:
-            raise ValueError(f"Room with ID {room_id} not found")
-            
-        if room.current_occupancy >= room.capacity:
-            raise ValueError(f"Room {room.room_number} is already at full capacity")
-            
-        if not room.is_available:
-            raise ValueError(f"Room {room.room_number} is not available for allocation")
+        # Claim a bed in one conditional UPDATE. The capacity check runs inside
+        # the statement under the row lock, so concurrent requests for the same
+        # room can never push it past capacity or lose an increment.
+        claimed = self.db.execute(
+            update(Room)
+            .where(
+                Room.id == room_id,
+                Room.is_available == True,
+                Room.current_occupancy < Room.capacity,
+                Room.hall_id.in_(select(Hall.id).where(Hall.is_open_for_allocation == True))
+            )
+            .values(
+                current_occupancy=Room.current_occupancy + 1,
+                is_available=Room.current_occupancy + 1 < Room.capacity
+            )
+            .returning(Room.hall_id)
+            .execution_options(synchronize_session=False)
+        ).first()
+        
+        if claimed is None:
+            self.db.rollback()
+            self._raise_room_unavailable(room_id)
+        
+        return self._record_allocation(user_id, room_id, claimed.hall_id, academic_year)
+
+    def allocate_room_in_hall(self, user_id: UUID, hall_id: str, academic_year: str) -> RoomAllocationResponse:
+        """Allocate a user to any free room in a hall, fullest rooms first"""
+        existing_allocation = self.db.query(RoomAllocation).filter(
+            RoomAllocation.user_id == user_id,
+            RoomAllocation.status == AllocationStatus.ALLOCATED
+        ).first()
+        
+        if existing_allocation:
+            raise ValueError(f"User already has an active room allocation")
+        
+        hall = self.db.query(Hall).filter(Hall.id == hall_id).first()
+        if not hall:
+            raise ValueError(f"Hall with ID {hall_id} not found")
         
-        # Get the hall
-        hall = self.db.query(Hall).filter(Hall.id == room.hall_id).first()
         if not hall.is_open_for_allocation:
             raise ValueError(f"Hall {hall.name} is not open for allocation")
-            
-        # Create the allocation
+        
+        # SKIP LOCKED: a room another request is filling right now is passed
+        # over instead of waited on, so parallel requests spread across rooms
+        room_id = self.db.execute(
+            select(Room.id)
+            .where(
+                Room.hall_id == hall_id,
+                Room.is_available == True,
+                Room.current_occupancy < Room.capacity
+            )
+            .order_by(Room.current_occupancy.desc(), Room.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        
+        if room_id is None:
+            self.db.rollback()
+            raise ValueError(f"No available rooms in hall {hall.name}")
+        
+        # The row is locked by this transaction, so the increment cannot be lost
+        self.db.execute(
+            update(Room)
+            .where(Room.id == room_id)
+            .values(
+                current_occupancy=Room.current_occupancy + 1,
+                is_available=Room.current_occupancy + 1 < Room.capacity
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        return self._record_allocation(user_id, room_id, hall.id, academic_year)
+
+    def _record_allocation(self, user_id: UUID, room_id: int, hall_id, academic_year: str) -> RoomAllocation:
+        """Insert the allocation and adjust the hall counter in the claiming transaction"""
+        self._adjust_hall_capacity(hall_id, -1)
+        
         allocation = RoomAllocation(
             user_id=user_id,
             room_id=room_id,
-            hall_id=hall.id,
+            hall_id=hall_id,
             status=AllocationStatus.ALLOCATED,
             academic_year=academic_year
         )
-        
-        # Update room occupancy
-        room.current_occupancy += 1
-        if room.current_occupancy >= room.capacity:
-            room.is_available = False
-            
-        # Update hall available capacity
-        if hall.total_available_capacity is not None:
-            hall.total_available_capacity -= 1
-        
         self.db.add(allocation)
-        self.db.commit()
+        try:
+            self.db.flush()
+            publish(self.db, "allocation.created",
+                    {"id": allocation.id, "room_id": room_id, "hall_id": hall_id}, users=[user_id])
+            self.db.commit()
+        except IntegrityError:
+            # room_allocations.user_id is unique; a concurrent request won the race
+            self.db.rollback()
+            raise ValueError(f"User already has a room allocation")
         self.db.refresh(allocation)
         
         return allocation
 
+    def _adjust_hall_capacity(self, hall_id, delta: int):
+        """Relative update, so concurrent allocations never overwrite each other's change"""
+        self.db.execute(
+            update(Hall)
+            .where(Hall.id == hall_id, Hall.total_available_capacity.isnot(None))
+            .values(total_available_capacity=Hall.total_available_capacity + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _raise_room_unavailable(self, room_id: int):
+        """Explain why a conditional room claim matched no row"""
+        room = self.db.query(Room).filter(Room.id == room_id).first()
+        if not room:
+            raise ValueError(f"Room with ID {room_id} not found")
+            
+        if room.current_occupancy >= room.capacity:
+            raise ValueError(f"Room {room.room_number} is already at full capacity")
+            
+        if not room.is_available:
+            raise ValueError(f"Room {room.room_number} is not available for allocation")
+        
+        hall = self.db.query(Hall).filter(Hall.id == room.hall_id).first()
+        raise ValueError(f"Hall {hall.name} is not open for allocation")
+
     def bulk_allocate_rooms(self, user_ids: List[UUID], hall_id: str, academic_year: str) -> List[RoomAllocationResponse]:
         """Bulk allocate users to rooms in a hall"""
         # Check hall exists and is open for allocation
@@ -74,11 +161,18 @@ class RoomAllocationService:
         if not hall.is_open_for_allocation:
             raise ValueError(f"Hall {hall.name} is not open for allocation")
         
-        # Get available rooms in the hall
-        available_rooms = self.db.query(Room).filter(
-            Room.hall_id == hall_id,
-            Room.is_available == True,
-            Room.current_occupancy < Room.capacity
+        user_ids = list(dict.fromkeys(user_ids))
+        
+        # Lock the hall's free rooms so single allocations wait until this batch commits
+        available_rooms = self.db.execute(
+            select(Room.id, Room.capacity, Room.current_occupancy)
+            .where(
+                Room.hall_id == hall_id,
+                Room.is_available == True,
+                Room.current_occupancy < Room.capacity
+            )
+            .order_by(Room.id)
+            .with_for_update()
         ).all()
         
         if not available_rooms:
@@ -90,8 +184,28 @@ class RoomAllocationService:
         if len(user_ids) > total_available_spaces:
             raise ValueError(f"Not enough space for all users. Available: {total_available_spaces}, Requested: {len(user_ids)}")
         
+        # Level eligibility
+        students = self.db.execute(
+            select(User.id, User.level, User.department).where(User.id.in_(user_ids))
+        ).all()
+        
+        if len(students) != len(user_ids):
+            found = {str(student.id) for student in students}
+            missing = [str(user_id) for user_id in user_ids if str(user_id) not in found]
+            raise ValueError(f"Users not found: {', '.join(missing)}")
+        
+        ineligible = [
+            str(student.id) for student in students
+            if student.level is None or not hall.min_level <= student.level <= hall.max_level
+        ]
+        if ineligible:
+            raise ValueError(
+                f"Some users are not eligible for hall {hall.name} "
+                f"(levels {hall.min_level}-{hall.max_level}): {', '.join(ineligible)}"
+            )
+        
         # Check if any users already have active allocations
-        existing_allocations = self.db.query(RoomAllocation).filter(
+        existing_allocations = self.db.query(RoomAllocation.user_id).filter(
             RoomAllocation.user_id.in_(user_ids),
             RoomAllocation.status == AllocationStatus.ALLOCATED
         ).all()
@@ -100,69 +214,184 @@ class RoomAllocationService:
             user_ids_with_allocations = [str(alloc.user_id) for alloc in existing_allocations]
             raise ValueError(f"Some users already have active allocations: {', '.join(user_ids_with_allocations)}")
         
-        allocations = []
-        room_index = 0
+        placements = self._pack_students(students, available_rooms)
         
-        for user_id in user_ids:
-            current_room = available_rooms[room_index]
-            
-            # Create allocation
-            allocation = RoomAllocation(
-                user_id=user_id,
-                room_id=current_room.id,
-                hall_id=hall_id,
-                status=AllocationStatus.ALLOCATED,
-                academic_year=academic_year
+        try:
+            allocations = self._write_allocations(
+                hall.id, [(user_id, room_id, academic_year) for user_id, room_id in placements]
             )
+            publish(self.db, "allocation.bulk_created", {"hall_id": hall.id, "count": len(allocations)},
+                    users=[allocation["user_id"] for allocation in allocations])
+            self.db.commit()
+        except IntegrityError:
+            # room_allocations.user_id is unique, vacated allocations included
+            self.db.rollback()
+            raise ValueError(f"Some users already have a room allocation")
             
-            # Update room occupancy
-            current_room.current_occupancy += 1
-            if current_room.current_occupancy >= current_room.capacity:
-                current_room.is_available = False
-                room_index += 1
-            
-            # Update hall available capacity
-            if hall.total_available_capacity is not None:
-                hall.total_available_capacity -= 1
-                
-            allocations.append(allocation)
-            self.db.add(allocation)
+        return [dict(allocation) for allocation in allocations]
+
+    def place_allocation_requests(self, hall_id, requests: List[tuple]) -> List[tuple]:
+        """Place queued single-room requests for one hall in one pass.
+        
+        `requests` are (user_id, room_id, academic_year) in queue order. The hall's
+        rooms are locked once, requests are granted in order while beds remain, and
+        every granted allocation is written in one INSERT. Returns an
+        (allocation, error) pair per request. Does not commit, so the caller can
+        record the outcomes in the same transaction.
+        """
+        hall = self.db.query(Hall).filter(Hall.id == hall_id).first()
+        if not hall:
+            return [(None, f"Hall with ID {hall_id} not found")] * len(requests)
         
-        self.db.commit()
+        if not hall.is_open_for_allocation:
+            return [(None, f"Hall {hall.name} is not open for allocation")] * len(requests)
         
-        # Refresh all allocations
-        for allocation in allocations:
-            self.db.refresh(allocation)
-            
+        rooms = {
+            room.id: room for room in self.db.execute(
+                select(Room.id, Room.room_number, Room.capacity, Room.current_occupancy, Room.is_available)
+                .where(Room.hall_id == hall.id)
+                .with_for_update()
+            )
+        }
+        free_beds = {room.id: room.capacity - room.current_occupancy for room in rooms.values()}
+        
+        # Any allocation row blocks a new one: room_allocations.user_id is unique
+        taken = set(self.db.execute(
+            select(RoomAllocation.user_id).where(
+                RoomAllocation.user_id.in_({user_id for user_id, _, _ in requests})
+            )
+        ).scalars())
+        
+        outcomes = []
+        granted = []
+        for user_id, room_id, academic_year in requests:
+            room = rooms.get(room_id)
+            if user_id in taken:
+                outcomes.append((None, "User already has a room allocation"))
+            elif room is None:
+                outcomes.append((None, f"Room with ID {room_id} not found"))
+            elif free_beds[room_id] <= 0:
+                outcomes.append((None, f"Room {room.room_number} is already at full capacity"))
+            elif not room.is_available:
+                outcomes.append((None, f"Room {room.room_number} is not available for allocation"))
+            else:
+                taken.add(user_id)
+                free_beds[room_id] -= 1
+                outcomes.append(None)
+                granted.append((user_id, room_id, academic_year))
+        
+        if not granted:
+            return outcomes
+        
+        allocations = self._write_allocations(hall.id, granted)
+        publish(self.db, "allocation.bulk_created", {"hall_id": hall.id, "count": len(allocations)},
+                users=[allocation["user_id"] for allocation in allocations])
+        allocations = iter(allocations)
+        return [outcome or (dict(next(allocations)), None) for outcome in outcomes]
+
+    def _write_allocations(self, hall_id, placements: List[tuple]) -> list:
+        """Insert (user_id, room_id, academic_year) placements and bring room and hall counters in line"""
+        # One multi-row INSERT ... RETURNING for every allocation, rows back in input order
+        allocations = self.db.execute(
+            insert(RoomAllocation).returning(*RoomAllocation.__table__.c, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_id,
+                    "room_id": room_id,
+                    "hall_id": hall_id,
+                    "status": AllocationStatus.ALLOCATED,
+                    "academic_year": academic_year,
+                }
+                for user_id, room_id, academic_year in placements
+            ]
+        ).mappings().all()
+        
+        # One UPDATE for every touched room, recounting occupancy from the allocation rows
+        active_count = (
+            select(func.count(RoomAllocation.id))
+            .where(
+                RoomAllocation.room_id == Room.id,
+                RoomAllocation.status == AllocationStatus.ALLOCATED
+            )
+            .scalar_subquery()
+        )
+        self.db.execute(
+            update(Room)
+            .where(Room.id.in_({room_id for _, room_id, _ in placements}))
+            .values(current_occupancy=active_count, is_available=active_count < Room.capacity)
+            .execution_options(synchronize_session=False)
+        )
+        
+        self._adjust_hall_capacity(hall_id, -len(placements))
         return allocations
 
+    @staticmethod
+    def _pack_students(students, rooms) -> List[tuple]:
+        """Place students with best-fit packing, keeping each level/department cohort together.
+        
+        Cohorts are placed largest first. Each cohort goes into the room whose free
+        beds fit it most tightly; a cohort bigger than every room fills the roomiest
+        room and carries the rest over. Returns (user_id, room_id) pairs.
+        """
+        cohorts = {}
+        for student in sorted(students, key=lambda s: (s.level, s.department or "", str(s.id))):
+            cohorts.setdefault((student.level, student.department or ""), []).append(student.id)
+        
+        # (free beds, room id), sorted so bisect finds the tightest fit
+        free_beds = sorted((room.capacity - room.current_occupancy, room.id) for room in rooms)
+        placements = []
+        
+        for members in sorted(cohorts.values(), key=len, reverse=True):
+            while members:
+                index = bisect.bisect_left(free_beds, (len(members),))
+                if index == len(free_beds):
+                    index -= 1
+                beds, room_id = free_beds.pop(index)
+                placed = members[:beds]
+                members = members[beds:]
+                placements.extend((user_id, room_id) for user_id in placed)
+                if beds > len(placed):
+                    bisect.insort(free_beds, (beds - len(placed), room_id))
+        
+        return placements
+
     def vacate_room(self, allocation_id: str) -> RoomAllocationResponse:
         """Mark a room allocation as vacated"""
-        allocation = self.db.query(RoomAllocation).filter(RoomAllocation.id == allocation_id).first()
-        if not allocation:
-            raise ValueError(f"Allocation with ID {allocation_id} not found")
-            
-        if allocation.status != AllocationStatus.ALLOCATED:
-            raise ValueError(f"Allocation is not active (current status: {allocation.status})")
+        # Flip the status conditionally so two concurrent vacates release the bed once
+        vacated = self.db.execute(
+            update(RoomAllocation)
+            .where(
+                RoomAllocation.id == allocation_id,
+                RoomAllocation.status == AllocationStatus.ALLOCATED
+            )
+            .values(status=AllocationStatus.VACATED, vacated_at=datetime.now())
+            .returning(RoomAllocation.user_id, RoomAllocation.room_id, RoomAllocation.hall_id)
+            .execution_options(synchronize_session=False)
+        ).first()
         
-        # Update allocation
-        allocation.status = AllocationStatus.VACATED
-        allocation.vacated_at = datetime.now()
+        if vacated is None:
+            self.db.rollback()
+            allocation = self.db.query(RoomAllocation).filter(RoomAllocation.id == allocation_id).first()
+            if not allocation:
+                raise ValueError(f"Allocation with ID {allocation_id} not found")
+            raise ValueError(f"Allocation is not active (current status: {allocation.status})")
         
         # Update room occupancy
-        room = self.db.query(Room).filter(Room.id == allocation.room_id).first()
-        room.current_occupancy -= 1
-        room.is_available = True
+        self.db.execute(
+            update(Room)
+            .where(Room.id == vacated.room_id)
+            .values(current_occupancy=Room.current_occupancy - 1, is_available=True)
+            .execution_options(synchronize_session=False)
+        )
         
         # Update hall available capacity
-        hall = self.db.query(Hall).filter(Hall.id == allocation.hall_id).first()
-        if hall.total_available_capacity is not None:
-            hall.total_available_capacity += 1
+        self._adjust_hall_capacity(vacated.hall_id, 1)
         
+        publish(self.db, "allocation.vacated",
+                {"id": allocation_id, "room_id": vacated.room_id, "hall_id": vacated.hall_id}, users=[vacated.user_id])
         self.db.commit()
-        self.db.refresh(allocation)
         
-        return allocation
+        return self.db.query(RoomAllocation).filter(RoomAllocation.id == allocation_id).first()
 
     def get_user_allocation(self, user_id: UUID) -> Optional[RoomAllocationResponse]:
         """Get a user's current active allocation"""
@@ -175,24 +404,19 @@ class RoomAllocationService:
 
     def get_hall_occupancy_stats(self, hall_id: str) -> HallOccupancyStats:
         """Get occupancy statistics for a hall"""
-        hall = self.db.query(Hall).filter(Hall.id == hall_id).first()
-        if not hall:
-            raise ValueError(f"Hall with ID {hall_id} not found")
-        
-        # Count total capacity and current occupancy
-        total_capacity = self.db.query(func.sum(Room.capacity)).filter(Room.hall_id == hall_id).scalar() or 0
-        current_occupancy = self.db.query(func.sum(Room.current_occupancy)).filter(Room.hall_id == hall_id).scalar() or 0
+        summary = self.get_hall_allocation_summary(hall_id)
+        total_capacity = summary["total_capacity"]
+        current_occupancy = summary["current_occupancy"]
         
         # Calculate stats
         occupancy_rate = (current_occupancy / total_capacity) * 100 if total_capacity > 0 else 0
-        available_spaces = total_capacity - current_occupancy
         
         return HallOccupancyStats(
-            hall_name=hall.name,
+            hall_name=summary["hall_name"],
             total_capacity=total_capacity,
             current_occupancy=current_occupancy,
             occupancy_rate=occupancy_rate,
-            available_spaces=available_spaces
+            available_spaces=summary["available_spaces"]
         )
 
     def get_available_rooms(self, hall_id: str) -> List[Room]:
@@ -244,50 +468,70 @@ class RoomAllocationService:
         
     def get_hall_allocation_summary(self, hall_id: str) -> dict:
         """Get allocation summary for a hall"""
-        hall = self.db.query(Hall).filter(Hall.id == hall_id).first()
-        if not hall:
+        summaries = self.get_hall_allocation_summaries(hall_id)
+        if not summaries:
             raise ValueError(f"Hall with ID {hall_id} not found")
-            
-        # Get rooms
-        rooms = self.db.query(Room).filter(Room.hall_id == hall_id).all()
-        
-        # Count allocations by status
-        active_allocations = self.db.query(RoomAllocation).filter(
-            RoomAllocation.hall_id == hall_id,
-            RoomAllocation.status == AllocationStatus.ALLOCATED
-        ).count()
-        
-        pending_allocations = self.db.query(RoomAllocation).filter(
-            RoomAllocation.hall_id == hall_id,
-            RoomAllocation.status == AllocationStatus.PENDING
-        ).count()
+        return summaries[0]
+
+    def get_hall_allocation_summaries(self, hall_id: Optional[str] = None) -> List[dict]:
+        """Allocation summaries for one hall or all halls, in a single query"""
+        # Rooms and allocations are aggregated per hall before the join, so
+        # neither side multiplies the other's counts
+        room_totals = (
+            select(
+                Room.hall_id,
+                func.count().label("total_rooms"),
+                func.count().filter(Room.current_occupancy >= Room.capacity).label("full_rooms"),
+                func.count().filter(
+                    and_(Room.current_occupancy < Room.capacity, Room.is_available == True)
+                ).label("available_rooms"),
+                func.sum(Room.capacity).label("total_capacity"),
+                func.sum(Room.current_occupancy).label("current_occupancy"),
+            )
+            .group_by(Room.hall_id)
+        )
+        allocation_totals = (
+            select(
+                RoomAllocation.hall_id,
+                func.count().filter(RoomAllocation.status == AllocationStatus.ALLOCATED).label("active_allocations"),
+                func.count().filter(RoomAllocation.status == AllocationStatus.PENDING).label("pending_allocations"),
+                func.count().filter(RoomAllocation.status == AllocationStatus.VACATED).label("vacated_allocations"),
+            )
+            .group_by(RoomAllocation.hall_id)
+        )
+        if hall_id is not None:
+            room_totals = room_totals.where(Room.hall_id == hall_id)
+            allocation_totals = allocation_totals.where(RoomAllocation.hall_id == hall_id)
+        room_totals = room_totals.subquery()
+        allocation_totals = allocation_totals.subquery()
+        
+        def total(column):
+            return func.coalesce(column, 0)
+        
+        query = (
+            select(
+                Hall.id.label("hall_id"),
+                Hall.name.label("hall_name"),
+                Hall.academic_year,
+                Hall.is_open_for_allocation,
+                total(room_totals.c.total_rooms).label("total_rooms"),
+                total(room_totals.c.full_rooms).label("full_rooms"),
+                total(room_totals.c.available_rooms).label("available_rooms"),
+                total(room_totals.c.total_capacity).label("total_capacity"),
+                total(room_totals.c.current_occupancy).label("current_occupancy"),
+                (total(room_totals.c.total_capacity) - total(room_totals.c.current_occupancy)).label("available_spaces"),
+                total(allocation_totals.c.active_allocations).label("active_allocations"),
+                total(allocation_totals.c.pending_allocations).label("pending_allocations"),
+                total(allocation_totals.c.vacated_allocations).label("vacated_allocations"),
+            )
+            .outerjoin(room_totals, room_totals.c.hall_id == Hall.id)
+            .outerjoin(allocation_totals, allocation_totals.c.hall_id == Hall.id)
+            .order_by(Hall.name)
+        )
+        if hall_id is not None:
+            query = query.where(Hall.id == hall_id)
         
-        vacated_allocations = self.db.query(RoomAllocation).filter(
-            RoomAllocation.hall_id == hall_id,
-            RoomAllocation.status == AllocationStatus.VACATED
-        ).count()
-        
-        # Calculate additional stats
-        total_capacity = sum(room.capacity for room in rooms)
-        current_occupancy = sum(room.current_occupancy for room in rooms)
-        available_spaces = total_capacity - current_occupancy
-        full_rooms = sum(1 for room in rooms if room.current_occupancy >= room.capacity)
-        available_rooms = sum(1 for room in rooms if room.current_occupancy < room.capacity and room.is_available)
-        
-        return {
-            "hall_name": hall.name,
-            "academic_year": hall.academic_year,
-            "is_open_for_allocation": hall.is_open_for_allocation,
-            "total_rooms": len(rooms),
-            "full_rooms": full_rooms,
-            "available_rooms": available_rooms,
-            "total_capacity": total_capacity,
-            "current_occupancy": current_occupancy,
-            "available_spaces": available_spaces,
-            "active_allocations": active_allocations,
-            "pending_allocations": pending_allocations,
-            "vacated_allocations": vacated_allocations
-        }
+        return [dict(row) for row in self.db.execute(query).mappings()]
 
     # Hall CRUD methods
     def create_hall(self, name: str, no_of_rooms: int, min_level: int, max_level: int, 
@@ -497,4 +741,93 @@ class RoomAllocationService:
         for room in created_rooms:
             self.db.refresh(room)
         
-        return created_rooms
\ No newline at end of file
+        return created_rooms
+
+
+class AsyncRoomAllocationService:
+    """Async counterpart of RoomAllocationService.
+
+    Every method runs the matching RoomAllocationService method through
+    AsyncSession.run_sync, so the SQL goes out over the async driver on the
+    event loop and no threadpool worker is held while Postgres answers.
+    The business rules stay in one place while routes migrate to async.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args, **kwargs):
+        return await self.db.run_sync(
+            lambda session: getattr(RoomAllocationService(session), method)(*args, **kwargs)
+        )
+
+    async def allocate_room(self, user_id: UUID, room_id: int, academic_year: str) -> RoomAllocationResponse:
+        return await self._run("allocate_room", user_id, room_id, academic_year)
+
+    async def allocate_room_in_hall(self, user_id: UUID, hall_id: str, academic_year: str) -> RoomAllocationResponse:
+        return await self._run("allocate_room_in_hall", user_id, hall_id, academic_year)
+
+    async def bulk_allocate_rooms(self, user_ids: List[UUID], hall_id: str, academic_year: str) -> List[RoomAllocationResponse]:
+        return await self._run("bulk_allocate_rooms", user_ids, hall_id, academic_year)
+
+    async def vacate_room(self, allocation_id: str) -> RoomAllocationResponse:
+        return await self._run("vacate_room", allocation_id)
+
+    async def get_user_allocation(self, user_id: UUID) -> Optional[RoomAllocationResponse]:
+        return await self._run("get_user_allocation", user_id)
+
+    async def get_hall_occupancy_stats(self, hall_id: str) -> HallOccupancyStats:
+        return await self._run("get_hall_occupancy_stats", hall_id)
+
+    async def get_available_rooms(self, hall_id: str) -> List[Room]:
+        return await self._run("get_available_rooms", hall_id)
+
+    async def get_all_allocations(self, **filters) -> List[RoomAllocation]:
+        return await self._run("get_all_allocations", **filters)
+
+    async def set_hall_allocation_status(self, hall_id: str, is_open: bool, academic_year: Optional[str] = None) -> Hall:
+        return await self._run("set_hall_allocation_status", hall_id, is_open, academic_year)
+
+    async def get_allocation_by_id(self, allocation_id: str) -> RoomAllocation:
+        return await self._run("get_allocation_by_id", allocation_id)
+
+    async def get_hall_allocation_summary(self, hall_id: str) -> dict:
+        return await self._run("get_hall_allocation_summary", hall_id)
+
+    async def get_hall_allocation_summaries(self, hall_id: Optional[str] = None) -> List[dict]:
+        return await self._run("get_hall_allocation_summaries", hall_id)
+
+    async def create_hall(self, name: str, no_of_rooms: int, min_level: int, max_level: int,
+                          is_open_for_allocation: bool = False, academic_year: str = None) -> Hall:
+        return await self._run("create_hall", name, no_of_rooms, min_level, max_level,
+                               is_open_for_allocation, academic_year)
+
+    async def get_hall(self, hall_id: str) -> Hall:
+        return await self._run("get_hall", hall_id)
+
+    async def get_all_halls(self) -> List[Hall]:
+        return await self._run("get_all_halls")
+
+    async def update_hall(self, hall_id: str, **kwargs) -> Hall:
+        return await self._run("update_hall", hall_id, **kwargs)
+
+    async def delete_hall(self, hall_id: str) -> bool:
+        return await self._run("delete_hall", hall_id)
+
+    async def create_room(self, hall_id: str, room_number: str, capacity: int) -> Room:
+        return await self._run("create_room", hall_id, room_number, capacity)
+
+    async def get_room(self, room_id: int) -> Room:
+        return await self._run("get_room", room_id)
+
+    async def get_rooms_by_hall(self, hall_id: str) -> List[Room]:
+        return await self._run("get_rooms_by_hall", hall_id)
+
+    async def update_room(self, room_id: int, **kwargs) -> Room:
+        return await self._run("update_room", room_id, **kwargs)
+
+    async def delete_room(self, room_id: int) -> bool:
+        return await self._run("delete_room", room_id)
+
+    async def create_rooms_bulk(self, hall_id: str, rooms_data: List[dict]) -> List[Room]:
+        return await self._run("create_rooms_bulk", hall_id, rooms_data)
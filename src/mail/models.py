@@ -0,0 +1,41 @@
+import uuid
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Enum,
+    Index,
+    Text,
+    func,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from src.common.enums import OutboxStatus
+from src.common.db import Base
+
+
+# Emails are written here in the transaction that causes them and sent by
+# src.mail.worker, so no request waits on the mail server
+class OutboxEmail(Base):
+    __tablename__ = "email_outbox"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    # Cleared once the email is sent or given up on. Never holds a secret:
+    # such emails name a template instead and are rendered by the sender
+    body = Column(Text(), nullable=True)
+    template = Column(String(50), nullable=True)
+    # Whom a template email is about (e.g. the account whose password is reset)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    subtype = Column(String(10), nullable=False, default="html")
+    status = Column(Enum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer(), nullable=False, default=0)
+    # Earliest time of the next attempt; pushed forward while a sender holds the row
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
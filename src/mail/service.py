@@ -0,0 +1,83 @@
+from typing import Awaitable, Callable, Tuple
+
+from sqlalchemy import select, update
+
+from src.auth.models import User
+from src.common.db import AsyncSessionLocal
+from src.common.hashing import password_hasher
+from src.common.security import generate_random_password
+from .models import OutboxEmail
+
+PASSWORD_RESET = "password_reset"
+PASSWORD_RESET_SUBJECT = "Your New Password"
+
+
+class RecipientGone(LookupError):
+    """The user a template email is about no longer exists; it is not retried"""
+
+
+def queue_email(db, recipient: str, subject: str, body: str, subtype: str = "html") -> OutboxEmail:
+    """Add an email to the outbox on the caller's session (sync or async).
+
+    It is sent by the outbox worker only if the caller's transaction commits,
+    so an email never goes out for a change that was rolled back.
+    """
+    email = OutboxEmail(recipient=recipient, subject=subject, body=body, subtype=subtype)
+    db.add(email)
+    return email
+
+
+def queue_password_reset(db, user: User) -> OutboxEmail:
+    """Queue a new password for `user` without storing it anywhere.
+
+    The sender generates and hashes the password right before sending, and
+    stores the hash only once the server has accepted the email, so the
+    password only ever exists in memory and in the email. Until then, and for
+    good if sending fails, the old password keeps working.
+    """
+    email = OutboxEmail(recipient=user.email, subject=PASSWORD_RESET_SUBJECT, body=None,
+                        template=PASSWORD_RESET, user_id=user.id)
+    db.add(email)
+    return email
+
+
+async def render_password_reset(email) -> Tuple[str, Callable[[], Awaitable[None]]]:
+    """The body carrying a fresh password for the email's user, and the
+    coroutine function that sets it. Nothing is written here: a send that
+    fails leaves the user's password as it was."""
+    async with AsyncSessionLocal() as db:
+        user_name = (await db.execute(select(User.name).where(User.id == email.user_id))).scalar()
+    if user_name is None:
+        raise RecipientGone(f"User {email.user_id} no longer exists")
+    new_password = generate_random_password(12)
+    hashed_password = await password_hasher.hash(new_password)
+
+    async def set_password():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(User).where(User.id == email.user_id).values(hashed_password=hashed_password))
+            await db.commit()
+
+    return password_reset_email(user_name, new_password)[1], set_password
+
+
+# Template name -> coroutine rendering (body, what to do once it is sent) at send time
+RENDERERS = {
+    PASSWORD_RESET: render_password_reset,
+}
+
+
+def password_reset_email(user_name: str, new_password: str) -> Tuple[str, str]:
+    """Subject and HTML body of the email carrying a generated password"""
+    html_content = f"""
+    <html>
+      <body>
+        <h2>Password Reset</h2>
+        <p>Hi {user_name},</p>
+        <p>We received a request to reset your password. Your new password is:</p>
+        <p><strong>{new_password}</strong></p>
+        <p>Please log in with this password and then change it immediately for security reasons.</p>
+        <p>If you didn't request this password reset, please contact our support team immediately.</p>
+      </body>
+    </html>
+    """
+    return PASSWORD_RESET_SUBJECT, html_content
@@ -0,0 +1,307 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Optional
+
+import aiosmtplib
+from sqlalchemy import select, update
+
+from src.common.config import EMAIL_CONFIG
+from src.common.db import AsyncSessionLocal
+from src.common.enums import OutboxStatus
+from src.common.metrics import LatencyRecorder
+from .models import OutboxEmail
+from .service import RENDERERS, RecipientGone
+
+logger = logging.getLogger(__name__)
+
+# Every worker process runs a sender; claimed rows are skipped by the others
+MAIL_OUTBOX_WORKER = os.environ.get("MAIL_OUTBOX_WORKER", "true").lower() == "true"
+MAIL_OUTBOX_BATCH = int(os.environ.get("MAIL_OUTBOX_BATCH", "50"))
+# Seconds between outbox checks when idle; a queued email wakes the sender of its worker at once
+MAIL_OUTBOX_INTERVAL = float(os.environ.get("MAIL_OUTBOX_INTERVAL", "2"))
+MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", "8"))
+# Retry delays double from MAIL_RETRY_BASE up to MAIL_RETRY_MAX seconds
+MAIL_RETRY_BASE = float(os.environ.get("MAIL_RETRY_BASE", "30"))
+MAIL_RETRY_MAX = float(os.environ.get("MAIL_RETRY_MAX", "3600"))
+# A claimed email is retried by any sender if it is not settled within this many seconds
+MAIL_CLAIM_SECONDS = float(os.environ.get("MAIL_CLAIM_SECONDS", "300"))
+# Close the SMTP connection after this many idle seconds
+MAIL_SMTP_IDLE = float(os.environ.get("MAIL_SMTP_IDLE", "60"))
+
+
+class SMTPUnavailable(Exception):
+    """The SMTP server could not be reached or refused the login"""
+
+
+class SMTPSender:
+    """One persistent SMTP connection: connected on first use, reused for
+    every message, reopened after the server drops it and closed when idle."""
+
+    def __init__(self, hostname: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, start_tls: bool = False, validate_certs: bool = True, timeout: float = 60):
+        self.settings = dict(
+            hostname=hostname, port=port, username=username, password=password,
+            use_tls=use_tls, start_tls=start_tls, validate_certs=validate_certs, timeout=timeout,
+        )
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    async def _connect(self):
+        await self.close()
+        smtp = aiosmtplib.SMTP(**self.settings)
+        try:
+            # Connects, upgrades with STARTTLS and logs in as configured
+            await smtp.connect()
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+            raise SMTPUnavailable(str(e)) from e
+        self._smtp = smtp
+        self.connects += 1
+
+    async def ensure_connected(self):
+        """Raise SMTPUnavailable now rather than after work done for the message"""
+        if self._smtp is None or not self._smtp.is_connected:
+            await self._connect()
+
+    async def send(self, message: EmailMessage):
+        await self.ensure_connected()
+        try:
+            await self._smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The server closed a connection it considered idle; one fresh try
+            await self._connect()
+            await self._smtp.send_message(message)
+        self._last_used = time.monotonic()
+
+    async def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > MAIL_SMTP_IDLE:
+            await self.close()
+
+    async def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+
+def _build_sender() -> SMTPSender:
+    return SMTPSender(
+        hostname=EMAIL_CONFIG.MAIL_SERVER,
+        port=EMAIL_CONFIG.MAIL_PORT,
+        username=EMAIL_CONFIG.MAIL_USERNAME if EMAIL_CONFIG.USE_CREDENTIALS else None,
+        password=EMAIL_CONFIG.MAIL_PASSWORD.get_secret_value() if EMAIL_CONFIG.USE_CREDENTIALS else None,
+        use_tls=EMAIL_CONFIG.MAIL_SSL_TLS,
+        start_tls=EMAIL_CONFIG.MAIL_STARTTLS,
+        validate_certs=EMAIL_CONFIG.VALIDATE_CERTS,
+        timeout=EMAIL_CONFIG.TIMEOUT,
+    )
+
+
+def build_message(email, body: Optional[str] = None) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((EMAIL_CONFIG.MAIL_FROM_NAME or "", EMAIL_CONFIG.MAIL_FROM))
+    message["To"] = email.recipient
+    message["Subject"] = email.subject
+    # Stable across retries, so a resend after a crash can be recognised downstream
+    message["Message-ID"] = f"<{email.id}@{EMAIL_CONFIG.MAIL_FROM.split('@')[-1]}>"
+    message.set_content(body if body is not None else email.body or "", subtype=email.subtype)
+    return message
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies to a message (bad recipient, rejected content) will not succeed on retry"""
+    if isinstance(error, RecipientGone):
+        return True
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(refused.code >= 500 for refused in error.recipients)
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+def _retry_delay(attempts: int) -> float:
+    delay = min(MAIL_RETRY_MAX, MAIL_RETRY_BASE * 2 ** (attempts - 1))
+    # Jitter, so emails that failed together are not retried together
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.unavailable = 0
+        self.send_latency = LatencyRecorder()
+
+    def record_batch(self, sent: int, retried: int, failed: int, unavailable: bool):
+        with self._lock:
+            self.batches += 1
+            self.sent += sent
+            self.retried += retried
+            self.failed += failed
+            self.unavailable += int(unavailable)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "batches": self.batches,
+                "smtp_unavailable": self.unavailable,
+                "send": self.send_latency.as_dict(),
+            }
+
+
+class OutboxWorker:
+    """Drains email_outbox in batches over one SMTP connection; runs on the app's event loop"""
+
+    def __init__(self, sender: SMTPSender, batch_size: int = MAIL_OUTBOX_BATCH, interval: float = MAIL_OUTBOX_INTERVAL):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.interval = interval
+        self.metrics = OutboxMetrics()
+        self._wake = asyncio.Event()
+        self._task = None
+        self.smtp_down = False
+
+    def wake(self):
+        """Check the outbox now rather than at the next interval"""
+        self._wake.set()
+
+    async def _claim(self) -> list:
+        """Lease the next due emails. SKIP LOCKED lets several senders claim
+        disjoint batches; the lease makes a crashed sender's batch due again."""
+        now = datetime.now(timezone.utc)
+        due = (
+            select(OutboxEmail.id)
+            .where(OutboxEmail.status == OutboxStatus.PENDING, OutboxEmail.next_attempt_at <= now)
+            .order_by(OutboxEmail.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSessionLocal() as db:
+            emails = (await db.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id.in_(due))
+                .values(attempts=OutboxEmail.attempts + 1,
+                        next_attempt_at=now + timedelta(seconds=MAIL_CLAIM_SECONDS))
+                .returning(OutboxEmail.id, OutboxEmail.recipient, OutboxEmail.subject,
+                           OutboxEmail.body, OutboxEmail.subtype, OutboxEmail.attempts,
+                           OutboxEmail.template, OutboxEmail.user_id)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+        return emails
+
+    async def process_next_batch(self) -> int:
+        """Send one batch; returns the number of emails claimed"""
+        emails = await self._claim()
+        if not emails:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        settled, retries = [], []
+        unavailable = None
+        for email in emails:
+            error = unavailable
+            if unavailable is None:
+                started = time.perf_counter()
+                try:
+                    body, on_sent = None, None
+                    if email.template:
+                        # Secrets are rendered only once the server is known to be up
+                        await self.sender.ensure_connected()
+                        body, on_sent = await RENDERERS[email.template](email)
+                    await self.sender.send(build_message(email, body))
+                    self.metrics.send_latency.record(time.perf_counter() - started)
+                    outcome = {"id": email.id, "status": OutboxStatus.SENT, "sent_at": now, "last_error": None}
+                    if on_sent is not None:
+                        # Only now that the server accepted it, e.g. store the new password's hash
+                        try:
+                            await on_sent()
+                        except Exception as e:
+                            # Not retried: a resend would carry a different password
+                            logger.exception("Outbox email %s was sent but could not be applied", email.id)
+                            outcome["last_error"] = f"Sent, but not applied: {e}"[:255]
+                    settled.append(outcome)
+                    continue
+                except SMTPUnavailable as e:
+                    # No point trying the rest of the batch against a server that is down
+                    unavailable = error = e
+                except Exception as e:
+                    error = e
+                    if _is_permanent(e):
+                        settled.append({"id": email.id, "status": OutboxStatus.FAILED, "sent_at": None,
+                                        "last_error": str(e)[:255]})
+                        continue
+            message = str(error)[:255]
+            if email.attempts >= MAIL_MAX_ATTEMPTS:
+                settled.append({"id": email.id, "status": OutboxStatus.FAILED, "sent_at": None, "last_error": message})
+            else:
+                retries.append({"id": email.id, "last_error": message,
+                                "next_attempt_at": now + timedelta(seconds=_retry_delay(email.attempts))})
+
+        async with AsyncSessionLocal() as db:
+            if settled:
+                # Nothing needs the body once the outcome is known
+                await db.execute(update(OutboxEmail), [dict(row, body=None) for row in settled])
+            if retries:
+                await db.execute(update(OutboxEmail), retries)
+            await db.commit()
+
+        failed = sum(1 for row in settled if row["status"] == OutboxStatus.FAILED)
+        if failed:
+            logger.warning("%s outbox email(s) failed permanently", failed)
+        self.smtp_down = unavailable is not None
+        self.metrics.record_batch(len(settled) - failed, len(retries), failed, self.smtp_down)
+        return len(emails)
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_next_batch()
+            except Exception:
+                logger.exception("Email outbox worker failed to process a batch")
+                processed = 0
+            # Keep draining while batches come back full, unless the server is down
+            if processed < self.batch_size or self.smtp_down:
+                await self.sender.close_if_idle()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sender.close()
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "smtp_connects": self.sender.connects,
+            **self.metrics.as_dict(),
+        }
+
+
+outbox_worker = OutboxWorker(_build_sender()) if MAIL_OUTBOX_WORKER else None